@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Collect the data of all stations of a lab while the sessions are running.
+
+Every station running sart.py with the setting `aggregator_address` sends a copy of its trials
+to this aggregator (the data files in the data folder of the station are written as before).
+The aggregator saves the rows of each station in the output folder ('output/<station>/<data file>')
+and offers the progress of all stations as JSON for a dashboard:
+
+    GET http://<computer>:<http port>/status
+
+For every station this contains whether it is connected, when it sent data last, the current
+participant, session and block, the number of trials per block, and the numbers and rates of
+commission and omission errors.
+
+The station side of the connection is in aggregator_client.py. Stations send one batch at a
+time and wait until the aggregator has saved it, so a slow aggregator receives larger batches
+instead of slowing down the experiment. If the aggregator cannot be reached, the stations keep their batches in the subfolder 'spool' of their data folder
+and send them once the aggregator is reachable again. A batch may therefore be received twice if
+a connection breaks just after the batch was saved. The batches of a station are numbered per run
+of sart.py ('run' and 'batch' in the messages), so such duplicates are confirmed again but not
+saved twice; all saved batches are listed in 'output/<station>/batches.jsonl'.
+
+Usage (from the repository folder):
+    python aggregator.py --port 5555 --http-port 8080                 # sart.py: aggregator_address = 'aggregator-pc:5555'
+    python aggregator.py --unix /tmp/sart.sock --http-port 8080       # sart.py: aggregator_address = 'unix:/tmp/sart.sock'
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import threading
+import time
+
+# Largest batch (in bytes) accepted from a station
+max_batch_size = 2 ** 28
+
+# Progress of every station, shown by the status endpoint
+stations = {}
+
+# Batches saved for every station as (run, batch), read from the log of the station when its first batch arrives
+saved_batches = {}
+saved_batches_locks = {}
+
+def new_station():
+    """Return the progress of a station that has not sent any data yet."""
+    return {'connected': False, 'address': None, 'last_seen': None, 'batches': 0, 'spooled_batches': 0, 'rows': 0,
+            'trials': 0, 'participant': None, 'session': None, 'block': None, 'trials_per_block': {},
+            'go_trials': 0, 'nogo_trials': 0, 'commission_errors': 0, 'omission_errors': 0,
+            'commission_rate': None, 'omission_rate': None, 'error_rate': None}
+
+def read_saved_batches(station_folder):
+    """
+    Read the batches already saved for a station from its log of batches.
+
+    Parameters:
+    - station_folder : str
+        Output folder of the station.
+
+    Returns:
+    - saved : set of tuples
+        The saved batches as (run, batch). Batches logged by older versions of the aggregator have the run None.
+    """
+    saved = set()
+    path = os.path.join(station_folder, 'batches.jsonl')
+    if os.path.exists(path):
+        with open(path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                saved.add((entry.get('run'), entry['batch']))
+    return saved
+
+def save_batch(folder, message):
+    """
+    Append the rows of a batch to the data files of its station, unless the batch was saved before.
+
+    Parameters:
+    - folder : str
+        Output folder of the aggregator.
+    - message : dict
+        The batch sent by `send_aggregator_loop` in sart.py ('station', 'run', 'batch', 'columns', 'files').
+
+    Returns:
+    - saved : bool
+        False if the batch was saved before (e.g. sent again after a broken connection) and was skipped.
+    """
+    station = os.path.basename(str(message['station']))
+    station_folder = os.path.join(folder, station)
+    batch = (message.get('run'), message['batch'])
+    # A station that reconnects may send a batch again while the first copy is still being saved
+    with saved_batches_locks.setdefault(station, threading.Lock()):
+        if station not in saved_batches:
+            saved_batches[station] = read_saved_batches(station_folder)
+        if batch in saved_batches[station]:
+            return False
+        write_batch(station_folder, message)
+        saved_batches[station].add(batch)
+    return True
+
+def write_batch(station_folder, message):
+    """
+    Append the rows of a batch to the data files in the output folder of its station and log the batch.
+
+    Parameters:
+    - station_folder : str
+        Output folder of the station.
+    - message : dict
+        The batch.
+
+    Returns:
+    - None
+    """
+    os.makedirs(station_folder, exist_ok=True)
+    for name, rows in message['files'].items():
+        path = os.path.join(station_folder, os.path.basename(name))
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='') as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(message['columns'])
+            writer.writerows(rows)
+    with open(os.path.join(station_folder, 'batches.jsonl'), 'a') as file:
+        file.write(json.dumps({'run': message.get('run'), 'batch': message['batch'], 'received': time.time(), 'spooled': message.get('spooled', False),
+                               'rows': {name: len(rows) for name, rows in message['files'].items()}}) + '\n')
+
+def update_progress(station, message):
+    """
+    Update the progress of a station with the rows of a batch.
+
+    Parameters:
+    - station : dict
+        Progress of the station (see `new_station`).
+    - message : dict
+        The batch sent by the station.
+
+    Returns:
+    - None
+    """
+    station['batches'] += 1
+    station['spooled_batches'] += bool(message.get('spooled'))
+    station['last_seen'] = time.time()
+    columns = {column: index for index, column in enumerate(message['columns'])}
+
+    for rows in message['files'].values():
+        station['rows'] += len(rows)
+        for row in rows:
+            station['participant'] = row[columns['participant']]
+            station['session'] = row[columns['session']]
+            station['block'] = row[columns['block']]
+
+            # Count only trials (no attention ratings and no rows of a quitted session)
+            if row[columns['digit']] in (None, '') or row[columns['rating']] == 1:
+                continue
+            block = str(row[columns['block']])
+            station['trials'] += 1
+            station['trials_per_block'][block] = station['trials_per_block'].get(block, 0) + 1
+            if row[columns['go_trial']] == 1:
+                station['go_trials'] += 1
+                station['omission_errors'] += row[columns['status']] == 0
+            else:
+                station['nogo_trials'] += 1
+                station['commission_errors'] += row[columns['status']] == 0
+
+    station['commission_rate'] = station['commission_errors'] / station['nogo_trials'] if station['nogo_trials'] else None
+    station['omission_rate'] = station['omission_errors'] / station['go_trials'] if station['go_trials'] else None
+    errors = station['commission_errors'] + station['omission_errors']
+    station['error_rate'] = errors / station['trials'] if station['trials'] else None
+
+async def handle_station(reader, writer, folder):
+    """
+    Receive the batches of one station, save them and confirm each of them.
+
+    Parameters:
+    - reader, writer : asyncio.StreamReader, asyncio.StreamWriter
+        The connection to the station.
+    - folder : str
+        Output folder of the aggregator.
+    """
+    station = None
+    address = writer.get_extra_info('peername')
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if message.get('type') != 'batch':
+                continue
+
+            station = stations.setdefault(str(message['station']), new_station())
+            station['connected'] = True
+            station['address'] = str(address) if address else None
+
+            # Save the batch outside the event loop, so other stations are not blocked
+            if await loop.run_in_executor(None, save_batch, folder, message):
+                update_progress(station, message)
+            else:
+                print(f"Batch {message['batch']} of {message['station']} was saved before and is skipped")
+
+            # The station sends its next batch only after this confirmation
+            writer.write((json.dumps({'type': 'ack', 'batch': message['batch']}) + '\n').encode('utf-8'))
+            await writer.drain()
+    except (ConnectionError, ValueError, KeyError) as error:
+        print(f"Connection to {address} closed: {error}")
+    finally:
+        if station is not None:
+            station['connected'] = False
+        writer.close()
+
+async def handle_status(reader, writer):
+    """
+    Answer an HTTP request with the progress of all stations as JSON.
+
+    Parameters:
+    - reader, writer : asyncio.StreamReader, asyncio.StreamWriter
+        The connection to the browser or dashboard.
+    """
+    try:
+        request = await reader.readline()
+        while (await reader.readline()).strip():
+            pass
+        method, path = (request.decode('latin-1').split() + ['', ''])[:2]
+        if method == 'GET' and path.split('?')[0] in ('/', '/status'):
+            body = json.dumps({'time': time.time(), 'stations': stations}, indent=2).encode('utf-8')
+            status = '200 OK'
+        else:
+            body = json.dumps({'error': 'not found'}).encode('utf-8')
+            status = '404 Not Found'
+        writer.write((f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                      "Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def run_aggregator(folder='output', host='0.0.0.0', port=5555, unix_path=None, http_port=8080):
+    """
+    Run the aggregator until it is stopped (Ctrl+C).
+
+    Parameters:
+    - folder : str, optional
+        Output folder for the data of the stations. Default is 'output'.
+    - host : str, optional
+        Network address to listen on. Default is '0.0.0.0' (all addresses).
+    - port : int, optional
+        TCP port for the stations. Default is 5555.
+    - unix_path : str, optional
+        Path to a Unix socket for the stations instead of the TCP port (for testing on one computer). Default is None.
+    - http_port : int or None, optional
+        TCP port of the status endpoint. None = no status endpoint. Default is 8080.
+    """
+    os.makedirs(folder, exist_ok=True)
+    handler = lambda reader, writer: handle_station(reader, writer, folder)
+    if unix_path:
+        server = await asyncio.start_unix_server(handler, path=unix_path, limit=max_batch_size)
+    else:
+        server = await asyncio.start_server(handler, host=host, port=port, limit=max_batch_size)
+    servers = [server]
+    print(f"Receiving data on {unix_path or f'{host}:{port}'}, saving in {folder}")
+    if http_port:
+        servers.append(await asyncio.start_server(handle_status, host=host, port=http_port))
+        print(f"Status on http://{host}:{http_port}/status")
+    await asyncio.gather(*(server.serve_forever() for server in servers))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='output', help='Output folder for the data of the stations (default: output)')
+    parser.add_argument('--host', default='0.0.0.0', help='Network address to listen on (default: all addresses)')
+    parser.add_argument('--port', type=int, default=5555, help='TCP port for the stations (default: 5555)')
+    parser.add_argument('--unix', help='Path to a Unix socket for the stations instead of the TCP port')
+    parser.add_argument('--http-port', type=int, default=8080, help='TCP port of the status endpoint, 0 = none (default: 8080)')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_aggregator(args.output, args.host, args.port, args.unix, args.http_port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
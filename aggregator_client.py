@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Station side of the protocol of aggregator.py.
+
+sart.py imports this module only when `aggregator_address` is set (see `send_aggregator_loop` in
+sart.py). A station sends one batch at a time as a JSON line and waits until the aggregator has
+saved it and confirmed it with {"type": "ack", "batch": <number>}. Batches that cannot be sent
+are kept in a spool file and sent before the next batch once the aggregator is reachable again.
+"""
+
+import json
+import os
+import socket
+import time
+
+class AggregatorClient:
+    """
+    Connection of a station to the aggregator of the lab, with a spool file for the batches that could not be sent.
+
+    Parameters:
+    - address : str
+        Address of the aggregator: 'host:port' or 'unix:/path/to/socket'.
+    - spool_path : str
+        Path to the spool file (JSON lines, one batch per line).
+    - retry_interval : float, optional
+        Minimum time (in seconds) between two attempts to connect. Default is 5.
+    """
+    def __init__(self, address, spool_path, retry_interval=5.0):
+        self.address = address
+        self.spool_path = spool_path
+        self.retry_interval = retry_interval
+        self.socket = None
+        self.file = None
+        self.next_attempt = 0.0
+
+    def send(self, message):
+        """
+        Send a batch to the aggregator, after the batches of the spool file (so the aggregator receives the rows in 
+        their original order). If the aggregator cannot be reached, the batch is appended to the spool file.
+
+        Parameters:
+        - message : dict
+            The batch (see `send_aggregator_loop` in sart.py).
+
+        Returns:
+        - sent : bool
+            True if the aggregator confirmed the batch.
+        """
+        if self.connect() and self.send_spooled_batches() and self.send_batch(message):
+            return True
+        self.spool_batch(message)
+        return False
+
+    def connect(self):
+        """
+        Connect to the aggregator, unless already connected or the last attempt failed less than `retry_interval` ago.
+
+        Returns:
+        - connected : bool
+            True if a connection is open.
+        """
+        if self.socket is not None:
+            return True
+        if time.monotonic() < self.next_attempt:
+            return False
+        try:
+            if self.address.startswith('unix:'):
+                connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                connection.settimeout(2.0)
+                connection.connect(self.address[len('unix:'):])
+            else:
+                host, port = self.address.rsplit(':', 1)
+                connection = socket.create_connection((host, int(port)), timeout=2.0)
+        except OSError:
+            self.next_attempt = time.monotonic() + self.retry_interval
+            return False
+        self.socket = connection
+        self.file = connection.makefile('rb')
+        return True
+
+    def disconnect(self):
+        """Close the connection to the aggregator (if open)."""
+        if self.socket is not None:
+            try:
+                self.file.close()
+                self.socket.close()
+            except OSError:
+                pass
+        self.socket = None
+        self.file = None
+
+    def send_batch(self, message, timeout=30.0):
+        """
+        Send one batch to the aggregator and wait for its confirmation.
+
+        Parameters:
+        - message : dict
+            The batch.
+        - timeout : float, optional
+            Time (in seconds) to wait for the confirmation of a small batch. One second per MB of the batch is added, 
+            because the aggregator confirms a batch only after saving it. Default is 30.
+
+        Returns:
+        - sent : bool
+            True if the aggregator confirmed the batch. If not, the connection is closed.
+        """
+        try:
+            batch = (json.dumps(message) + '\n').encode('utf-8')
+            self.socket.settimeout(timeout + len(batch) / 1e6)
+            self.socket.sendall(batch)
+            reply = json.loads(self.file.readline() or 'null')
+            if reply and reply.get('type') == 'ack' and reply.get('batch') == message['batch']:
+                return True
+        except (OSError, ValueError):
+            pass
+        self.disconnect()
+        return False
+
+    def spool_batch(self, message):
+        """
+        Append a batch that could not be sent to the aggregator to the spool file.
+
+        Parameters:
+        - message : dict
+            The batch.
+
+        Returns:
+        - None
+        """
+        os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+        with open(self.spool_path, 'a') as file:
+            file.write(json.dumps({**message, 'spooled': True}) + '\n')
+
+    def read_spooled_batches(self):
+        """Read the batches of the spool file; a last batch that was cut off (e.g. by a crash) is skipped."""
+        messages = []
+        with open(self.spool_path) as file:
+            for line in file:
+                try:
+                    messages.append(json.loads(line))
+                except ValueError:
+                    break
+        return messages
+
+    def send_spooled_batches(self):
+        """
+        Send all batches of the spool file to the aggregator, and remove the file once all were confirmed. If a batch 
+        is not confirmed, the file is rewritten with this batch and the following ones, so the confirmed batches are 
+        not sent again.
+
+        Returns:
+        - sent : bool
+            True if the spool file is empty now (or did not exist).
+        """
+        if not os.path.exists(self.spool_path):
+            return True
+        messages = self.read_spooled_batches()
+        for index, message in enumerate(messages):
+            if not self.send_batch(message):
+                if index:
+                    with open(self.spool_path + '.tmp', 'w') as file:
+                        file.writelines(json.dumps(message) + '\n' for message in messages[index:])
+                    os.replace(self.spool_path + '.tmp', self.spool_path)
+                return False
+        os.remove(self.spool_path)
+        return True
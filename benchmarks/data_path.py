@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Data-path benchmark for sart.py and the analysis scripts.
+
+Measures how long `save_data` needs to write data files of different sizes (including the
+journal and, with --binary, the binary data file) and how fast the data files of a study are
+merged by `sart_metrics.read_data` and `load_data.update_store`. All files are written to a
+temporary folder, so the data folder of the repository is not touched.
+
+Usage (from the repository folder):
+    python benchmarks/data_path.py                        # Print the report
+    python benchmarks/data_path.py --rows 1000 100000     # Only these file sizes
+    python benchmarks/data_path.py --json data_path.json
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Repository folder (sart.py is imported from here)
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repository)
+sys.path.insert(0, os.path.join(repository, 'data_analysis'))
+
+import sart
+
+# Numbers of rows saved with one call of `save_data`
+default_rows = [1000, 100000, 1000000]
+
+# Number of data files and rows per file of the merged study
+default_files = 200
+rows_per_file = 250
+
+def make_trials(n_rows, seed=0):
+    """
+    Create random trials like those returned by `run_block`.
+
+    Parameters:
+    - n_rows : int
+        Number of trials.
+    - seed : int, optional
+        Seed of the random values. Default is 0.
+
+    Returns:
+    - trials : list of sart.TrialRecord
+    """
+    rng = random.Random(seed)
+    trials = []
+    for trial in range(n_rows):
+        digit = rng.randint(1, 9)
+        go_trial = int(digit != sart.inhibition_number)
+        responded = rng.random() < .9
+        onset = trial * 1.15
+        reaction_duration = rng.uniform(.2, .6) if responded else None
+        trials.append(sart.TrialRecord(
+            digit=digit, stimulus_size=rng.randint(1, 5), go_trial=go_trial,
+            key=sart.response_key if responded else None, status=int(responded == bool(go_trial)),
+            stimulus_time=onset, reaction_time=onset + reaction_duration if responded else None,
+            reaction_duration=reaction_duration, n_responses=int(responded)))
+    return trials
+
+def measure_save_data(n_rows, repeats=3):
+    """
+    Measure the time `save_data` needs to save a block of trials until the data is on disk.
+
+    Parameters:
+    - n_rows : int
+        Number of trials saved at once.
+    - repeats : int, optional
+        Number of measurements. Default is 3.
+
+    Returns:
+    - result : dict
+        'seconds' (median duration), 'rows' and 'rows_per_second'.
+    """
+    trials = make_trials(n_rows)
+    durations = []
+    for repeat in range(repeats):
+        sart.experiment_info.update({'participant': f'bench{n_rows}', 'session': '001', 'resume': 0,
+                                     'date': f'repeat{repeat}'})
+        sart.start_journal(sart.experiment_info)
+        start = time.perf_counter()
+        sart.save_data(current_data=trials, block=1)
+        durations.append(time.perf_counter() - start)
+    seconds = statistics.median(durations)
+    return {'seconds': seconds, 'rows': n_rows, 'rows_per_second': n_rows / seconds}
+
+def write_study(folder, n_files):
+    """
+    Write the data files of a simulated study for the merge benchmarks.
+
+    Parameters:
+    - folder : str
+        Folder for the data files.
+    - n_files : int
+        Number of data files (one per participant) with `rows_per_file` rows each.
+
+    Returns:
+    - n_rows : int
+        Number of rows of all files.
+    """
+    trials = make_trials(rows_per_file)
+    for participant in range(n_files):
+        rows = sart.build_rows(trials, ('sart2', f'p{participant:04d}', '001', 1, '2024-01-01_10h00.00.000', 0, 1))
+        with open(os.path.join(folder, f'sart2_p{participant:04d}_2024-01-01_10h00.00.000.csv'), 'w', newline='') as file:
+            csv.writer(file).writerows([sart.data_columns] + rows)
+    return n_files * rows_per_file
+
+def measure_merge(folder, n_rows, repeats=3):
+    """
+    Measure how fast the data files of a study are read and combined.
+
+    Parameters:
+    - folder : str
+        Folder with the data files (see `write_study`).
+    - n_rows : int
+        Number of rows of all files.
+    - repeats : int, optional
+        Number of measurements. Default is 3.
+
+    Returns:
+    - results : dict
+        Results ('seconds', 'rows', 'rows_per_second', 'megabytes_per_second') by name. The store of
+        load_data.py is only measured if pyarrow is installed.
+    """
+    import sart_metrics
+    megabytes = sum(os.path.getsize(path) for path in glob.glob(os.path.join(folder, '*.csv'))) / 1e6
+
+    def result(durations):
+        seconds = statistics.median(durations)
+        return {'seconds': seconds, 'rows': n_rows, 'rows_per_second': n_rows / seconds,
+                'megabytes_per_second': megabytes / seconds}
+
+    durations = []
+    for repeat in range(repeats):
+        start = time.perf_counter()
+        sart_metrics.read_data(folder, task_name='sart2')
+        durations.append(time.perf_counter() - start)
+    results = {'merge read_data': result(durations)}
+
+    try:
+        import pyarrow
+        import load_data
+    except ImportError:
+        return results
+
+    durations = []
+    for repeat in range(repeats):
+        store = os.path.join(folder, 'merged')
+        shutil.rmtree(store, ignore_errors=True)
+        start = time.perf_counter()
+        load_data.update_store(folder, store, task_name='sart2')
+        durations.append(time.perf_counter() - start)
+    results['merge update_store'] = result(durations)
+    return results
+
+def run_benchmark(rows=default_rows, n_files=default_files, repeats=3, binary=False):
+    """
+    Measure the costs of saving and merging data.
+
+    Parameters:
+    - rows : list of int, optional
+        Numbers of rows saved with one call of `save_data`. Default is 1,000, 100,000 and 1,000,000.
+    - n_files : int, optional
+        Number of data files of the merged study. 0 = no merge benchmark. Default is 200.
+    - repeats : int, optional
+        Number of measurements. Default is 3.
+    - binary : bool, optional
+        If True, `save_data` also writes the binary data file. Default is False.
+
+    Returns:
+    - results : dict
+        Results ('seconds', 'rows', 'rows_per_second', ...) by name.
+    """
+    results = {}
+    settings = (sart.data_folder, sart.save_binary, dict(sart.experiment_info))
+    with tempfile.TemporaryDirectory() as folder:
+        sart.data_folder, sart.save_binary = os.path.join(folder, 'data'), binary
+        os.makedirs(sart.data_folder)
+        try:
+            for n_rows in rows:
+                results[f'save_data {n_rows} rows'] = measure_save_data(n_rows, repeats=repeats)
+        finally:
+            sart.stop_data_writer()
+            sart.data_folder, sart.save_binary = settings[:2]
+            sart.experiment_info.clear()
+            sart.experiment_info.update(settings[2])
+
+        if n_files:
+            study = os.path.join(folder, 'study')
+            os.makedirs(study)
+            results.update(measure_merge(study, write_study(study, n_files), repeats=repeats))
+    return results
+
+def print_report(results):
+    """Print the results of `run_benchmark`."""
+    for name, result in results.items():
+        print(f"{name:<28} {result['seconds'] * 1000:10.1f} ms {result['rows_per_second']:12,.0f} rows/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=default_rows, help='Numbers of rows saved at once (default: 1000 100000 1000000)')
+    parser.add_argument('--files', type=int, default=default_files, help='Number of data files merged, 0 = none (default: 200)')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of measurements (default: 3)')
+    parser.add_argument('--binary', action='store_true', help='Also write the binary data files')
+    parser.add_argument('--json', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = run_benchmark(rows=args.rows, n_files=args.files, repeats=args.repeats, binary=args.binary)
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Run all benchmarks of sart.py and compare them with a stored baseline.
+
+Runs the benchmarks of this folder (startup.py, trial_loop.py and data_path.py), all headless,
+and writes their results to a JSON file together with information about the computer and the
+version of the code. To check a change of e.g. `run_block` or `save_data`, save a baseline before
+the change and compare the results after the change with it:
+
+    python benchmarks/run_benchmarks.py --output baseline.json           # Before the change
+    python benchmarks/run_benchmarks.py --baseline baseline.json         # After the change
+
+The comparison lists the ratio of the durations (after / before) of every benchmark and fails if
+a benchmark got slower than the tolerance allows. Baselines are only comparable on the same
+computer.
+
+Usage (from the repository folder):
+    python benchmarks/run_benchmarks.py                                   # Print the results, save benchmarks.json
+    python benchmarks/run_benchmarks.py --quick                           # Smaller sizes (without 1,000,000 rows)
+    python benchmarks/run_benchmarks.py --baseline baseline.json --tolerance 0.2
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import data_path
+import startup
+import trial_loop
+
+def get_version():
+    """Return the current git commit of the repository (with '-dirty' for uncommitted changes), or None."""
+    try:
+        commit = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=startup.repository,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit or None
+
+def run_suite(quick=False, repeats=3):
+    """
+    Run all benchmarks.
+
+    Parameters:
+    - quick : bool, optional
+        If True, use smaller sizes (one test block per session, at most 100,000 rows, 50 data files). Default is False.
+    - repeats : int, optional
+        Number of measurements per benchmark. Default is 3.
+
+    Returns:
+    - suite : dict
+        'info' (computer, Python version, commit, date, settings) and 'results' (by benchmark name a dict with the
+        median duration in 'seconds' and further values such as 'rows_per_second').
+    """
+    results = {}
+    for name, seconds in startup.run_benchmark(repeats=repeats).items():
+        if seconds is not None:
+            results[f'startup {name}'] = {'seconds': seconds}
+    results.update(trial_loop.run_benchmark(blocks=1 if quick else 4, repeats=repeats))
+    results.update(data_path.run_benchmark(rows=[1000, 100000] if quick else data_path.default_rows,
+                                           n_files=50 if quick else data_path.default_files, repeats=repeats))
+
+    info = {'date': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': get_version(),
+            'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.node(),
+            'quick': quick, 'repeats': repeats}
+    return {'info': info, 'results': results}
+
+def compare(suite, baseline, tolerance=.1):
+    """
+    Compare the results of a suite with a baseline.
+
+    Parameters:
+    - suite, baseline : dict
+        Results of `run_suite` (the baseline e.g. read from a JSON file).
+    - tolerance : float, optional
+        Allowed increase of the durations (.1 = 10 % slower). Default is .1.
+
+    Returns:
+    - comparison : list of tuples
+        (name, baseline seconds, seconds, ratio, slower) for every benchmark in both results; 'slower' is True
+        if the ratio is larger than 1 + tolerance.
+    """
+    comparison = []
+    for name, result in suite['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        ratio = result['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        comparison.append((name, before['seconds'], result['seconds'], ratio, ratio > 1 + tolerance))
+    return comparison
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='benchmarks.json', help='Write the results to this JSON file (default: benchmarks.json)')
+    parser.add_argument('--baseline', help='Compare the results with this JSON file of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=.1, help='Allowed slowdown compared to the baseline (default: 0.1 = 10 %%)')
+    parser.add_argument('--quick', action='store_true', help='Use smaller sizes')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of measurements per benchmark (default: 3)')
+    args = parser.parse_args()
+
+    suite = run_suite(quick=args.quick, repeats=args.repeats)
+    with open(args.output, 'w') as file:
+        json.dump(suite, file, indent=2)
+
+    if not args.baseline:
+        for name, result in suite['results'].items():
+            print(f"{name:<36} {result['seconds'] * 1000:12.3f} ms")
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline['info'].get('machine') != suite['info']['machine']:
+        print('Warning: the baseline was measured on another computer', file=sys.stderr)
+
+    comparison = compare(suite, baseline, tolerance=args.tolerance)
+    print(f"{'benchmark':<36} {'baseline':>12} {'now':>12} {'ratio':>7}")
+    for name, before, after, ratio, slower in comparison:
+        print(f"{name:<36} {before * 1000:9.3f} ms {after * 1000:9.3f} ms {ratio:7.2f}{'  SLOWER' if slower else ''}")
+
+    # Catch regressions
+    if any(slower for *values, slower in comparison):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Startup-time benchmark for sart.py.
+
+Measures how long it takes to import the experiment script, to import the heavy
+modules it uses (PsychoPy and PIL) and to open a PsychoPy window. Every
+measurement runs in a fresh Python process, so that no module is already loaded.
+
+Usage (from the repository folder):
+    python benchmarks/startup.py                 # Print the report
+    python benchmarks/startup.py --window        # Also measure window creation (needs a display)
+    python benchmarks/startup.py --limit 0.5     # Fail if importing sart.py takes longer than 0.5 seconds
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Repository folder (sart.py is imported from here)
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose import time is measured
+modules = ['sart', 'psychopy.visual', 'psychopy.core', 'psychopy.event', 'psychopy.data', 'psychopy.gui', 'PIL.Image']
+
+# Code run in a fresh process to measure window creation
+window_code = """
+import time
+start = time.perf_counter()
+from psychopy import visual
+imported = time.perf_counter()
+win = visual.Window(size=(400, 300), fullscr=False, color="black", units="norm")
+win.flip()
+created = time.perf_counter()
+win.close()
+print(created - imported)
+"""
+
+def time_in_fresh_process(code):
+    """
+    Run Python code in a fresh process and return the number it prints.
+
+    Parameters:
+    - code : str
+        Python code that prints a duration (in seconds) as its last output line.
+
+    Returns:
+    - duration : float or None
+        The printed duration, or None if the code failed (e.g. because a module is not installed).
+    """
+    result = subprocess.run([sys.executable, '-c', code], cwd=repository,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+def measure_import(module, repeats):
+    """
+    Measure the import time of a module in fresh processes.
+
+    Parameters:
+    - module : str
+        Name of the module.
+    - repeats : int
+        Number of measurements.
+
+    Returns:
+    - duration : float or None
+        Median import time (in seconds), or None if the module could not be imported.
+    """
+    code = (f"import time\nstart = time.perf_counter()\nimport {module}\n"
+            f"print(time.perf_counter() - start)")
+    durations = [time_in_fresh_process(code) for repeat in range(repeats)]
+    if None in durations:
+        return None
+    return statistics.median(durations)
+
+def run_benchmark(repeats=5, window=False):
+    """
+    Measure the startup costs of the experiment.
+
+    Parameters:
+    - repeats : int, optional
+        Number of measurements per module. Default is 5.
+    - window : bool, optional
+        If True, also measure the creation of a PsychoPy window. Default is False.
+
+    Returns:
+    - results : dict
+        Median durations (in seconds) by name ('import <module>' and 'window creation').
+        None means the measurement was not possible.
+    """
+    results = {}
+    for module in modules:
+        results[f'import {module}'] = measure_import(module, repeats)
+    if window:
+        results['window creation'] = time_in_fresh_process(window_code)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=5, help='Number of measurements per module (default: 5)')
+    parser.add_argument('--window', action='store_true', help='Also measure window creation (needs a display)')
+    parser.add_argument('--json', help='Write the results to this JSON file')
+    parser.add_argument('--limit', type=float, help='Fail if importing sart.py takes longer (in seconds)')
+    args = parser.parse_args()
+
+    results = run_benchmark(repeats=args.repeats, window=args.window)
+
+    # Print report
+    for name, duration in results.items():
+        value = 'not available' if duration is None else f'{duration * 1000:8.1f} ms'
+        print(f'{name:<25} {value}')
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    # Catch regressions of the startup time
+    if args.limit is not None and (results['import sart'] is None or results['import sart'] > args.limit):
+        print(f'Importing sart.py takes longer than {args.limit} s', file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Trial-loop benchmark for sart.py.
+
+Measures the cost of creating the digit stimuli (`build_stimulus_cache`) and the time the trial
+loop (`run_block`, `save_data`, the journal, ...) spends per trial in addition to the intended
+display times, with and without profiling (`profile_session`). Both run headless by default: the display is replaced by the simulated window of
+simulation.py, whose clock only advances by one frame per flip, so all measured time is overhead
+of sart.py. With --window, stimulus creation is measured with a real PsychoPy window as well.
+
+Usage (from the repository folder):
+    python benchmarks/trial_loop.py                      # Print the report
+    python benchmarks/trial_loop.py --blocks 10          # More trials per measurement
+    python benchmarks/trial_loop.py --window             # Also create real stimuli (needs a display)
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Repository folder (sart.py is imported from here)
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repository)
+
+import sart
+import simulation
+
+def measure_stimulus_creation(win, repeats=5):
+    """
+    Measure how long it takes to create all digit stimuli, and to find them in the cache again.
+
+    Parameters:
+    - win : visual.Window or simulation.SimulatedWindow
+        The window of the stimuli.
+    - repeats : int, optional
+        Number of measurements. Default is 5.
+
+    Returns:
+    - results : dict
+        Results ('seconds', 'stimuli') for creating all stimuli ('stimulus creation') and for a second call of
+        `build_stimulus_cache` with the stimuli already in the cache ('stimulus cache hit').
+    """
+    config = sart.make_config()
+    created, cached = [], []
+    for repeat in range(repeats):
+        sart.stimulus_cache.clear()
+        start = time.perf_counter()
+        sart.build_stimulus_cache(win, config=config)
+        created.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        sart.build_stimulus_cache(win, config=config)
+        cached.append(time.perf_counter() - start)
+    sart.stimulus_cache.clear()
+
+    n_stimuli = len(config.digit_range) * len(config.stimuli_heights)
+    return {'stimulus creation': {'seconds': statistics.median(created), 'stimuli': n_stimuli},
+            'stimulus cache hit': {'seconds': statistics.median(cached), 'stimuli': n_stimuli}}
+
+def measure_headless_stimuli(repeats=5):
+    """Run `measure_stimulus_creation` with the simulated window and stimuli of simulation.py."""
+    win = simulation.SimulatedWindow(simulation.ResponseModel())
+    visual, sart.visual = sart.visual, simulation.SimulatedVisual()
+    try:
+        results = measure_stimulus_creation(win, repeats=repeats)
+    finally:
+        sart.visual = visual
+    return {f'{name} (headless)': result for name, result in results.items()}
+
+def measure_window_stimuli(repeats=5):
+    """Run `measure_stimulus_creation` with a real PsychoPy window (needs a display)."""
+    win = sart.visual.Window(size=(400, 300), fullscr=False, color="black", units="height")
+    try:
+        return measure_stimulus_creation(win, repeats=repeats)
+    finally:
+        win.close()
+
+def measure_trial_overhead(blocks=4, repeats=3, profiled=False):
+    """
+    Measure the time spent per trial by a simulated session (without training and attention ratings).
+
+    Parameters:
+    - blocks : int, optional
+        Number of test blocks per session. Default is 4.
+    - repeats : int, optional
+        Number of measurements. Default is 3.
+    - profiled : bool, optional
+        If True, the sessions are profiled ('profile_session' in sart.py), to measure the cost of profiling. Default is False.
+
+    Returns:
+    - result : dict
+        'seconds' (median duration per trial), 'trials' (per session) and 'trials_per_second'.
+    """
+    config = sart.make_config()
+    n_trials = blocks * config.n_trials_test
+    durations = []
+    profile_session, sart.profile_session = sart.profile_session, profiled
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            for repeat in range(repeats):
+                start = time.perf_counter()
+                simulation.simulate_session(f'bench{repeat}', seed=repeat, training=0, testing=blocks, rating=0,
+                                            output=folder, config=config)
+                durations.append((time.perf_counter() - start) / n_trials)
+        finally:
+            sart.profile_session = profile_session
+            sart.stop_data_writer()
+    seconds = statistics.median(durations)
+    return {'seconds': seconds, 'trials': n_trials, 'trials_per_second': 1 / seconds}
+
+def run_benchmark(blocks=4, repeats=3, window=False):
+    """
+    Measure the costs of stimulus creation and of the trial loop.
+
+    Parameters:
+    - blocks : int, optional
+        Number of test blocks of the simulated sessions. Default is 4.
+    - repeats : int, optional
+        Number of measurements. Default is 3.
+    - window : bool, optional
+        If True, also measure stimulus creation with a real PsychoPy window. Default is False.
+
+    Returns:
+    - results : dict
+        Results ('seconds', ...) by name.
+    """
+    results = measure_headless_stimuli(repeats=repeats)
+    if window:
+        results.update(measure_window_stimuli(repeats=repeats))
+    results['trial overhead (headless)'] = measure_trial_overhead(blocks=blocks, repeats=repeats)
+    results['trial overhead (profiled)'] = measure_trial_overhead(blocks=blocks, repeats=repeats, profiled=True)
+    return results
+
+def print_report(results):
+    """Print the results of `run_benchmark`."""
+    for name, result in results.items():
+        print(f"{name:<32} {result['seconds'] * 1000:10.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blocks', type=int, default=4, help='Number of test blocks per simulated session (default: 4)')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of measurements (default: 3)')
+    parser.add_argument('--window', action='store_true', help='Also create stimuli in a real window (needs a display)')
+    parser.add_argument('--json', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = run_benchmark(blocks=args.blocks, repeats=args.repeats, window=args.window)
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == '__main__':
+    main()
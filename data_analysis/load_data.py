@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Merge all data files of a study into one columnar store, reading only what is new.
+
+Data files are read in parallel with the column types of `codebook_data.txt`. A manifest
+remembers the size, modification time and number of bytes already read of every file. Because
+`save_data` only appends to data files, later runs only parse the bytes added since the last run
+(and files that are new). The rows are stored as Parquet files in one folder (the store), which
+analyses can open quickly with `load_store` instead of parsing all CSV files again.
+
+Files that were changed in another way than by appending (e.g. rewritten when a session was
+resumed) are read again completely.
+
+Requires pyarrow (pip install pyarrow) for the Parquet files.
+
+The binary data files of sart.py (setting `save_binary`) are read with `read_binary` and
+`read_binary_folder` without parsing any text; they do not need pyarrow.
+
+Usage (from the folder data_analysis):
+    python load_data.py                          # Update the store ../data/merged from ../data
+    python load_data.py ../data --store ../data/merged --processes 4
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Column types according to codebook_data.txt (nullable integers, because e.g. ratings have no digit)
+column_types = {
+    'experiment_name': 'string',
+    'participant': 'string',
+    'session': 'string',
+    'block': 'Int16',
+    'date': 'string',
+    'training': 'Int8',
+    'test': 'Int8',
+    'rating': 'Int8',
+    'digit': 'Int8',
+    'stimulus_size': 'Int8',
+    'go_trial': 'Int8',
+    'key': 'string',
+    'status': 'Int8',
+    'stimulus_time': 'float64',
+    'reaction_time': 'float64',
+    'reaction_duration': 'float64',
+    'attention_rating': 'Int8',
+    'n_responses': 'Int8',
+    'adaptive_level': 'float64',
+    'adaptive_digit_time': 'float64',
+    'adaptive_mask_time': 'float64',
+    'adaptive_nogo_probability': 'float64',
+}
+
+# numpy types of the struct codes used in the binary data files
+binary_types = {'b': 'i1', 'h': 'i2', 'd': 'f8'}
+
+# Number of bytes before the read position that must stay unchanged for a file to count as appended
+signature_length = 256
+
+def read_new_rows(path, offset=0, columns=None):
+    """
+    Read the complete rows of a data file from a byte offset on.
+
+    Parameters:
+    - path : str
+        Path to the data file.
+    - offset : int, optional
+        Number of bytes already read. If 0, the file is read from the beginning including its header. Default is 0.
+    - columns : list of str, optional
+        Column names (from the header read before). Required if `offset` is larger than 0.
+
+    Returns:
+    - rows : pandas.DataFrame
+        The new rows with the column types of the codebook and the column 'source_file'.
+    - info : dict
+        'offset': Bytes read up to the end of the last complete row; 'columns': The column names;
+        'signature': Hash of the bytes before the new offset.
+    """
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        content = file.read()
+
+    # Only read complete rows; a row that is just being written is read next time
+    end = content.rfind(b'\n') + 1
+    content = content[:end]
+
+    if offset == 0:
+        header, _, content = content.partition(b'\n')
+        columns = header.decode('utf-8').strip().split(',')
+
+    types = {column: column_types[column] for column in columns if column in column_types}
+    if content:
+        rows = pd.read_csv(io.BytesIO(content), header=None, names=columns, dtype=types)
+    else:
+        rows = pd.DataFrame({column: pd.Series(dtype=types.get(column, 'object')) for column in columns})
+    rows['source_file'] = os.path.basename(path)
+
+    new_offset = offset + end
+    return rows, {'offset': new_offset, 'columns': columns, 'signature': read_signature(path, new_offset)}
+
+def read_signature(path, offset):
+    """Hash of the bytes of a file just before `offset`, used to check that a file was only appended to."""
+    with open(path, 'rb') as file:
+        start = max(0, offset - signature_length)
+        file.seek(start)
+        return hashlib.sha1(file.read(offset - start)).hexdigest()
+
+def plan_reads(files, manifest):
+    """
+    Decide which bytes of which files have to be read.
+
+    Parameters:
+    - files : list of str
+        Paths to all data files.
+    - manifest : dict
+        Information about the files read before (see `update_store`).
+
+    Returns:
+    - reads : list of tuples
+        (path, offset, columns) for every file with new data; offset 0 means the file is read completely.
+    - rewritten : list of str
+        Names of files whose stored rows have to be removed because the file is read again completely.
+    """
+    reads = []
+    rewritten = []
+    for path in files:
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        known = manifest['files'].get(name)
+        if known is None:
+            reads.append((path, 0, None))
+        elif stat.st_size == known['size'] and stat.st_mtime == known['mtime']:
+            continue
+        elif stat.st_size >= known['offset'] and read_signature(path, known['offset']) == known['signature']:
+            reads.append((path, known['offset'], known['columns']))
+        else:
+            rewritten.append(name)
+            reads.append((path, 0, None))
+    return reads, rewritten
+
+def read_parallel(reads, processes=None):
+    """Run `read_new_rows` for all planned reads in a process pool and return the results in the same order."""
+    if processes == 1 or len(reads) < 2:
+        return [read_new_rows(*read) for read in reads]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(read_new_rows, *zip(*reads), chunksize=max(1, len(reads) // 64)))
+
+def update_store(folder, store, processes=None, task_name='sart'):
+    """
+    Add new and appended rows of all data files to the store.
+
+    Parameters:
+    - folder : str
+        Folder containing the data files.
+    - store : str
+        Folder of the store (created if it does not exist). It contains Parquet files ('part-00001.parquet', ...)
+        and the manifest ('manifest.json').
+    - processes : int, optional
+        Number of processes reading files in parallel. Default is the number of CPU cores.
+    - task_name : str, optional
+        Beginning of the names of the data files. Default is 'sart'.
+
+    Returns:
+    - n_rows : int
+        Number of rows added to the store.
+    """
+    os.makedirs(store, exist_ok=True)
+    manifest_path = os.path.join(store, 'manifest.json')
+    manifest = {'files': {}, 'parts': {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+
+    files = sorted(glob.glob(os.path.join(folder, f'{task_name}*.csv')))
+    reads, rewritten = plan_reads(files, manifest)
+    if not reads:
+        return 0
+
+    # Remove rows of files that are read again completely
+    if rewritten:
+        remove_rows(store, manifest, set(rewritten))
+
+    results = read_parallel(reads, processes=processes)
+
+    # Write all new rows into one new part of the store
+    new_rows = pd.concat([rows for rows, info in results], ignore_index=True)
+    part = f'part-{len(manifest["parts"]) + 1:05d}.parquet'
+    while part in manifest['parts']:
+        part = f'part-{int(part[5:10]) + 1:05d}.parquet'
+    if len(new_rows):
+        new_rows.to_parquet(os.path.join(store, part), index=False)
+        manifest['parts'][part] = sorted(new_rows['source_file'].unique().tolist())
+
+    # Remember what was read
+    for (path, offset, columns), (rows, info) in zip(reads, results):
+        stat = os.stat(path)
+        manifest['files'][os.path.basename(path)] = {'size': stat.st_size, 'mtime': stat.st_mtime, **info}
+
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump(manifest, file)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    return len(new_rows)
+
+def remove_rows(store, manifest, names):
+    """Remove the rows of the given data files from all parts of the store that contain them."""
+    for part, sources in list(manifest['parts'].items()):
+        if not names.intersection(sources):
+            continue
+        path = os.path.join(store, part)
+        rows = pd.read_parquet(path)
+        rows = rows[~rows['source_file'].isin(names)]
+        if len(rows):
+            rows.to_parquet(path, index=False)
+            manifest['parts'][part] = sorted(set(sources) - names)
+        else:
+            os.remove(path)
+            del manifest['parts'][part]
+    for name in names:
+        manifest['files'].pop(name, None)
+
+def load_store(store, columns=None):
+    """
+    Open the merged data of a study.
+
+    Parameters:
+    - store : str
+        Folder of the store (see `update_store`).
+    - columns : list of str, optional
+        Only read these columns. Default is all columns.
+
+    Returns:
+    - data : pandas.DataFrame
+        All rows of all data files, with the column types of the codebook and the column 'source_file'.
+    """
+    parts = sorted(glob.glob(os.path.join(store, 'part-*.parquet')))
+    if not parts:
+        return pd.DataFrame(columns=list(column_types) + ['source_file'])
+    return pd.concat([pd.read_parquet(part, columns=columns, memory_map=True) for part in parts],
+                     ignore_index=True)
+
+def read_binary(path):
+    """
+    Read a binary data file of sart.py (see `encode_binary_rows` in sart.py).
+
+    The file is memory-mapped, so only the columns that are used are actually read from disk.
+
+    Parameters:
+    - path : str
+        Path to the binary data file ('.bin'). The dictionary file with the same name ('.json') must exist.
+
+    Returns:
+    - rows : pandas.DataFrame
+        The rows with the column types of the codebook and the column 'source_file'.
+    """
+    with open(os.path.splitext(path)[0] + '.json') as file:
+        header = json.load(file)
+    byte_order, codes = header['format'][0], header['format'][1:]
+    dtype = np.dtype([(column, byte_order + binary_types[code]) for column, code in zip(header['columns'], codes)])
+
+    # A record that is just being written is read next time
+    n_records = os.path.getsize(path) // dtype.itemsize
+    if n_records:
+        records = np.memmap(path, dtype=dtype, mode='r', shape=(n_records,))
+    else:
+        records = np.zeros(0, dtype=dtype)
+
+    rows = {}
+    for column in header['columns']:
+        values = records[column]
+        if column in header['dictionaries']:
+            texts = np.array(header['dictionaries'][column] + [None], dtype=object)
+            # Missing values (-1) refer to the last entry (None)
+            rows[column] = pd.array(texts[values], dtype=column_types.get(column, 'string'))
+        elif values.dtype.kind == 'i':
+            values = pd.Series(values, dtype=column_types.get(column, 'Int16'))
+            rows[column] = values.mask(values == header['missing'])
+        else:
+            rows[column] = np.asarray(values)
+    rows = pd.DataFrame(rows)
+    rows['source_file'] = os.path.basename(path)
+    return rows
+
+def read_binary_folder(folder, task_name='sart'):
+    """
+    Read and combine all binary data files of a study.
+
+    Parameters:
+    - folder : str
+        Folder containing the binary data files (the subfolder 'binary' of the data folder).
+    - task_name : str, optional
+        Beginning of the names of the data files. Default is 'sart'.
+
+    Returns:
+    - data : pandas.DataFrame
+        The rows of all binary data files.
+    """
+    files = sorted(glob.glob(os.path.join(folder, f'{task_name}*.bin')))
+    if not files:
+        return pd.DataFrame(columns=list(column_types) + ['source_file'])
+    return pd.concat([read_binary(file) for file in files], ignore_index=True)
+
+def main():
+    default_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folder', nargs='?', default=default_folder, help='Folder containing the data files (default: ../data)')
+    parser.add_argument('--store', help='Folder of the store (default: subfolder "merged" of the data folder)')
+    parser.add_argument('--processes', type=int, default=None, help='Number of processes (default: number of CPU cores)')
+    args = parser.parse_args()
+
+    store = args.store or os.path.join(args.folder, 'merged')
+    n_rows = update_store(args.folder, store, processes=args.processes)
+    print(f'{n_rows} new rows added to {store}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compute the standard SART measures per participant and per block.
+
+The measures are computed from the columns described in `codebook_data.txt`:
+- n_go, n_nogo: Number of go and no-go trials.
+- commission_errors, commission_rate: Responses in no-go trials (count and proportion of no-go trials).
+- omission_errors, omission_rate: Missing responses in go trials (count and proportion of go trials).
+- rt_mean, rt_sd, rt_cv: Mean, standard deviation and coefficient of variation (sd / mean) of the
+  reaction times of correct go trials.
+- pre_error_rt, pre_correct_rt, pre_error_speeding: Mean reaction time of the go trials in the four
+  trials before commission errors and before correctly withheld no-go trials; the speeding is
+  their difference (positive values mean faster responses before errors).
+- post_error_rt, post_correct_rt, post_error_slowing: Mean reaction time of the go trial directly
+  after commission errors and after correctly withheld no-go trials; the slowing is their
+  difference (positive values mean slower responses after errors).
+
+All computations are vectorized, so tens of thousands of trials take well under a second.
+
+Usage (from the folder data_analysis):
+    python sart_metrics.py                       # Read ../data and print the measures per participant
+    python sart_metrics.py --by-block -o metrics.csv
+    python sart_metrics.py --store ../data/merged  # Read new data incrementally via load_data.py
+    python sart_metrics.py --binary              # Read the binary data files in ../data/binary
+"""
+
+import argparse
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+# Number of trials before an error used for the pre-error speeding
+pre_error_window = 4
+
+# Columns identifying one session of a participant
+session_columns = ['participant', 'session', 'date']
+
+def read_data(folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'), task_name='sart'):
+    """
+    Read and combine all data files of a study.
+
+    Parameters:
+    - folder : str, optional
+        Folder containing the data files. Default is the folder 'data' of the repository.
+    - task_name : str, optional
+        Beginning of the names of the data files. Default is 'sart'.
+
+    Returns:
+    - data : pandas.DataFrame
+        The rows of all data files (an empty data frame without columns if there are no data files).
+    """
+    files = sorted(glob.glob(os.path.join(folder, f'{task_name}*.csv')))
+    if not files:
+        return pd.DataFrame()
+    return pd.concat([pd.read_csv(file, dtype={'participant': str, 'session': str}) for file in files],
+                     ignore_index=True)
+
+def prepare_trials(data):
+    """
+    Select the trials (without attention ratings and exit rows) and add the columns used by the measures.
+
+    Parameters:
+    - data : pandas.DataFrame
+        Rows of one or more data files.
+
+    Returns:
+    - trials : pandas.DataFrame
+        The trials in their original order with the additional columns:
+        - 'trial': Number of the trial within the block (starting at 1).
+        - 'commission': 1 for a response in a no-go trial, otherwise 0.
+        - 'omission': 1 for a missing response in a go trial, otherwise 0.
+        - 'rt': Reaction time of correct go trials, otherwise NaN.
+    """
+    rating_rows = data['rating'].fillna(0) == 1
+    trials = data[data['digit'].notna() & ~rating_rows].copy()
+    go = (trials['go_trial'] == 1).astype(bool)
+    correct = (trials['status'] == 1).astype(bool)
+
+    trials['trial'] = trials.groupby(session_columns + ['block'], sort=False).cumcount() + 1
+    trials['commission'] = (~go & ~correct).astype(int)
+    trials['omission'] = (go & ~correct).astype(int)
+    trials['rt'] = trials['reaction_duration'].where(go & correct)
+    return trials
+
+def add_sequential_rts(trials):
+    """
+    Add the reaction times around no-go trials, used for pre-error speeding and post-error slowing.
+
+    Parameters:
+    - trials : pandas.DataFrame
+        Trials as returned by `prepare_trials`.
+
+    Returns:
+    - trials : pandas.DataFrame
+        The trials with the additional columns 'pre_rt' (mean reaction time of the preceding go trials
+        within the window of `pre_error_window` trials) and 'post_rt' (reaction time of the next trial
+        if it is a correct go trial). Trials of different blocks are never combined.
+    """
+    grouped_rt = trials.groupby(session_columns + ['block'], sort=False)['rt']
+    previous = np.column_stack([grouped_rt.shift(lag).to_numpy() for lag in range(1, pre_error_window + 1)])
+
+    # Mean of the available reaction times in the window (NaN if none is available)
+    counts = np.sum(~np.isnan(previous), axis=1)
+    sums = np.nansum(previous, axis=1)
+    trials['pre_rt'] = np.divide(sums, counts, out=np.full(len(trials), np.nan), where=counts > 0)
+    trials['post_rt'] = grouped_rt.shift(-1)
+    return trials
+
+def summarise(trials, by):
+    """
+    Compute the SART measures for groups of trials.
+
+    Parameters:
+    - trials : pandas.DataFrame
+        Trials as returned by `add_sequential_rts`.
+    - by : list of str
+        Columns defining the groups.
+
+    Returns:
+    - metrics : pandas.DataFrame
+        One row per group with the measures described at the top of this file.
+    """
+    nogo = trials['go_trial'] == 0
+    error = nogo & (trials['commission'] == 1)
+    withheld = nogo & (trials['commission'] == 0)
+
+    # Columns that are only filled for the trials a measure is based on
+    columns = trials[by].copy()
+    columns['go'] = (trials['go_trial'] == 1).astype(int)
+    columns['nogo'] = nogo.astype(int)
+    columns['commission'] = trials['commission']
+    columns['omission'] = trials['omission']
+    columns['rt'] = trials['rt']
+    columns['pre_error_rt'] = trials['pre_rt'].where(error)
+    columns['pre_correct_rt'] = trials['pre_rt'].where(withheld)
+    columns['post_error_rt'] = trials['post_rt'].where(error)
+    columns['post_correct_rt'] = trials['post_rt'].where(withheld)
+
+    grouped = columns.groupby(by, sort=True)
+    metrics = grouped.agg(
+        n_go=('go', 'sum'),
+        n_nogo=('nogo', 'sum'),
+        commission_errors=('commission', 'sum'),
+        omission_errors=('omission', 'sum'),
+        rt_mean=('rt', 'mean'),
+        rt_sd=('rt', 'std'),
+        pre_error_rt=('pre_error_rt', 'mean'),
+        pre_correct_rt=('pre_correct_rt', 'mean'),
+        post_error_rt=('post_error_rt', 'mean'),
+        post_correct_rt=('post_correct_rt', 'mean'),
+    )
+    metrics['commission_rate'] = metrics['commission_errors'] / metrics['n_nogo'].replace(0, np.nan)
+    metrics['omission_rate'] = metrics['omission_errors'] / metrics['n_go'].replace(0, np.nan)
+    metrics['rt_cv'] = metrics['rt_sd'] / metrics['rt_mean']
+    metrics['pre_error_speeding'] = metrics['pre_correct_rt'] - metrics['pre_error_rt']
+    metrics['post_error_slowing'] = metrics['post_error_rt'] - metrics['post_correct_rt']
+
+    order = ['n_go', 'n_nogo', 'commission_errors', 'commission_rate', 'omission_errors', 'omission_rate',
+             'rt_mean', 'rt_sd', 'rt_cv', 'pre_error_rt', 'pre_correct_rt', 'pre_error_speeding',
+             'post_error_rt', 'post_correct_rt', 'post_error_slowing']
+    return metrics[order].reset_index()
+
+def compute_metrics(data, by_block=False, include_training=False):
+    """
+    Compute the SART measures per participant (and session), or per block.
+
+    Parameters:
+    - data : pandas.DataFrame
+        Rows of one or more data files (e.g., from `read_data`).
+    - by_block : bool, optional
+        If True, compute the measures for every block separately. Default is False.
+    - include_training : bool, optional
+        If True, the training block is included. Default is False.
+
+    Returns:
+    - metrics : pandas.DataFrame
+        One row per participant and session (and block) with the measures described at the top of this file.
+    """
+    trials = add_sequential_rts(prepare_trials(data))
+    if not include_training:
+        trials = trials[trials['training'] != 1]
+
+    by = session_columns + ['block'] if by_block else session_columns
+    return summarise(trials, by)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folder', nargs='?', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'),
+                        help='Folder containing the data files (default: ../data)')
+    parser.add_argument('--by-block', action='store_true', help='Compute the measures for every block')
+    parser.add_argument('--include-training', action='store_true', help='Include the training block')
+    parser.add_argument('--store', help='Update this store of load_data.py and read the data from it')
+    parser.add_argument('--binary', action='store_true', help='Read the binary data files in the subfolder "binary"')
+    parser.add_argument('-o', '--output', help='Save the measures in this CSV file')
+    args = parser.parse_args()
+
+    if args.binary:
+        import load_data
+        data = load_data.read_binary_folder(os.path.join(args.folder, 'binary'))
+    elif args.store:
+        import load_data
+        load_data.update_store(args.folder, args.store)
+        data = load_data.load_store(args.store)
+    else:
+        data = read_data(args.folder)
+
+    if data.empty:
+        print(f'No data found in {os.path.abspath(args.folder)}')
+        return
+
+    metrics = compute_metrics(data, by_block=args.by_block, include_training=args.include_training)
+    if args.output:
+        metrics.to_csv(args.output, index=False)
+    else:
+        print(metrics.to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Check all data files of a study before they are merged.
+
+Every data file is read once, line by line, and only the last rows are kept for finding
+duplicates (so memory does not grow with the size of the files), and files are checked in parallel. The columns are checked against `codebook_data.txt`
+and the values against the column types of `load_data.py`. Data files of older versions of the
+task, which saved whole numbers as decimal numbers (e.g. '5.0'), are accepted. Problems found:
+- missing_columns, unknown_columns: The header does not match the codebook. Columns described as
+  missing in data files of older versions may be missing.
+- truncated_file: The last line was cut off (e.g. by a crash while writing) or the file is empty.
+- malformed_row: A row has another number of values than the header.
+- repeated_header: The header appears again inside the file.
+- duplicate_row: A row is identical to one of the previous rows of the file (data appended
+  twice by repeated calls of `save_data`; real rows always differ in their timestamps). Only the
+  last `duplicate_window` rows are compared, which is more than one block.
+- invalid_value: A value does not have the type of its column.
+- impossible_reaction_duration: A reaction duration that is not positive, longer than the
+  digit and mask are shown, different from reaction_time - stimulus_time, or without a key.
+- incomplete_block: A block has fewer trials than expected and is not followed by an exit row,
+  so the session was interrupted (e.g. by a crash).
+- quitted_block: A block has fewer trials than expected because the session was quitted during
+  the block (an exit row follows its trials).
+- extra_trials: A block has more trials than expected (e.g. a block repeated after resuming).
+- exit_row: The session was quitted with the exit key (the row written by `check_for_quit`).
+
+The report is a CSV file with one row per file and problem (severity, number of rows or
+blocks with the problem, first line number and an example). Files without problems are not
+listed. The script exits with status 1 if an error was found, so it can stop a nightly merge.
+
+Usage (from the folder data_analysis):
+    python validate_data.py                      # Check ../data, write ../data/qc_report.csv
+    python validate_data.py ../data --trials-test 50 --processes 8 -o report.csv
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import csv
+import functools
+import glob
+import math
+import operator
+import os
+import re
+import sys
+
+from load_data import column_types
+
+# Codebook with the columns of the data files
+codebook_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'codebook_data.txt')
+
+# Defaults of sart.py (see 'Set variables' there)
+default_trials = {'training': 18, 'test': 75}
+default_exit_key = 'escape'
+default_max_reaction_duration = .25 + .9  # Responses are only recorded while the digit and the mask are shown
+
+# Number of previous rows compared with every row to find duplicates
+duplicate_window = 1000
+
+# Values of flags that are set (older versions of the task saved them as decimal numbers)
+set_flag = {'1', '1.0'}
+
+# Problems that do not make a file unusable (all others are errors)
+warning_problems = {'exit_row', 'quitted_block', 'extra_trials'}
+
+report_columns = ['file', 'problem', 'severity', 'count', 'first_line', 'example']
+
+def read_schema(path=codebook_path):
+    """
+    Read the columns of the data files from the codebook.
+
+    Parameters:
+    - path : str, optional
+        Path to the codebook. Default is 'codebook_data.txt' next to this script.
+
+    Returns:
+    - columns : list of str
+        The columns described in the first section of the codebook, in their order.
+    - optional : set of str
+        Columns that are missing in data files of older versions of the task.
+    """
+    columns, optional = [], set()
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                if columns:
+                    break
+                continue
+            names = re.findall(r"'(\w+)'", line.split(':')[0])
+            columns.extend(names)
+            if 'older versions' in line:
+                optional.update(names)
+    return columns, optional
+
+def make_number_check(header):
+    """
+    Build a check of all numbers of a row.
+
+    Whole numbers are checked at once as one joined text of digits, decimal numbers with one `map` of `float`, 
+    which is much faster than converting the values one by one in Python. Whole numbers saved as decimal numbers 
+    (e.g. '5.0', by older versions of the task) are only checked one by one if the joined text is not all digits.
+
+    Parameters:
+    - header : list of str
+        The columns of the data file.
+
+    Returns:
+    - check : callable
+        Takes a row and returns the names of the columns whose value is not a number of the column type (an empty
+        list if all values are valid).
+    """
+    def getter(kind):
+        positions = [position for position, column in enumerate(header) if column_types.get(column, 'string').startswith(kind)]
+        if len(positions) == 1:
+            return positions, lambda row: (row[positions[0]],)
+        return positions, operator.itemgetter(*positions) if positions else (lambda row: ())
+    integer_positions, get_integers = getter('Int')
+    float_positions, get_floats = getter('float')
+
+    def is_whole_number(value):
+        try:
+            return value.isdigit() or float(value).is_integer()
+        except ValueError:
+            return False
+
+    def check(row):
+        try:
+            # Missing values are empty; numbers of the data files are never negative
+            text = ''.join(get_integers(row))
+            if text and not text.isdigit() and not all(map(is_whole_number, filter(None, get_integers(row)))):
+                raise ValueError
+            sum(map(float, filter(None, get_floats(row))))
+            return []
+        except ValueError:
+            invalid = [header[position] for position in integer_positions
+                       if row[position] and not is_whole_number(row[position])]
+            for position in float_positions:
+                try:
+                    float(row[position] or 0)
+                except ValueError:
+                    invalid.append(header[position])
+            return invalid
+    return check
+
+def validate_file(path, columns, optional, trials=default_trials, exit_key=default_exit_key,
+                  max_reaction_duration=default_max_reaction_duration):
+    """
+    Check one data file.
+
+    Parameters:
+    - path : str
+        Path to the data file.
+    - columns, optional :
+        Columns of the codebook and those that may be missing (see `read_schema`).
+    - trials : dict, optional
+        Expected number of trials of the training block ('training') and of every test block ('test').
+        Default is 18 and 75 (the defaults of sart.py).
+    - exit_key : str, optional
+        Exit key of the sessions. Default is 'escape'.
+    - max_reaction_duration : float, optional
+        Longest possible reaction duration (in seconds). Default is 1.15 (digit and mask display time of sart.py).
+
+    Returns:
+    - problems : list of lists
+        One row per problem (see 'report_columns').
+    """
+    name = os.path.basename(path)
+    found = {}
+
+    def add(problem, line, example=''):
+        if problem in found:
+            found[problem][0] += 1
+        else:
+            found[problem] = [1, line, example]
+
+    with open(path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        if size:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b'\n':
+                add('truncated_file', None, 'last line has no line end')
+    if not size:
+        add('truncated_file', None, 'empty file')
+
+    with open(path, newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, [])
+        missing = [column for column in columns if column not in header and column not in optional]
+        if header and missing:
+            add('missing_columns', 1, ' '.join(missing))
+        unknown = [column for column in header if column not in columns]
+        if unknown:
+            add('unknown_columns', 1, ' '.join(unknown))
+
+        # Rows are only checked if all needed columns are there
+        if header and not missing:
+            digit, rating, training, block, key, stimulus_time, reaction_time, reaction_duration = (
+                header.index(column) for column in ['digit', 'rating', 'training', 'block', 'key', 'stimulus_time',
+                                                    'reaction_time', 'reaction_duration'])
+            check_numbers = make_number_check(header)
+            recent, seen = collections.deque(), set()
+            block_trials = {}
+            quitted_blocks = set()
+            last_block = None
+
+            for line, row in enumerate(reader, start=2):
+                if len(row) != len(header):
+                    add('malformed_row', line, f'{len(row)} values')
+                    continue
+                if row == header:
+                    add('repeated_header', line)
+                    continue
+                row_hash = hash(tuple(row))
+                if row_hash in seen:
+                    add('duplicate_row', line)
+                    continue
+                seen.add(row_hash)
+                recent.append(row_hash)
+                if len(recent) > duplicate_window:
+                    seen.discard(recent.popleft())
+
+                invalid = check_numbers(row)
+                if invalid:
+                    add('invalid_value', line, f'{invalid[0]}={row[header.index(invalid[0])]!r}')
+
+                # Row of the exit key (no block, no trial)
+                if row[key] == exit_key and not row[digit]:
+                    add('exit_row', line)
+                    if last_block is not None:
+                        quitted_blocks.add(last_block)
+                    continue
+
+                # Trials (without attention ratings)
+                if not row[digit] or row[rating] in set_flag:
+                    continue
+                last_block = (row[block], row[training] in set_flag)
+                block_trials[last_block] = block_trials.get(last_block, 0) + 1
+
+                # Reaction durations (only of rows with valid numbers)
+                if invalid:
+                    continue
+                if not row[reaction_duration]:
+                    if row[key]:
+                        add('impossible_reaction_duration', line, 'key without reaction_duration')
+                    continue
+                duration = float(row[reaction_duration])
+                if not math.isfinite(duration) or duration <= 0:
+                    add('impossible_reaction_duration', line, f'reaction_duration={duration}')
+                elif duration > max_reaction_duration:
+                    add('impossible_reaction_duration', line, f'reaction_duration={duration} > {max_reaction_duration}')
+                elif not row[key]:
+                    add('impossible_reaction_duration', line, 'reaction_duration without key')
+                elif (row[stimulus_time] and row[reaction_time]
+                      and abs(float(row[reaction_time]) - float(row[stimulus_time]) - duration) > 1e-6):
+                    add('impossible_reaction_duration', line, 'reaction_duration != reaction_time - stimulus_time')
+
+            # Numbers of trials per block
+            for (trial_block, is_training), n_trials in sorted(block_trials.items()):
+                expected = trials['training' if is_training else 'test']
+                if n_trials < expected:
+                    add('quitted_block' if (trial_block, is_training) in quitted_blocks else 'incomplete_block', None,
+                        f'block {trial_block}: {n_trials} of {expected} trials')
+                elif n_trials > expected:
+                    add('extra_trials', None, f'block {trial_block}: {n_trials} of {expected} trials')
+
+    return [[name, problem, 'warning' if problem in warning_problems else 'error', count, line, example]
+            for problem, (count, line, example) in found.items()]
+
+def validate_folder(folder, processes=None, task_name='sart', **settings):
+    """
+    Check all data files of a folder in parallel.
+
+    Parameters:
+    - folder : str
+        Folder containing the data files.
+    - processes : int, optional
+        Number of processes. Default is the number of CPU cores.
+    - task_name : str, optional
+        Beginning of the names of the data files. Default is 'sart'.
+    - **settings : optional
+        Further arguments for `validate_file` ('trials', 'exit_key', 'max_reaction_duration').
+
+    Returns:
+    - problems : list of lists
+        The problems of all files (see 'report_columns').
+    - n_files : int
+        Number of files checked.
+    """
+    files = sorted(glob.glob(os.path.join(folder, f'{task_name}*.csv')))
+    columns, optional = read_schema()
+    check = functools.partial(validate_file, columns=columns, optional=optional, **settings)
+    if processes == 1 or len(files) < 2:
+        results = map(check, files)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(check, files, chunksize=max(1, len(files) // 256)))
+    return [problem for problems in results for problem in problems], len(files)
+
+def main():
+    default_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folder', nargs='?', default=default_folder, help='Folder containing the data files (default: ../data)')
+    parser.add_argument('-o', '--output', help='CSV file of the report (default: qc_report.csv in the data folder)')
+    parser.add_argument('--trials-train', type=int, default=default_trials['training'], help='Trials of the training block (default: 18)')
+    parser.add_argument('--trials-test', type=int, default=default_trials['test'], help='Trials of every test block (default: 75)')
+    parser.add_argument('--exit-key', default=default_exit_key, help='Exit key of the sessions (default: escape)')
+    parser.add_argument('--max-rt', type=float, default=default_max_reaction_duration,
+                        help='Longest possible reaction duration in seconds (default: 1.15)')
+    parser.add_argument('--processes', type=int, default=None, help='Number of processes (default: number of CPU cores)')
+    args = parser.parse_args()
+
+    problems, n_files = validate_folder(args.folder, processes=args.processes, exit_key=args.exit_key,
+                                        trials={'training': args.trials_train, 'test': args.trials_test},
+                                        max_reaction_duration=args.max_rt)
+    output = args.output or os.path.join(args.folder, 'qc_report.csv')
+    with open(output, 'w', newline='') as file:
+        csv.writer(file).writerows([report_columns] + problems)
+
+    # Files per problem
+    counts = {}
+    for name, problem, severity, *values in problems:
+        counts[(severity, problem)] = counts.get((severity, problem), 0) + 1
+    failed = {problem[0] for problem in problems if problem[2] == 'error'}
+    print(f'{n_files} files checked, {len(failed)} with errors (report: {output})')
+    for (severity, problem), n in sorted(counts.items()):
+        print(f'  {severity:<8} {problem:<36} {n} files')
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Controller side of the renderer protocol of renderer.py.
+
+sart.py imports this module only when `renderer_address` is set (see `connect_renderer` in sart.py).
+`RemoteWindow`, `RemoteVisual` and `RemoteEvent` stand in for the PsychoPy window and the modules
+psychopy.visual and psychopy.event: stimuli are created in the renderer, drawing and flipping is
+sent to it as commands, and keys are read from its keyboard. Commands and replies are JSON lines;
+the renderer answers every command with one line, in the same order.
+"""
+
+from collections import deque
+import base64
+import io
+import json
+import socket
+
+def encode_remote_value(value):
+    """
+    Convert an argument or attribute of a stimulus into a value that can be sent to a remote renderer as JSON.
+
+    Parameters:
+    - value : object
+        The value. Images (PIL.Image) are sent as the path of their file if they were read from a file, otherwise as 
+        PNG data. Tuples are sent as lists.
+
+    Returns:
+    - value : object
+        The value for JSON (decoded again by `decode_remote_value` in renderer.py).
+    """
+    if hasattr(value, 'getbbox'):
+        if getattr(value, 'filename', None):
+            return {'image_file': value.filename}
+        buffer = io.BytesIO()
+        value.save(buffer, format='PNG')
+        return {'image_png': base64.b64encode(buffer.getvalue()).decode('ascii')}
+    if isinstance(value, tuple):
+        return [encode_remote_value(item) for item in value]
+    return value
+
+class RemoteStim:
+    """
+    Stand-in for a stimulus created and drawn by a remote renderer (see `connect_renderer` in sart.py). Attributes set on it 
+    (e.g. 'size' or 'phase') are sent to the renderer together with the next drawing.
+
+    Parameters:
+    - win : RemoteWindow
+        The window of the renderer.
+    - stim_id : int
+        Number of the stimulus in the renderer.
+    - bounding_box : list of float or None
+        Size (in pixels) of the rendered text of text stimuli.
+    """
+    def __init__(self, win, stim_id, bounding_box=None):
+        self.__dict__.update(win=win, stim_id=stim_id, boundingBox=bounding_box, changes={})
+
+    def __setattr__(self, name, value):
+        self.__dict__[name] = value
+        self.changes[name] = encode_remote_value(value)
+
+    def draw(self):
+        self.win.drawn.append([self.stim_id, self.changes])
+        self.__dict__['changes'] = {}
+
+class RemoteWindow:
+    """
+    Stand-in for visual.Window that sends commands to a renderer process (see renderer.py) owning the real window.
+
+    Commands are sent as JSON lines; the renderer answers every command with one JSON line, in the same order. 
+    Whole trial phases are sent as one command (see `present_phase` of sart.py), so the renderer shows them frame by frame 
+    without waiting for this process.
+
+    Parameters:
+    - address : str
+        Address of the renderer: 'host:port' or 'unix:/path/to/socket'.
+    """
+    def __init__(self, address):
+        if address.startswith('unix:'):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(address[len('unix:'):])
+        else:
+            host, port = address.rsplit(':', 1)
+            self.socket = socket.create_connection((host, int(port)))
+        if self.socket.family != socket.AF_UNIX:
+            # Send small commands at once instead of collecting them
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.socket.makefile('rb')
+        self.drawn = []
+        self.mouse_visible = True
+        # Replies that were not read yet: None for requests, the phase command for phases sent in advance
+        self.expected = deque()
+        self.queued_results = deque()
+
+        info = self.request({'op': 'info'})
+        self.size, self.units = info['size'], info['units']
+
+    def send(self, commands, labels):
+        """Send several commands in one message; `labels` tell `request` what the replies belong to."""
+        self.socket.sendall(b''.join((json.dumps(command) + '\n').encode('utf-8') for command in commands))
+        self.expected.extend(labels)
+
+    def receive(self):
+        """Read the next reply of the renderer."""
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The renderer closed the connection")
+        reply = json.loads(line)
+        if 'error' in reply:
+            raise RuntimeError(f"Renderer: {reply['error']}")
+        return reply
+
+    def read_reply(self):
+        """Read replies up to the reply of the last request; replies of phases sent in advance are kept for `present_phase`."""
+        while True:
+            label, reply = self.expected.popleft(), self.receive()
+            if label is None:
+                return reply
+            self.queued_results.append((label, reply))
+
+    def request(self, command):
+        """Send a command and return its reply."""
+        self.send([command], [None])
+        return self.read_reply()
+
+    def take_queued_result(self, label):
+        """Return the reply of the phase sent in advance with this label, or None. Other phases sent in advance are dropped."""
+        while label in self.expected:
+            self.queued_results.append((self.expected.popleft(), self.receive()))
+        while self.queued_results:
+            queued_label, reply = self.queued_results.popleft()
+            if queued_label == label and not reply.get('skipped'):
+                return reply
+        return None
+
+    def create_stim(self, kind, arguments):
+        """Create a stimulus (kind 'TextStim', 'ImageStim' or 'GratingStim') in the renderer."""
+        arguments = {name: encode_remote_value(value) for name, value in arguments.items()}
+        reply = self.request({'op': 'create', 'kind': kind, 'arguments': arguments})
+        return RemoteStim(self, reply['id'], reply.get('bounding_box'))
+
+    def take_drawn(self, stim=None):
+        """Return the stimuli drawn since the last flip (after drawing `stim`, if given) and start a new list."""
+        if stim is not None:
+            stim.draw()
+        drawn, self.drawn = self.drawn, []
+        return drawn
+
+    def present_phase(self, stim, n_frames, key_list=None, stop_on_key=False, clear_keys=False, queue_next=None,
+                      record_frames=False):
+        """
+        Let the renderer show a trial phase (see `present_phase` in sart.py for the parameters).
+
+        If `queue_next` is given, the commands for those phases are sent in the same message, so the renderer starts 
+        each of them directly after the phase before (or skips it, see `present_phase` in sart.py). The result of a queued phase 
+        is returned by the next call with the same stimulus and number of frames; results of skipped phases are dropped.
+
+        Returns:
+        - onset : float
+        - keys : list of tuples
+        - flips : list of float
+            Timestamps of all flips of the phase (only if `record_frames` is True).
+        """
+        def command(stim, n_frames, key_list, stop_on_key, clear_keys, only_without_keys=False):
+            return {'op': 'phase', 'draw': self.take_drawn(stim), 'frames': n_frames, 'key_list': key_list,
+                    'stop_on_key': stop_on_key, 'clear_keys': clear_keys, 'record_frames': record_frames,
+                    'only_without_keys': only_without_keys}
+
+        # Use the result of the phase if it was sent in advance
+        reply = self.take_queued_result((id(stim), n_frames))
+        if reply is None:
+            commands, labels = [command(stim, n_frames, key_list, stop_on_key, clear_keys)], [None]
+            for phase in queue_next or []:
+                commands.append(command(*phase))
+                labels.append((id(phase[0]), phase[1]))
+            self.send(commands, labels)
+            reply = self.read_reply()
+
+        return reply['onset'], [tuple(key) for key in reply['keys']], reply['flips']
+
+    def flip(self):
+        return self.request({'op': 'flip', 'draw': self.take_drawn()})['time']
+
+    def clearBuffer(self):
+        # Stimuli drawn before are still drawn once in the renderer (e.g. to create their textures)
+        self.request({'op': 'clear_buffer', 'draw': self.take_drawn()})
+
+    def getActualFrameRate(self, **kwargs):
+        return self.request({'op': 'frame_rate', 'arguments': kwargs})['frame_rate']
+
+    @property
+    def mouseVisible(self):
+        return self.mouse_visible
+
+    @mouseVisible.setter
+    def mouseVisible(self, visible):
+        self.mouse_visible = visible
+        self.request({'op': 'window', 'attributes': {'mouseVisible': visible}})
+
+    def close(self):
+        try:
+            self.request({'op': 'close'})
+        except (ConnectionError, OSError):
+            pass
+        self.file.close()
+        self.socket.close()
+
+class RemoteVisual:
+    """Stand-in for the psychopy.visual module, creating the stimuli in the renderer of a RemoteWindow."""
+    def TextStim(self, win, **arguments):
+        return win.create_stim('TextStim', arguments)
+
+    def ImageStim(self, win, **arguments):
+        return win.create_stim('ImageStim', arguments)
+
+    def GratingStim(self, win, **arguments):
+        return win.create_stim('GratingStim', arguments)
+
+class RemoteEvent:
+    """Stand-in for the psychopy.event module, reading the keys pressed at the renderer of a RemoteWindow."""
+    def __init__(self, win):
+        self.win = win
+
+    def getKeys(self, keyList=None, timeStamped=False):
+        keys = [tuple(key) for key in self.win.request({'op': 'keys', 'key_list': keyList})['keys']]
+        return keys if timeStamped else [key[0] for key in keys]
+
+    def clearEvents(self, eventType=None):
+        self.win.request({'op': 'clear_keys'})
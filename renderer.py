@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Renderer process for running sart.py with the window on another process (or computer).
+
+The renderer owns the PsychoPy window and the keyboard. sart.py (the controller) connects to it
+when `renderer_address` is set, creates all stimuli in the renderer before the session starts and
+then only sends short commands: draw these stimuli and flip, show a trial phase for n frames, or
+return the keys pressed. A trial phase runs completely in the renderer, frame by frame, and the
+digit and the mask of the next trial are sent together with the inter-trial interval (the mask
+is skipped if a key ends the digit), so the communication with the controller never delays a
+flip. All timestamps (flips and key presses) are taken on the clock
+of the renderer.
+
+With --stub, no window is opened: the simulated window and participant of simulation.py replace
+display and keyboard, so controller and renderer can be tested together on one computer without
+a display. (The simulated participant only reacts to digits drawn as text stimuli, so use
+`digit_renderer = 'textstim'` with the stub.)
+
+Start the renderer from the repository folder (image paths are relative to it), then the
+controller with the same address:
+
+Usage (from the repository folder):
+    python renderer.py --unix /tmp/sart-renderer.sock        # sart.py: renderer_address = 'unix:/tmp/sart-renderer.sock'
+    python renderer.py --port 5556 --windowed                # sart.py: renderer_address = 'localhost:5556'
+    python renderer.py --unix /tmp/sart-renderer.sock --stub --seed 1
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import socket
+
+import sart
+
+class Drawing:
+    """All stimuli drawn in one frame, drawn in the order they were drawn by the controller."""
+    def __init__(self, stims):
+        self.stims = stims
+
+    def draw(self):
+        for stim in self.stims:
+            stim.draw()
+
+def decode_remote_value(value, stub=False):
+    """
+    Convert a value sent by `encode_remote_value` of remote.py back into an argument or attribute of a stimulus.
+
+    Parameters:
+    - value : object
+        The value from JSON.
+    - stub : bool, optional
+        If True, images are kept as paths (for the simulated stimuli). Default is False.
+
+    Returns:
+    - value : object
+    """
+    if isinstance(value, dict) and 'image_file' in value:
+        return value['image_file'] if stub else sart.Image.open(value['image_file'])
+    if isinstance(value, dict) and 'image_png' in value:
+        return sart.Image.open(io.BytesIO(base64.b64decode(value['image_png'])))
+    if isinstance(value, list):
+        return [decode_remote_value(item, stub) for item in value]
+    return value
+
+class Renderer:
+    """
+    The window, keyboard and stimuli of one controller.
+
+    Parameters:
+    - win : visual.Window or simulation.SimulatedWindow
+        The window.
+    - stub : bool, optional
+        True if the window is simulated. Default is False.
+    """
+    def __init__(self, win, stub=False):
+        self.win = win
+        self.stub = stub
+        self.stims = []
+        self.open = True
+        # Whether the last phase shown ended with a key press (see 'only_without_keys' of the phase commands)
+        self.phase_keys = False
+
+    def apply_drawing(self, drawn):
+        """Set the attributes changed by the controller and return the stimuli to draw."""
+        stims = []
+        for stim_id, changes in drawn:
+            stim = self.stims[stim_id]
+            for name, value in changes.items():
+                setattr(stim, name, decode_remote_value(value, self.stub))
+            stims.append(stim)
+        return Drawing(stims)
+
+    def handle(self, command):
+        """
+        Carry out one command of the controller (see `RemoteWindow` in remote.py).
+
+        Parameters:
+        - command : dict
+            The command, with the operation in 'op'.
+
+        Returns:
+        - reply : dict
+        """
+        op = command['op']
+        if op == 'info':
+            return {'size': list(self.win.size), 'units': self.win.units}
+        if op == 'create':
+            arguments = {name: decode_remote_value(value, self.stub) for name, value in command['arguments'].items()}
+            stim = getattr(sart.visual, command['kind'])(self.win, **arguments)
+            self.stims.append(stim)
+            bounding_box = list(stim.boundingBox) if command['kind'] == 'TextStim' else None
+            return {'id': len(self.stims) - 1, 'bounding_box': bounding_box}
+        if op == 'phase':
+            if command.get('only_without_keys') and self.phase_keys:
+                return {'skipped': True}
+            sart.record_frames = command['record_frames']
+            sart.frame_log.clear()
+            onset, keys = sart.present_phase(self.win, self.apply_drawing(command['draw']), command['frames'],
+                                             key_list=command['key_list'], stop_on_key=command['stop_on_key'],
+                                             clear_keys=command['clear_keys'])
+            self.phase_keys = bool(keys)
+            return {'onset': onset, 'keys': keys, 'flips': list(sart.frame_log)}
+        if op == 'flip':
+            self.apply_drawing(command['draw']).draw()
+            return {'time': self.win.flip()}
+        if op == 'clear_buffer':
+            self.apply_drawing(command['draw']).draw()
+            self.win.clearBuffer()
+            return {}
+        if op == 'frame_rate':
+            return {'frame_rate': self.win.getActualFrameRate(**command['arguments'])}
+        if op == 'window':
+            for name, value in command['attributes'].items():
+                setattr(self.win, name, value)
+            return {}
+        if op == 'keys':
+            return {'keys': sart.get_keys(command['key_list'])}
+        if op == 'clear_keys':
+            sart.discard_keys()
+            return {}
+        if op == 'close':
+            self.win.close()
+            self.open = False
+            return {}
+        raise ValueError(f"Unknown command {op!r}")
+
+def open_renderer(stub=False, windowed=False, seed=None, config=None):
+    """
+    Open the window and keyboard for a new controller.
+
+    Parameters:
+    - stub : bool, optional
+        If True, use the simulated window and participant of simulation.py instead of a real window. Default is False.
+    - windowed : bool, optional
+        If True, open a window instead of using the full screen. Default is False.
+    - seed : int or str, optional
+        Seed of the simulated participant. Default is None.
+    - config : sart.SessionConfig, optional
+        Configuration of the sessions (keys and images the simulated participant reacts to). Default is `sart.make_config()`.
+
+    Returns:
+    - renderer : Renderer
+    """
+    if not stub:
+        win = sart.visual.Window(fullscr=not windowed, color="black", units="norm")
+        sart.open_keyboard()
+        return Renderer(win)
+
+    import simulation
+    model = simulation.ResponseModel()
+    model.rng.seed(seed)
+    win = simulation.SimulatedWindow(model, config=config or sart.make_config())
+    # Keys are polled by the controller with pauses, so more time passes per poll
+    sart.visual, sart.event, sart.core = simulation.SimulatedVisual(), simulation.SimulatedEvent(win, poll_interval=.01), simulation.SimulatedCore(win)
+    sart.keyboard['device'] = None
+    return Renderer(win, stub=True)
+
+def serve(listener, stub=False, windowed=False, seed=None, config=None, once=False):
+    """
+    Serve controllers one after the other (each gets a new window) until stopped.
+
+    Parameters:
+    - listener : socket.socket
+        The listening socket.
+    - stub, windowed, seed, config :
+        See `open_renderer`.
+    - once : bool, optional
+        If True, stop after the first controller. Default is False.
+    """
+    while True:
+        connection, address = listener.accept()
+        if connection.family != socket.AF_UNIX:
+            # Send replies at once instead of collecting them
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        renderer = open_renderer(stub=stub, windowed=windowed, seed=seed, config=config)
+        reader = connection.makefile('rb')
+        try:
+            for line in reader:
+                try:
+                    reply = renderer.handle(json.loads(line))
+                except Exception as error:
+                    reply = {'error': f"{type(error).__name__}: {error}"}
+                connection.sendall((json.dumps(reply) + '\n').encode('utf-8'))
+                if not renderer.open:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            if renderer.open:
+                renderer.win.close()
+            reader.close()
+            connection.close()
+        if once:
+            return
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost', help='Network address to listen on (default: localhost)')
+    parser.add_argument('--port', type=int, default=5556, help='TCP port (default: 5556)')
+    parser.add_argument('--unix', help='Path to a Unix socket instead of the TCP port')
+    parser.add_argument('--windowed', action='store_true', help='Open a window instead of using the full screen')
+    parser.add_argument('--stub', action='store_true', help='Simulate window and participant (no display needed)')
+    parser.add_argument('--seed', help='Seed of the simulated participant (with --stub)')
+    parser.add_argument('--config', help='JSON, TOML or YAML file with settings of sart.py (with --stub)')
+    parser.add_argument('--once', action='store_true', help='Stop after the first controller')
+    args = parser.parse_args()
+
+    config = sart.load_config(args.config) if args.config else sart.make_config()
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.remove(args.unix)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(args.unix)
+    else:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((args.host, args.port))
+    listener.listen(1)
+    print(f"Renderer listening on {args.unix or f'{args.host}:{args.port}'}" + (' (stub)' if args.stub else ''))
+
+    try:
+        serve(listener, stub=args.stub, windowed=args.windowed, seed=args.seed, config=config, once=args.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+
+if __name__ == '__main__':
+    main()
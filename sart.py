@@ -5,11 +5,46 @@
 ############################### Import packages ###############################
 ###############################################################################
 
-from psychopy import visual, core, event, data, gui
-from psychopy.constants import NOT_STARTED, STARTED, FINISHED
+from collections import OrderedDict, deque, namedtuple
+import csv
+import functools
+import glob
+import importlib
+import json
+import math
 import random
-import pandas as pd
 import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+class LazyModule:
+    """
+    Placeholder for a module that is only imported when one of its attributes is used for the first time.
+    PsychoPy and PIL take several seconds to import, so tools that only need the settings or the 
+    trial logic of this script do not have to wait for them.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+visual = LazyModule('psychopy.visual')
+core   = LazyModule('psychopy.core')
+event  = LazyModule('psychopy.event')
+data   = LazyModule('psychopy.data')
+gui    = LazyModule('psychopy.gui')
+Image  = LazyModule('PIL.Image')
+ImageDraw = LazyModule('PIL.ImageDraw')
+ImageFont = LazyModule('PIL.ImageFont')
+remote = LazyModule('remote') # Client of the renderer process (see `connect_renderer`)
+aggregator_client = LazyModule('aggregator_client') # Client of the aggregator (see `send_aggregator_loop`)
 
 ###############################################################################
 ################################ Set variables ################################
@@ -23,6 +58,8 @@ n_trials_test  = 75     # Number of trails during ONE testing block (default is
 response_key     = 'space'     # Key with which users respond
 exit_key         = 'escape'    # Key to stop the experiment at any time
 experimenter_key = 'escape'    # Key experimenter uses to end the experiment on the last page
+keyboard_backend = 'hardware'  # 'hardware' = psychopy.hardware.keyboard (more precise timestamps, uses 'event' if not available), 'event' = psychopy.event
+key_wait_interval = .002       # Time (in seconds) between two checks of the keyboard while waiting for a key (the CPU is free in between)
 
 # General information about the experiment
 experiment_info = {
@@ -32,188 +69,2245 @@ experiment_info = {
     'training'    : 1,         # 1 = include training, 0 = no training
     'testing'     : 3,         # Number of testing blocks, 0 = no testing
     'rating'      : 1,         # 1 = include attention rating, 0 = no rating
-    'date': data.getDateStr()  # Date and time of the beginning of the session 
+    'resume'      : 0,         # 1 = continue the last interrupted session of this participant and session number
+    'date': None               # Date and time of the beginning of the session (set when the info dialog is shown)
+}
+
+# General information which should not be shown in the dialog
+popped_keys = { 
+    #'experiment_name': experiment_info.pop('experiment_name', 'sart'), # Remove first hashtag if you only run one experiment
+    #'session': experiment_info.pop('session', '001'),      # Remove first hashtag if session number is always identical
+    #'training': experiment_info.pop('training', 1),        # Remove first hashtag if sessions always or never include training
+    #'testing': experiment_info.pop('testing', 1),          # Remove first hashtag if number of test block is always identical
+    'date': experiment_info.pop('date', None), # The date will not be displayed in the info dialog
+    'rating': experiment_info.pop('rating', 1) # Comment out this line if you want to change rating settings in the info dialog
 }
 
-# General information which should not be shown in the dialog
-popped_keys = { 
-    #'experiment_name': experiment_info.pop('experiment_name', 'sart'), # Remove first hashtag if you only run one experiment
-    #'session': experiment_info.pop('session', '001'),      # Remove first hashtag if session number is always identical
-    #'training': experiment_info.pop('training', 1),        # Remove first hashtag if sessions always or never include training
-    #'testing': experiment_info.pop('testing', 1),          # Remove first hashtag if number of test block is always identical
-    'date': experiment_info.pop('date', data.getDateStr()), # The date will not be displayed in the info dialog
-    'rating': experiment_info.pop('rating', 1) # Comment out this line if you want to change rating settings in the info dialog
-}
+# Set configuration file
+config_file = None # Path to a JSON, TOML or YAML file with settings that replace the variables of this section (see `load_config`), e.g. 'config.json'
+
+# Set folder where data files are saved
+data_folder = 'data'
+
+# Set results aggregator (see `aggregator.py`)
+aggregator_address = None # None = only save data locally; 'host:port' or 'unix:/path/to/socket' = also send the trials to the aggregator of the lab
+station_name       = None # Name of this computer in the aggregator (None = network name of the computer)
+
+# Set remote renderer (see `renderer.py`)
+renderer_address = None # None = open the window on this computer; 'host:port' or 'unix:/path/to/socket' = show the stimuli with a renderer process owning the window
+
+# Set binary data files
+save_binary = False # True = also save the data in a compact binary file in the subfolder 'binary' of the data folder (see `save_binary_rows`)
+
+# Set stimulus-display times (in seconds)
+digit_display_time    = .25  # Time the digit (stimulus) is displayed (default is .25)
+mask_display_time     = .9   # Time the mask is displayed (default is white mask and .9)
+feedback_display_time = 3.0  # Time feedback is displayed (default is green mask or reminder of the rules)
+inter_trial_interval  = 1.0  # Time the last screen of a trial stays visible before the next digit (default is 1.0)
+default_frame_rate    = 60   # Refresh rate (in Hz) used if the refresh rate of the monitor cannot be measured
+record_frames         = False # True = save the time of every screen refresh during the blocks and a report of dropped frames (see `save_frame_report`)
+profile_session       = False # True = measure the time spent in every part of the session and save a trace and a summary (see `save_profile`)
+
+# Set online metrics (computed during the blocks, see `update_block_metrics`)
+metrics_window     = 20    # Number of the most recent correct go trials used for the rolling variability of the reaction times
+show_block_metrics = False # True = show error rates and reaction-time variability to the experimenter after each block (continue with the experimenter key)
+
+# Set stimuli layout
+stimuli_font    = 'Arial' # Font of the stimuli
+stimuli_scale   = 4  # Change scale to make stimuli numbers bigger or smaller
+stimuli_heights = [height * stimuli_scale for height in [48, 72, 94, 100, 120]] # Stimuli will be randomly displayed with one of these heights
+digit_renderer  = 'textstim' # 'textstim' = one text stimulus per digit and height; 'atlas' = all digits in one texture, drawn as a scaled quad (faster on weak graphics cards, see `build_glyph_atlas`)
+
+# Set stimulus digit range
+digit_range = list(range(1, 10)) # 1-9 (upper bond is NOT included) 
+
+# Set inhibition number
+inhibition_number = 3 # Default is digit 3
+
+# Set trial plan (order of digits, stimulus sizes and inter-trial intervals, see `build_block_plan`)
+trial_plan_seed   = None    # None = random order; a number or text = reproducible order (different for every participant, session and block)
+min_nogo_distance = 0       # Minimum number of go trials between two no-go trials (0 = no constraint)
+iti_range         = None    # (minimum, maximum) inter-trial interval (in seconds) drawn for every trial; None = always 'inter_trial_interval'
+plan_folder       = 'plans' # Folder with pre-generated trial plans (see `trial_plans.py`)
+
+# Set adaptive mode (display times and no-go probability follow the performance, see `update_staircase`)
+adaptive_mode                 = None # None = fixed display times and trial plans; 'staircase' = adapt the difficulty after every trial
+adaptive_target_rate          = .5   # Commission error rate the staircase aims at
+adaptive_step                 = .05  # Change of the difficulty level (from 0 = easiest to 1 = hardest) per trial
+adaptive_min_digit_time       = .1   # Digit display time at the hardest level (the easiest level uses 'digit_display_time')
+adaptive_min_mask_time        = .45  # Mask display time at the hardest level (the easiest level uses 'mask_display_time')
+adaptive_min_nogo_probability = .05  # Probability of a no-go trial at the hardest level (the easiest level uses 1 / number of digits)
+
+# Set images size
+image_rescale = (1.5, 1.5)
+
+# Set image cache
+image_cache_size = 256 # Maximum memory (in MB) of images kept on the graphics card; least recently used images are removed first
+
+# Set image file names
+title_screen        = 'img/title_screen.png'
+intro1              = 'img/intro1.png'
+intro2              = 'img/intro2.png' 
+intro3              = 'img/intro3.png' 
+intro_train         = 'img/intro_training.png'
+intro_test          = 'img/intro_test.png'
+end_training        = 'img/end_training.png'
+end_test_block      = 'img/end_test_block.png'
+end_experiment      = 'img/end_experiment.png'
+countdown_images    = ['img/count_down3.png', 
+                       'img/count_down2.png', 
+                       'img/count_down1.png']
+mask_correct        = 'img/mask_green.png'
+mask                = 'img/mask_white.png'
+feedback_inhibition = 'img/feedback_inhibition.png'
+feedback_missed     = 'img/feedback_missed.png'
+attention_check     = 'img/attention_check.png'
+
+###############################################################################
+############################### Define functions ##############################
+###############################################################################
+
+# Settings that define a session (see `make_config`). Their default values are the variables of the section 'Set variables'.
+image_fields = ['title_screen', 'intro1', 'intro2', 'intro3', 'intro_train', 'intro_test', 'end_training',
+                'end_test_block', 'end_experiment', 'countdown_images', 'mask_correct', 'mask',
+                'feedback_inhibition', 'feedback_missed', 'attention_check']
+config_fields = ['n_trials_train', 'n_trials_test', 'response_key', 'exit_key', 'experimenter_key',
+                 'digit_display_time', 'mask_display_time', 'feedback_display_time', 'inter_trial_interval',
+                 'default_frame_rate', 'stimuli_font', 'stimuli_heights', 'digit_renderer', 'digit_range', 'inhibition_number',
+                 'trial_plan_seed', 'min_nogo_distance', 'iti_range', 'adaptive_mode', 'adaptive_target_rate', 'adaptive_step',
+                 'adaptive_min_digit_time', 'adaptive_min_mask_time', 'adaptive_min_nogo_probability', *image_fields]
+SessionConfig = namedtuple('SessionConfig', config_fields)
+
+# Data derived from session configurations (e.g. numbers of frames), computed once per configuration
+config_cache = {}
+
+# Configuration built from the variables in 'Set variables', created by `get_default_config` when first needed
+default_config = {'config': None}
+
+def make_config(**settings):
+    """
+    Create the configuration of a session. The configuration cannot be changed after it was created, so it can be
+    passed to all functions of a session and used to cache data derived from it.
+
+    Parameters:
+    - **settings : optional
+        Values of the settings in the global 'config_fields' list (e.g. n_trials_test=50). Settings that are not 
+        provided take the value of the variable with the same name in the section 'Set variables'.
+
+    Returns:
+    - config : SessionConfig
+        The configuration. Lists are converted to tuples.
+
+    Raises:
+    - ValueError: If a setting is unknown or has an invalid value (see `validate_config`).
+    """
+    unknown = set(settings) - set(config_fields)
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+
+    values = {field: settings.get(field, globals()[field]) for field in config_fields}
+    for field, value in values.items():
+        if isinstance(value, list):
+            values[field] = tuple(value)
+    config = SessionConfig(**values)
+    validate_config(config)
+    return config
+
+def get_default_config():
+    """
+    Get the configuration built from the variables in 'Set variables' (see `make_config`), which is used by all 
+    functions that are called without a configuration. It is built and checked only on the first call, so such 
+    functions do not build it again every time (e.g. on every check for the exit key).
+
+    Returns:
+    - config : SessionConfig
+        The configuration.
+
+    Raises:
+    - ValueError: If a variable has an invalid value (see `validate_config`).
+    """
+    if default_config['config'] is None:
+        default_config['config'] = make_config()
+    return default_config['config']
+
+def load_config(path):
+    """
+    Load the configuration of a session from a JSON, TOML or YAML file.
+
+    The file contains the settings to change, with the names of the global 'config_fields' list, e.g. in JSON:
+    {"n_trials_test": 50, "digit_display_time": 0.3}. All other settings keep their default values.
+
+    Parameters:
+    - path : str
+        Path to the file ('.json', '.toml', '.yaml' or '.yml'). TOML files need Python 3.11 or the package tomli,
+        YAML files need the package PyYAML.
+
+    Returns:
+    - config : SessionConfig
+        The configuration.
+
+    Raises:
+    - ValueError: If the file type is not supported, or a setting is unknown or has an invalid value.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path) as file:
+            settings = json.load(file)
+    elif extension == '.toml':
+        try:
+            toml = importlib.import_module('tomllib')
+        except ImportError:
+            toml = importlib.import_module('tomli')
+        with open(path, 'rb') as file:
+            settings = toml.load(file)
+    elif extension in ['.yaml', '.yml']:
+        yaml = importlib.import_module('yaml')
+        with open(path) as file:
+            settings = yaml.safe_load(file) or {}
+    else:
+        raise ValueError(f"Unsupported configuration file: {path} (use .json, .toml or .yaml)")
+    return make_config(**settings)
+
+def validate_config(config):
+    """
+    Check the values of a session configuration.
+
+    Parameters:
+    - config : SessionConfig
+        The configuration.
+
+    Returns:
+    - None
+
+    Raises:
+    - ValueError: If any value is invalid. The message lists all invalid values.
+    """
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    problems = []
+    for field in ['n_trials_train', 'n_trials_test', 'min_nogo_distance']:
+        value = getattr(config, field)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            problems.append(f"{field} must be a whole number of at least 0 (not {value!r})")
+    for field in ['digit_display_time', 'mask_display_time', 'feedback_display_time', 'inter_trial_interval',
+                  'default_frame_rate']:
+        value = getattr(config, field)
+        if not is_number(value) or value <= 0:
+            problems.append(f"{field} must be a positive number (not {value!r})")
+    for field in ['response_key', 'exit_key', 'experimenter_key', 'stimuli_font'] + image_fields:
+        value = getattr(config, field)
+        values = value if field == 'countdown_images' else (value,)
+        if not isinstance(values, tuple) or not all(isinstance(item, str) and item for item in values):
+            problems.append(f"{field} must be a text (a list of texts for countdown_images), not {value!r}")
+    if not config.stimuli_heights or not all(is_number(height) and height > 0 for height in config.stimuli_heights):
+        problems.append(f"stimuli_heights must be a list of positive numbers (not {config.stimuli_heights!r})")
+    if config.digit_renderer not in ('textstim', 'atlas'):
+        problems.append(f"digit_renderer must be 'textstim' or 'atlas' (not {config.digit_renderer!r})")
+    if not config.digit_range or not all(isinstance(digit, int) for digit in config.digit_range):
+        problems.append(f"digit_range must be a list of whole numbers (not {config.digit_range!r})")
+    elif config.inhibition_number not in config.digit_range:
+        problems.append(f"inhibition_number ({config.inhibition_number!r}) must be one of the digits in digit_range")
+    if config.iti_range is not None and not (len(config.iti_range) == 2 and all(is_number(value) for value in config.iti_range)
+                                             and 0 < config.iti_range[0] <= config.iti_range[1]):
+        problems.append(f"iti_range must be None or (minimum, maximum) with 0 < minimum <= maximum (not {config.iti_range!r})")
+    if config.adaptive_mode not in (None, 'staircase'):
+        problems.append(f"adaptive_mode must be None or 'staircase' (not {config.adaptive_mode!r})")
+    for field in ['adaptive_target_rate', 'adaptive_step', 'adaptive_min_nogo_probability']:
+        value = getattr(config, field)
+        if not is_number(value) or not 0 < value < 1:
+            problems.append(f"{field} must be a number between 0 and 1 (not {value!r})")
+    for field, maximum in [('adaptive_min_digit_time', 'digit_display_time'), ('adaptive_min_mask_time', 'mask_display_time')]:
+        value = getattr(config, field)
+        if not is_number(value) or value <= 0 or (is_number(getattr(config, maximum)) and value > getattr(config, maximum)):
+            problems.append(f"{field} must be a positive number of at most {maximum} (not {value!r})")
+
+    if problems:
+        raise ValueError("Invalid session configuration:\n- " + "\n- ".join(problems))
+
+# Columns of the data file (see `save_data`) and of the timing file (see `save_timing`)
+data_columns = ['experiment_name', 'participant', 'session', 'block', 'date', 'training', 'test', 'rating',
+                'digit', 'stimulus_size', 'go_trial', 'key', 'status', 'stimulus_time', 'reaction_time',
+                'reaction_duration', 'attention_rating', 'n_responses', 'adaptive_level', 'adaptive_digit_time',
+                'adaptive_mask_time', 'adaptive_nogo_probability']
+timing_columns = ['participant', 'session', 'block', 'trial', 'phase', 'intended_frames', 'intended_duration',
+                  'onset', 'actual_duration']
+
+# Columns of the frame file and of the frame report (see `save_frame_report`)
+frame_columns = ['participant', 'session', 'block', 'frame', 'flip_time', 'interval', 'dropped']
+frame_report_columns = ['participant', 'session', 'block', 'frame_rate', 'n_frames', 'mean_interval', 'p95_interval',
+                        'max_interval', 'dropped_frames', 'n_phases', 'late_phases']
+
+# Columns of the block summary file (see `summarise_block_metrics`)
+summary_columns = ['experiment_name', 'participant', 'session', 'block', 'date', 'training', 'n_trials', 'n_go', 'n_nogo',
+                   'commission_errors', 'commission_rate', 'omission_errors', 'omission_rate', 'rt_mean', 'rt_sd',
+                   'rt_cv', 'rolling_rt_cv', 'rolling_window']
+
+# Columns of the binary data file (see `encode_binary_rows`) with their types as codes of the struct module:
+# 'h' (16-bit integer), 'b' (8-bit integer) and 'd' (64-bit float). Text columns are saved as numbers that refer 
+# to a list of the texts in the dictionary file; missing values are saved as -1 (integers) or NaN (floats).
+binary_columns = [('experiment_name', 'h'), ('participant', 'h'), ('session', 'h'), ('block', 'h'), ('date', 'h'),
+                  ('training', 'b'), ('test', 'b'), ('rating', 'b'), ('digit', 'b'), ('stimulus_size', 'b'),
+                  ('go_trial', 'b'), ('key', 'h'), ('status', 'b'), ('stimulus_time', 'd'), ('reaction_time', 'd'),
+                  ('reaction_duration', 'd'), ('attention_rating', 'b'), ('n_responses', 'b'),
+                  ('adaptive_level', 'd'), ('adaptive_digit_time', 'd'), ('adaptive_mask_time', 'd'),
+                  ('adaptive_nogo_probability', 'd')]
+binary_text_columns = ['experiment_name', 'participant', 'session', 'date', 'key']
+binary_record = struct.Struct('<' + ''.join(code for column, code in binary_columns))
+
+# Data of one trial or attention rating. The fields are in the order of the columns of the data file, 
+# fields that do not apply (e.g. 'digit' for an attention rating) are None.
+TrialRecord = namedtuple('TrialRecord',
+                         ['digit', 'stimulus_size', 'go_trial', 'key', 'status', 'stimulus_time',
+                          'reaction_time', 'reaction_duration', 'attention_rating', 'n_responses', 'adaptive_level',
+                          'adaptive_digit_time', 'adaptive_mask_time', 'adaptive_nogo_probability', 'phase_timing'],
+                         defaults=[None] * 15)
+
+# One planned trial of a block: digit, stimulus size (1 = smallest height in 'stimuli_heights') and inter-trial interval (in seconds)
+PlannedTrial = namedtuple('PlannedTrial', ['digit', 'stimulus_size', 'iti'])
+
+# Trial plans of the current session by block (0 for training), filled by `prepare_trial_plans`
+trial_plans = {}
+
+# Pre-rendered digit stimuli, filled once per session by `build_stimulus_cache`
+stimulus_cache = {}
+
+# Refresh rate of the monitor and number of frames of each trial phase, filled by `measure_phase_frames`
+frame_timing = {}
+
+# Timestamps of all flips of the current block, filled by `present_phase` if 'record_frames' is True
+frame_log = []
+
+# Summaries of the finished blocks of the session by block (0 for training), filled by `run_block`
+block_metrics = {}
+
+# State of the staircase of the adaptive mode, kept over all blocks of the session (see `update_staircase`)
+staircase = {}
+
+# Batches of rows waiting to be sent to the aggregator by the background sender (see `send_to_aggregator`)
+aggregator_queue = queue.Queue()
+# ('run' tells the batches of this run apart from those of earlier runs of the script, which are numbered from 1 as well)
+aggregator_sender = {'thread': None, 'batch': 0, 'run': f"{time.time():.6f}-{os.getpid()}"}
+
+# Keyboard of psychopy.hardware, opened by `open_keyboard` (None = keys are read with psychopy.event)
+keyboard = {'device': None}
+
+# Images loaded on the graphics card, filled by `get_image_stim` and `preload_images` (least recently used first)
+image_registry = OrderedDict()
+
+# Time spans measured in the current session if 'profile_session' is True (see `ProfileSpan`)
+profile = {'spans': [], 'open': [], 'start': None}
+
+# Rows waiting to be written to disk by the background data writer (see `start_data_writer`)
+data_queue = queue.Queue()
+data_writer = {'thread': None, 'errors': [], 'dictionaries': {}}
+
+class ProfileSpan:
+    """
+    Measure the time spent in a part of the session (use as `with ProfileSpan('name'):`).
+
+    Nothing is measured unless the global 'profile_session' is True. Otherwise, the start and the duration of the 
+    span are added to the global 'profile' dictionary, together with its self time (the duration without the time of 
+    the spans inside it), so that nested spans are not counted twice. Measuring a span takes about a microsecond, 
+    so profiling can stay on during real sessions. The spans are saved by `save_profile`.
+
+    Parameters:
+    - name : str
+        Name of the span (e.g. the name of the function or of the trial phase).
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if profile_session:
+            start = time.perf_counter()
+            if profile['start'] is None:
+                profile['start'] = start
+            # Name, start, time of the spans inside, thread
+            profile['open'].append([self.name, start, 0.0, threading.get_ident()])
+        return self
+
+    def __exit__(self, *exception):
+        if profile_session and profile['open']:
+            close_profile_span(time.perf_counter())
+        return False
+
+def close_profile_span(end):
+    """
+    Close the innermost open span (see `ProfileSpan`).
+
+    Parameters:
+    - end : float
+        Time (of `time.perf_counter`) at which the span ended.
+
+    Returns:
+    - None
+
+    Side Effects:
+    - Moves the span from 'open' to 'spans' in the global 'profile' dictionary (name, start, duration, self time, 
+      depth, thread) and adds its duration to the time of the spans inside the enclosing span.
+    """
+    name, start, inner_time, thread = profile['open'].pop()
+    duration = end - start
+    profile['spans'].append((name, start, duration, duration - inner_time, len(profile['open']), thread))
+    if profile['open']:
+        profile['open'][-1][2] += duration
+
+def profiled(function):
+    """
+    Measure every call of a function as a span named like the function (see `ProfileSpan`), if the global 
+    'profile_session' is True.
+
+    Parameters:
+    - function : callable
+        The function.
+
+    Returns:
+    - wrapper : callable
+        The function with the measurement (documentation and name are kept).
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not profile_session:
+            return function(*args, **kwargs)
+        with ProfileSpan(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+def start_data_writer():
+    """
+    Start the background thread that writes data to disk.
+
+    Returns:
+    - None
+
+    Side Effects:
+    - Starts a daemon thread running `write_data_loop`, unless it is already running.
+    """
+    if data_writer['thread'] is None or not data_writer['thread'].is_alive():
+        data_writer['thread'] = threading.Thread(target=write_data_loop, name='data_writer', daemon=True)
+        data_writer['thread'].start()
+
+def stop_data_writer():
+    """
+    Write all remaining data to disk and stop the background data writer.
+
+    Returns:
+    - None
+    """
+    if data_writer['thread'] is not None and data_writer['thread'].is_alive():
+        flush_data()
+        data_queue.put(None)
+        data_writer['thread'].join()
+    data_writer['thread'] = None
+
+def write_rows(path, columns, rows, journal=None):
+    """
+    Hand rows over to the background data writer, which appends them to a CSV file.
+
+    Parameters:
+    - path : str
+        Path to the CSV file. The columns are written as header if the file does not exist yet.
+
+    - columns : list of str
+        Names of the columns.
+
+    - rows : list of lists
+        The rows to append, with one value per column.
+
+    - journal : str or None, optional
+        Path to the session journal. If provided, the rows are also appended to the journal (and synced to disk)
+        before they are written to the CSV file. Default is None.
+
+    Returns:
+    - None
+    """
+    if rows:
+        start_data_writer()
+        if journal is not None:
+            data_queue.put(('journal', journal, {'type': 'rows', 'path': path, 'rows': rows}))
+        data_queue.put(('rows', path, (columns, rows)))
+
+def write_binary_rows(path, rows):
+    """
+    Hand rows over to the background data writer, which appends them to a binary data file (see `encode_binary_rows`).
+
+    Parameters:
+    - path : str
+        Path to the binary data file. The dictionary file has the same name with the extension '.json'.
+
+    - rows : list of lists
+        The rows to append, with one value for each column in the global 'data_columns' list.
+
+    Returns:
+    - None
+    """
+    if rows:
+        start_data_writer()
+        data_queue.put(('binary', path, rows))
+
+def write_journal(record, journal=None):
+    """
+    Hand a record over to the background data writer, which appends it to the session journal.
+
+    Parameters:
+    - record : dict
+        The record. Its key 'type' describes the record ('session', 'rows', 'block_end' or 'discard_block').
+
+    - journal : str, optional
+        Path to the session journal. Default is the journal of the current session (see `get_journal_path`).
+
+    Returns:
+    - None
+    """
+    if journal is None:
+        journal = get_journal_path(experiment_info)
+    start_data_writer()
+    data_queue.put(('journal', journal, record))
+
+def flush_data():
+    """
+    Wait until all data handed to the background data writer is written and synced to disk.
+
+    Returns:
+    - None
+
+    Raises:
+    - OSError: If the background data writer failed to write data.
+    """
+    start_data_writer()
+    done = threading.Event()
+    data_queue.put(done)
+    done.wait()
+
+    if data_writer['errors']:
+        error = data_writer['errors'].pop(0)
+        raise OSError(f"Data could not be saved: {error}")
+
+def write_data_loop():
+    """
+    Write rows and journal records from the global 'data_queue' to disk until None is received.
+
+    The queue contains tuples ('rows', path, (columns, rows)) with rows to append to a CSV file, tuples ('binary', path, rows)
+    with rows to append to a binary data file, tuples ('journal', path, record) with records to append to a session journal, threading.Event objects which are set as soon as all previous 
+    data is flushed and synced to disk, and None to stop the loop. Items that arrive together are written as one 
+    batch per file. Journal records are synced to disk before the CSV rows of the same batch are written.
+    """
+    open_files = {}
+    running = True
+    while running:
+        # Wait for the next item and take everything else that is already waiting
+        items = [data_queue.get()]
+        while True:
+            try:
+                items.append(data_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        pending = {'journal': {}, 'rows': {}, 'binary': {}}
+        for item in items:
+            if isinstance(item, tuple):
+                kind, path, payload = item
+                if kind == 'journal':
+                    pending['journal'].setdefault(path, []).append(payload)
+                elif kind == 'binary':
+                    pending['binary'].setdefault(path, []).extend(payload)
+                else:
+                    columns, rows = payload
+                    pending['rows'].setdefault(path, (columns, []))[1].extend(rows)
+                continue
+
+            # Write pending data before a flush or stop
+            write_pending_data(open_files, pending)
+            pending = {'journal': {}, 'rows': {}, 'binary': {}}
+            if item is None:
+                running = False
+                break
+
+            # Flush and sync all files, then release the waiting thread
+            for file in open_files.values():
+                try:
+                    file.flush()
+                    os.fsync(file.fileno())
+                except OSError as error:
+                    data_writer['errors'].append(error)
+            item.set()
+
+        write_pending_data(open_files, pending)
+
+    for file in open_files.values():
+        file.close()
+
+def write_pending_data(open_files, pending):
+    """
+    Append journal records and batches of rows to their files (used by the background data writer).
+
+    Parameters:
+    - open_files : dict
+        Open file objects by path. Files are opened on first use and kept open.
+
+    - pending : dict
+        'journal': Lists of journal records (dict) by path; 'rows': Tuples (columns, rows) by path;
+        'binary': Lists of rows by path of the binary data file.
+
+    Returns:
+    - None
+    """
+    # Journal first: one JSON line per record, synced to disk right away
+    for path, records in pending['journal'].items():
+        try:
+            if path not in open_files:
+                open_files[path] = open(path, 'a', newline='')
+            file = open_files[path]
+            file.write(''.join(json.dumps(record) + '\n' for record in records))
+            file.flush()
+            os.fsync(file.fileno())
+        except Exception as error:
+            data_writer['errors'].append(error)
+
+    for path, (columns, rows) in pending['rows'].items():
+        try:
+            if path not in open_files:
+                open_files[path] = open(path, 'a', newline='')
+            file = open_files[path]
+            writer = csv.writer(file)
+            if file.tell() == 0:
+                writer.writerow(columns)
+            writer.writerows(rows)
+        except Exception as error:
+            data_writer['errors'].append(error)
+
+    # Binary data files: new texts are added to the dictionary file before the rows that refer to them
+    for path, rows in pending['binary'].items():
+        try:
+            if path not in data_writer['dictionaries']:
+                data_writer['dictionaries'][path] = read_binary_dictionaries(path)
+            dictionaries = data_writer['dictionaries'][path]
+            n_texts = sum(len(texts) for texts in dictionaries.values())
+            content = encode_binary_rows(rows, dictionaries)
+            if sum(len(texts) for texts in dictionaries.values()) != n_texts:
+                save_binary_dictionaries(path, dictionaries)
+            if path not in open_files:
+                open_files[path] = open(path, 'ab')
+            open_files[path].write(content)
+        except Exception as error:
+            data_writer['errors'].append(error)
+
+def encode_binary_rows(rows, dictionaries):
+    """
+    Convert rows of the data file into records of the binary data file.
+
+    Every row becomes one record of fixed size with the columns and types of the global 'binary_columns' list, so that 
+    the file can be read without parsing (e.g. with numpy.memmap, see 'data_analysis/load_data.py'). Text columns 
+    (participant, session, key etc.) are saved as the position of the text in the list of that column in 'dictionaries'.
+
+    Parameters:
+    - rows : list of lists
+        The rows, with one value for each column in the global 'data_columns' list.
+
+    - dictionaries : dict
+        Lists of texts by column. New texts are appended to the lists.
+
+    Returns:
+    - content : bytes
+        The records of all rows.
+    """
+    records = []
+    for row in rows:
+        values = []
+        for (column, code), value in zip(binary_columns, row):
+            if value is None:
+                value = float('nan') if code == 'd' else -1
+            elif column in dictionaries:
+                texts = dictionaries[column]
+                if value not in texts:
+                    texts.append(value)
+                value = texts.index(value)
+            else:
+                # Numbers may be texts (e.g. the attention rating is the name of the pressed key)
+                value = float(value) if code == 'd' else int(value)
+            values.append(value)
+        records.append(binary_record.pack(*values))
+    return b''.join(records)
+
+def read_binary_dictionaries(path):
+    """
+    Read the dictionary file of a binary data file.
+
+    Parameters:
+    - path : str
+        Path to the binary data file.
+
+    Returns:
+    - dictionaries : dict
+        Lists of texts by column (empty lists if the dictionary file does not exist yet).
+    """
+    dictionary_path = os.path.splitext(path)[0] + '.json'
+    if not os.path.exists(dictionary_path):
+        return {column: [] for column in binary_text_columns}
+    with open(dictionary_path) as file:
+        return json.load(file)['dictionaries']
+
+def save_binary_dictionaries(path, dictionaries):
+    """
+    Save the dictionary file of a binary data file, which also describes the layout of the records.
+
+    Parameters:
+    - path : str
+        Path to the binary data file.
+
+    - dictionaries : dict
+        Lists of texts by column.
+
+    Returns:
+    - None
+    """
+    dictionary_path = os.path.splitext(path)[0] + '.json'
+    with open(dictionary_path + '.tmp', 'w') as file:
+        json.dump({'format': binary_record.format, 'columns': [column for column, code in binary_columns],
+                   'missing': -1, 'dictionaries': dictionaries}, file, indent=1)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(dictionary_path + '.tmp', dictionary_path)
+
+def get_binary_path(path):
+    """
+    Get the path to the binary data file of a CSV data file, in the subfolder 'binary' of the data folder.
+
+    Parameters:
+    - path : str
+        Path to the CSV data file.
+
+    Returns:
+    - path : str
+        Path to the binary data file (with the extension '.bin').
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(data_folder, "binary", f"{name}.bin")
+
+def get_journal_path(experiment_info):
+    """
+    Get the path to the journal of a session.
+
+    Parameters:
+    - experiment_info : dict
+        Information about the session, including 'participant', 'session' and 'date'.
+
+    Returns:
+    - path : str
+        Path to the journal in the subfolder 'journal' of the data folder.
+    """
+    return os.path.join(data_folder, "journal", f"sart2_{experiment_info['participant']}_"
+                        f"{experiment_info['session']}_{experiment_info['date']}.jsonl")
+
+def start_journal(experiment_info):
+    """
+    Create the journal of a new session. Every saved row is appended to the journal, so that the session 
+    can be resumed after a crash (see `resume_session`).
+
+    Parameters:
+    - experiment_info : dict
+        Information about this experiment.
+
+    Returns:
+    - None
+    """
+    os.makedirs(os.path.join(data_folder, "journal"), exist_ok=True)
+    write_journal({'type': 'session', 'experiment_info': experiment_info})
+
+def read_journal(path):
+    """
+    Read all complete records of a session journal.
+
+    Parameters:
+    - path : str
+        Path to the journal.
+
+    Returns:
+    - records : list of dict
+        The records in the order they were written. A last record that was cut off by a crash is skipped.
+    """
+    records = []
+    with open(path) as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+def resume_session(experiment_info, config=None):
+    """
+    Continue the last session of the same participant and session number from its journal.
+
+    The data file of that session is rebuilt from the journal, so that rows that were not yet written to the 
+    data file when the session was interrupted are recovered. If a block was interrupted, its rows are removed 
+    from the data file (they stay in the journal), an exit row is added (as if the exit key had been pressed), 
+    and the block is run again from the start. Each block therefore appears only once in the data file.
+
+    Parameters:
+    - experiment_info : dict
+        Information about this experiment. The participant and session number are used to find the journal.
+    - config : SessionConfig, optional
+        Configuration of the session (its exit key is saved in the exit row). Default is `get_default_config()`.
+
+    Returns:
+    - finished_blocks : set of int
+        Blocks that were completed in the interrupted session (0 for training). If no journal was found, 
+        a new session is started and the set is empty.
+
+    Side Effects:
+    - Restores the date and the settings ('training', 'testing', 'rating') of the interrupted session in 
+      'experiment_info', so that new data is appended to the same data file and journal.
+    - Rewrites the data file (and the binary data file, if 'save_binary' is True) of the interrupted session.
+    - Writes a 'discard_block' record to the journal for every interrupted block, so its rows are also left out 
+      if the session is resumed again.
+    - Restores the online metrics of the finished blocks in the global 'block_metrics' from the block summary file.
+    - In adaptive mode, the staircase continues at the difficulty level of the last trial of the finished blocks.
+
+    Notes:
+    - Timestamps restart after resuming, because the clock of the new session starts at zero.
+    """
+    journals = glob.glob(os.path.join(glob.escape(data_folder), "journal",
+                                      f"sart2_{glob.escape(str(experiment_info['participant']))}_"
+                                      f"{glob.escape(str(experiment_info['session']))}_*.jsonl"))
+    if not journals:
+        print("No session to resume was found, starting a new session.")
+        start_journal(experiment_info)
+        return set()
+    records = read_journal(max(journals, key=os.path.getmtime))
+
+    # Restore settings of the interrupted session
+    for record in records:
+        if record['type'] == 'session':
+            for key in ['date', 'training', 'testing', 'rating']:
+                experiment_info[key] = record['experiment_info'][key]
+
+    # Replay saved rows and find finished blocks
+    rows = {}
+    finished_blocks = set()
+    started_blocks = set()
+    last_time = None
+    block_index = data_columns.index('block')
+    time_indices = [data_columns.index('reaction_time'), data_columns.index('stimulus_time')]
+    level_index = data_columns.index('adaptive_level')
+    for record in records:
+        if record['type'] == 'rows':
+            rows.setdefault(record['path'], []).extend(record['rows'])
+            for row in record['rows']:
+                if row[block_index] is not None:
+                    started_blocks.add(row[block_index])
+                last_time = row[time_indices[0]] or row[time_indices[1]] or last_time
+        elif record['type'] == 'block_end':
+            finished_blocks.add(record['block'])
+        elif record['type'] == 'discard_block':
+            for path in rows:
+                rows[path] = [row for row in rows[path] if row[block_index] != record['block']]
+            started_blocks.discard(record['block'])
+
+    # Leave out the rows of interrupted blocks (they are run again)
+    interrupted_blocks = started_blocks - finished_blocks
+    for block in sorted(interrupted_blocks):
+        for path in rows:
+            rows[path] = [row for row in rows[path] if row[block_index] != block]
+        write_journal({'type': 'discard_block', 'block': block})
+
+    # Continue the staircase at the level reached at the end of the last finished block
+    for path_rows in rows.values():
+        for row in path_rows:
+            if row[block_index] in finished_blocks and row[level_index] is not None:
+                staircase['level'] = row[level_index]
+
+    for path, path_rows in rows.items():
+        with open(path + '.tmp', 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(data_columns)
+            writer.writerows(path_rows)
+        os.replace(path + '.tmp', path)
+
+        # Rebuild the binary data file in the same way
+        if save_binary:
+            binary_path = get_binary_path(path)
+            for old_path in [binary_path, os.path.splitext(binary_path)[0] + '.json']:
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+            data_writer['dictionaries'].pop(binary_path, None)
+            os.makedirs(os.path.dirname(binary_path), exist_ok=True)
+            write_binary_rows(binary_path, path_rows)
+
+    # Mark the interruption in the data file
+    if interrupted_blocks:
+        save_data(block=max(interrupted_blocks), exit_time=last_time, config=config)
+
+    # Restore the online metrics of the finished blocks
+    block_metrics.update(load_block_metrics(os.path.join(data_folder, "summaries",
+                                                         f"sart2_{experiment_info['participant']}_{experiment_info['date']}.csv"),
+                                            finished_blocks))
+
+    return finished_blocks
+
+def send_to_aggregator(path, rows):
+    """
+    Hand rows of a data file over to the background sender, which sends them to the aggregator of the lab
+    (set in the global 'aggregator_address'). Nothing is sent if no aggregator is set.
+
+    The rows are always saved locally as well (see `save_data`), so the aggregator only collects copies.
+
+    Parameters:
+    - path : str
+        Path to the local data file (only its name is sent).
+
+    - rows : list of lists
+        The rows, with one value for each column in the global 'data_columns' list.
+
+    Returns:
+    - None
+
+    Side Effects:
+    - Starts the background sender thread running `send_aggregator_loop`, unless it is already running.
+    """
+    if aggregator_address is None or not rows:
+        return
+    if aggregator_sender['thread'] is None or not aggregator_sender['thread'].is_alive():
+        aggregator_sender['thread'] = threading.Thread(target=send_aggregator_loop, name='aggregator_sender', daemon=True)
+        aggregator_sender['thread'].start()
+    aggregator_queue.put((os.path.basename(path), rows))
+
+def stop_aggregator_sender():
+    """
+    Send the remaining rows to the aggregator (or keep them in the spool file) and stop the background sender.
+
+    Returns:
+    - None
+    """
+    if aggregator_sender['thread'] is not None and aggregator_sender['thread'].is_alive():
+        aggregator_queue.put(None)
+        aggregator_sender['thread'].join()
+    aggregator_sender['thread'] = None
+
+def send_aggregator_loop(retry_interval=5.0):
+    """
+    Send rows from the global 'aggregator_queue' to the aggregator until None is received.
+
+    Only one batch is sent at a time, and the next batch is only sent after the aggregator has confirmed the previous 
+    one. Rows that arrive in the meantime are sent together in the next batch, so a slow aggregator receives fewer, 
+    larger batches and never slows down the experiment. If the aggregator cannot be reached, the batches are appended 
+    to a spool file in the subfolder 'spool' of the data folder and sent as soon as the aggregator is reachable again 
+    (at most every `retry_interval` seconds a new connection is tried). The connection is handled by 
+    `AggregatorClient` of aggregator_client.py, which is only imported here.
+
+    Parameters:
+    - retry_interval : float, optional
+        Time (in seconds) to wait before trying to connect again after a failed connection. Default is 5.
+    """
+    client = aggregator_client.AggregatorClient(aggregator_address, get_spool_path(), retry_interval)
+    running = True
+    while running:
+        # Wait for the next rows and take everything else that is already waiting
+        items = [aggregator_queue.get()]
+        while True:
+            try:
+                items.append(aggregator_queue.get_nowait())
+            except queue.Empty:
+                break
+        if None in items:
+            running = False
+            items = [item for item in items if item is not None]
+
+        files = {}
+        for name, rows in items:
+            files.setdefault(name, []).extend(rows)
+        if not files:
+            continue
+
+        aggregator_sender['batch'] += 1
+        client.send({'type': 'batch', 'station': station_name or socket.gethostname(), 'run': aggregator_sender['run'],
+                     'batch': aggregator_sender['batch'], 'columns': data_columns, 'files': files})
+
+    client.disconnect()
+
+def get_spool_path():
+    """Get the path to the spool file with the batches that could not be sent to the aggregator."""
+    return os.path.join(data_folder, "spool", f"{station_name or socket.gethostname()}.jsonl")
+
+def connect_renderer(address):
+    """
+    Connect to a renderer process (see renderer.py), which owns the window, draws the stimuli and reads the keyboard.
+    The client side of the connection is in remote.py, which is only imported here.
+
+    Parameters:
+    - address : str
+        Address of the renderer: 'host:port' or 'unix:/path/to/socket'.
+
+    Returns:
+    - win : remote.RemoteWindow
+        Stand-in for the window, used like a visual.Window by all functions of this script.
+
+    Side Effects:
+    - Replaces the global 'visual' and 'event' modules by stand-ins that create the stimuli in the renderer and read 
+      the keys pressed there, and reads keys with them instead of a local keyboard. All timestamps (flips and keys) 
+      are taken on the clock of the renderer.
+    """
+    global visual, event
+    win = remote.RemoteWindow(address)
+    visual, event = remote.RemoteVisual(), remote.RemoteEvent(win)
+    keyboard['device'] = None
+    return win
+
+def get_image_stim(win, image_path):
+    """
+    Get the image stimulus of an image file, loading it only if it is not in the image registry yet.
+
+    Parameters:
+    - win : visual.Window
+        The window or screen instance where the experiment is displayed.
+
+    - image_path : str
+        Path to the image file.
+
+    Returns:
+    - image_stim : visual.ImageStim
+        The image stimulus, scaled with the global 'image_rescale' variable.
+
+    Side Effects:
+    - Adds newly loaded images to the global 'image_registry' and marks the image as most recently used.
+    - If the images in the registry need more memory than the global 'image_cache_size' variable (in MB), 
+      the least recently used images are removed from the registry.
+    """
+    # Use the image from the registry if it was already loaded
+    if image_path in image_registry:
+        image_registry.move_to_end(image_path)
+        return image_registry[image_path][0]
+
+    # Decode the image file once and upload it to the graphics card
+    image = Image.open(image_path)
+    image.load()
+    image_stim = visual.ImageStim(win, image=image, size = image_rescale)
+    image_bytes = image.width * image.height * 4 # RGBA, 4 bytes per pixel
+    image_registry[image_path] = (image_stim, image_bytes)
+
+    # Remove least recently used images if the registry is too large (but keep the current image)
+    registry_bytes = sum(entry[1] for entry in image_registry.values())
+    while registry_bytes > image_cache_size * 1024**2 and len(image_registry) > 1:
+        _, (_, removed_bytes) = image_registry.popitem(last=False)
+        registry_bytes -= removed_bytes
+
+    return image_stim
+
+def preload_images(win, image_paths=None, config=None):
+    """
+    Load all images of the session into the image registry before the experiment starts.
+
+    Parameters:
+    - win : visual.Window
+        The window or screen instance where the experiment is displayed.
+
+    - image_paths : list of str, optional
+        Paths to the image files. Default is all images of the configuration.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
+    Returns:
+    - None
+
+    Side Effects:
+    - Fills the global 'image_registry', so that no image has to be read from disk during the experiment.
+    """
+    if image_paths is None:
+        if config is None:
+            config = get_default_config()
+        image_paths = []
+        for field in image_fields:
+            image_paths.extend(config.countdown_images if field == 'countdown_images' else [getattr(config, field)])
+
+    for image_path in image_paths:
+        get_image_stim(win, image_path)
+
+def open_keyboard():
+    """
+    Open the keyboard used for responses, depending on the global 'keyboard_backend'.
+
+    The keyboard of psychopy.hardware reads key presses from the event queue of the operating system (with 
+    psychtoolbox, if installed), so their timestamps do not depend on how often the keyboard is checked. The 
+    timestamps are taken on the same clock as the timestamps of `win.flip()`.
+
+    Returns:
+    - None
+
+    Side Effects:
+    - Sets 'device' in the global 'keyboard' dictionary. If the keyboard of psychopy.hardware is not available, 
+      a message is printed and keys are read with psychopy.event.
+    """
+    keyboard['device'] = None
+    if keyboard_backend == 'hardware':
+        try:
+            hardware_keyboard = importlib.import_module('psychopy.hardware.keyboard')
+            keyboard['device'] = hardware_keyboard.Keyboard(clock=core.monotonicClock)
+        except Exception as error:
+            print(f"Keyboard of psychopy.hardware not available ({error}), using psychopy.event.")
+
+def get_keys(key_list=None):
+    """
+    Get the keys pressed since the last call, with their timestamps.
+
+    Parameters:
+    - key_list : list of str or None, optional
+        Only return (and remove) these keys. If None, all keys are returned. Default is None.
+
+    Returns:
+    - keys : list of tuples
+        The name of each key and the time it was pressed, in the order they were pressed.
+    """
+    device = keyboard['device']
+    if device is None:
+        return event.getKeys(keyList=key_list, timeStamped=True)
+    return [(key.name, key.rt) for key in device.getKeys(keyList=key_list, waitRelease=False, clear=True)]
+
+def discard_keys():
+    """
+    Discard all keys pressed so far.
+
+    Returns:
+    - None
+    """
+    if keyboard['device'] is not None:
+        keyboard['device'].clearEvents()
+    event.clearEvents(eventType='keyboard')
+
+def wait_for_keys(win, key_list, timeout=None, clear_keys=False, current_data=None, block=None, config=None):
+    """
+    Wait until a key from `key_list` or the exit key is pressed, or until the timeout has passed.
+
+    Between two checks of the keyboard, the script sleeps for the time set in the global 'key_wait_interval', 
+    so waiting leaves the CPU to the screen and to the background data writer. All keys are read in one call of 
+    `get_keys`, so no key press is lost between checking for responses and checking for the exit key.
+
+    Parameters:
+    - win : visual.Window
+        The window or screen instance where the experiment is displayed.
+
+    - key_list : list of str or str
+        Keys to wait for.
+
+    - timeout : float or None, optional
+        Maximum time to wait (in seconds). If None, wait until a key is pressed. Default is None.
+
+    - clear_keys : bool, optional
+        If True, keys pressed before waiting are discarded. Default is False.
+
+    - current_data : list of TrialRecord, optional
+        Data of the current trial block, saved if the exit key is pressed (see `check_for_quit`). Default is None.
+
+    - block : int, optional
+        Number of the current block, saved if the exit key is pressed. Default is None.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
+    Returns:
+    - keys : list of tuples
+        The keys from `key_list` pressed with their timestamps, or an empty list if the timeout has passed.
+
+    Side Effects:
+    - If the exit key is pressed (and is not in `key_list`), the experiment is terminated (see `check_for_quit`).
+    """
+    if config is None:
+        config = get_default_config()
+    if isinstance(key_list, str):
+        key_list = [key_list]
+    if clear_keys:
+        discard_keys()
+
+    start_time = core.getTime()
+    while True:
+        keys = get_keys(key_list + [config.exit_key])
+        if config.exit_key not in key_list:
+            check_for_quit(win, current_data=current_data, block=block, keys=keys, config=config)
+        if keys:
+            return keys
+        if timeout is not None and core.getTime() - start_time >= timeout:
+            return []
+        core.wait(key_wait_interval, hogCPUperiod=0)
+
+def check_for_quit(win, current_data= None, block=None, keys=None, exit_key=None, config=None):
+    """
+    Quit experiment if exit key was pressed.
+        
+    Parameters:
+    - win : visual.Window
+        The window or screen instance where the experiment is displayed. This is closed if the exit key is detected.
+    
+    - current_data : list of TrialRecord, optional
+        Data of the current trial block. The trials are already saved while the block runs; if provided, 
+        the timing of their phases will be saved when exiting. Default is None.
+    
+    - block : int, optional
+        Information or data about the current block in the experiment. Used for saving data on exit. Default is None.
+    
+    - keys : list of tuples, optional
+        Information about pressed keys. The first element of the tuple is the key pressed, and the second element is the timestamp of the key press.
+    
+    - exit_key : str, optional
+        The key that, when pressed, triggers the exit and saving of data. Default is the exit key of the configuration.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
+    Returns:
+    - None
+
+    Side Effects:
+    - If the exit key was pressed, data up to that point is saved, the window is closed, and the experiment is terminated.
+    """
+    if config is None:
+        config = get_default_config()
+    if exit_key is None:
+        exit_key = config.exit_key
+
+    # Get keys
+    if keys==None:
+        keys = get_keys()
+
+    # Quit experiment if exit key was pressed
+    exit_keys = [key for key in keys if key[0]==exit_key]
+    if exit_keys:
+        save_timing(current_data, block=block)
+        save_frame_report(current_data, block=block)
+        save_data(block=block, exit_time = exit_keys[0][1], config=config)
+        stop_aggregator_sender()
+        stop_data_writer()
+        save_profile()
+        
+        win.close()
+        core.quit()
+
+@profiled
+def show_info_dialog(experiment_info, popped_keys):
+    """
+    Show info dialog, set and modify experiment information.
+
+    Parameters:
+    - experiment_info: dict
+        Information about this experiment.
+    - popped_keys: dict
+        Information which should not be displayed in the dialog.
+    
+    Returns
+    - experiment_info: dict
+        Information about this experiment.
+    """
+    # Set date and time of the beginning of the session
+    for info in [experiment_info, popped_keys]:
+        if 'date' in info and info['date'] is None:
+            info['date'] = data.getDateStr()
+
+    # Show participant info dialog
+    dlg = gui.DlgFromDict(dictionary=experiment_info, sortKeys=False)#, title=expName)
+    if dlg.OK == False: 
+        core.quit()
+
+    # Restore hidden keys
+    experiment_info.update(popped_keys)
+
+    return experiment_info
+
+@profiled
+def display_instructions(win, instructions, continue_key=None, config=None):
+    """
+    Display a sequence of instruction screens.
+    
+    Parameters:
+    - win : visual.Window
+        The window or screen instance where the experiment is displayed.
+    - instructions : list of str
+        A list containing paths to image files that will be displayed as instruction screens.
+    
+    - continue_key : list of str, optional
+        A list of keys that, when pressed, will move to the next instruction screen. The default is the response key of the configuration.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+        
+    Returns:
+    - None
+    
+    Side Effects:
+    - Displays instruction images one by one in the provided window.
+    - Waits for a key press from `continue_key` to move to the next instruction.
+    - If the exit key is detected using the `check_for_quit` function, it will exit the experiment.
+    
+    """
+    if config is None:
+        config = get_default_config()
+    if continue_key is None:
+        continue_key = [config.response_key]
+
+    for instruction in instructions:
+        # Display the instruction image
+        instruction_stim = get_image_stim(win, instruction)
+        #instruction_stim.size = 0.8
+        #instruction_stim.height = 0.5
+        instruction_stim.draw()
+        win.flip()
+        
+        # Wait for a space-key press to move to the next instruction
+        wait_for_keys(win, continue_key, clear_keys=True, config=config)
+
+@profiled
+def display_ready_countdown(win, config=None):
+    """
+    Display a countdown sequence.
+    
+    Parameters:
+    - win : visual.Window
+        The window or screen instance where the countdown images are displayed.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+    
+    Returns:
+    - None
+    
+    Notes:
+    - The countdown images are taken from 'countdown_images' of the configuration.
+    """
+    if config is None:
+        config = get_default_config()
+
+    for image_path in config.countdown_images:
+        # Display the countdown image
+        countdown_stim = get_image_stim(win, image_path)
+        countdown_stim.draw()
+        win.flip()
+        
+        # Wait for 1 second before showing the next countdown image (the exit key ends the experiment right away)
+        if '1' in image_path:
+            wait_for_keys(win, [], timeout=.8, config=config)
+        else:
+            wait_for_keys(win, [], timeout=1, config=config)
+
+def load_font(font, size):
+    """
+    Load a font for drawing with PIL.
+
+    Parameters:
+    - font : str
+        Name of the font (e.g. 'Arial') or path to a font file.
+    - size : int
+        Font size (in pixels).
+
+    Returns:
+    - font : PIL.ImageFont.FreeTypeFont
+        The font, or the default font of PIL (with a warning) if the font cannot be found.
+    """
+    candidates = [font, f"{font}.ttf", f"{font.lower()}.ttf"]
+    try:
+        from psychopy.tools.fontmanager import FontManager
+        candidates += [info.path for info in FontManager().getFontsMatching(font)]
+    except (ImportError, AttributeError, TypeError):
+        pass
+    for candidate in candidates:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    print(f"Warning: font {font!r} not found, the digits of the glyph atlas are drawn with the default font of PIL")
+    return ImageFont.load_default(size)
+
+def build_glyph_atlas(win, config=None):
+    """
+    Draw all digits of a configuration once into a single texture (glyph atlas) and create the quad showing them.
+
+    With the setting 'digit_renderer' = 'atlas', the digits are not drawn as text stimuli (one texture per digit and 
+    height), but as parts of this texture on one shared visual.GratingStim: showing a digit only changes the size 
+    and texture coordinates of the quad, whatever the font and height. The digits are drawn at the largest height 
+    of the configuration and scaled down by the graphics card for smaller heights.
+
+    The atlas is only built once per window, font, digits and size (it is kept in the global 'config_cache').
+
+    Parameters:
+    - win : visual.Window
+        The window or screen instance where the experiment is displayed (units 'norm' or 'height').
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
+    Returns:
+    - atlas : dict
+        - 'quad': The visual.GratingStim (in pixel units) showing the atlas texture.
+        - 'cells': Position of every digit in the texture, by digit: (left, bottom, right, top) as fractions of the texture.
+        - 'cell_size': Width and height (in pixels) of a digit drawn at 'font_size'.
+        - 'font_size': Size (in pixels) at which the digits were drawn.
+        - 'pixels_per_unit': Number of pixels per height unit of the window (used to convert stimulus heights).
+        - 'texture_bytes': Memory (in bytes) used by the texture (RGBA, 4 bytes per pixel).
+        - 'shown': The AtlasDigit currently set on the quad.
+    """
+    if config is None:
+        config = get_default_config()
+
+    # Pixels per unit of height (the text height of TextStim is given in units of the window)
+    pixels_per_unit = win.size[1] / 2 if win.units == 'norm' else win.size[1]
+    font_size = max(1, int(round(max(config.stimuli_heights) * 0.001 * pixels_per_unit)))
+
+    key = ('glyph_atlas', id(win), config.stimuli_font, config.digit_range, font_size)
+    if key in config_cache:
+        return config_cache[key]
+
+    # One cell per digit in a square grid, with some space against bleeding of neighbouring digits
+    font = load_font(config.stimuli_font, font_size)
+    ascent, descent = font.getmetrics()
+    padding = 2
+    cell_width = int(math.ceil(max(font.getlength(str(digit)) for digit in config.digit_range))) + 2 * padding
+    cell_height = ascent + descent + 2 * padding
+    columns = int(math.ceil(math.sqrt(len(config.digit_range))))
+    rows = int(math.ceil(len(config.digit_range) / columns))
+
+    # Textures of GratingStim must be square with a side that is a power of two
+    side = 2 ** int(math.ceil(math.log2(max(columns * cell_width, rows * cell_height))))
+    texture = Image.new('RGBA', (side, side), (255, 255, 255, 0))
+    drawing = ImageDraw.Draw(texture)
+
+    cells = {}
+    for index, digit in enumerate(config.digit_range):
+        left, top = (index % columns) * cell_width, (index // columns) * cell_height
+        text_width = font.getlength(str(digit))
+        drawing.text((left + (cell_width - text_width) / 2, top + padding), str(digit), font=font, fill=(255, 255, 255, 255))
+        # Texture coordinates start at the bottom of the image
+        cells[digit] = (left / side, 1 - (top + cell_height) / side, (left + cell_width) / side, 1 - top / side)
+
+    quad = visual.GratingStim(win, tex=texture, mask=None, units='pix', interpolate=True, name='glyph atlas')
+    config_cache[key] = {'quad': quad, 'cells': cells, 'cell_size': (cell_width, cell_height), 'font_size': font_size,
+                         'pixels_per_unit': pixels_per_unit, 'texture_bytes': side * side * 4, 'shown': None}
+    return config_cache[key]
+
+class AtlasDigit:
+    """
+    A digit of the glyph atlas (see `build_glyph_atlas`), used like a visual.TextStim of the digit.
+
+    Parameters:
+    - atlas : dict
+        The glyph atlas.
+    - digit : int
+        The digit.
+    - height : float
+        Height of the digit in units of the window (like the height of a visual.TextStim).
+    """
+    def __init__(self, atlas, digit, height):
+        self.atlas = atlas
+        self.win = atlas['quad'].win
+        self.text = str(digit)
+
+        # Size of the quad (in pixels) and part of the texture it shows
+        scale = height * atlas['pixels_per_unit'] / atlas['font_size']
+        width, height_px = atlas['cell_size'][0] * scale, atlas['cell_size'][1] * scale
+        left, bottom, right, top = atlas['cells'][digit]
+        self.size = (width, height_px)
+        self.sf = ((right - left) / width, (top - bottom) / height_px)
+        self.phase = (.5 - (left + right) / 2, .5 - (bottom + top) / 2)
+        self.boundingBox = (width, height_px)
+
+    def draw(self):
+        quad = self.atlas['quad']
+        # Only the size and texture coordinates change between digits; the texture stays on the graphics card
+        if self.atlas['shown'] is not self:
+            quad.size = self.size
+            quad.sf = self.sf
+            quad.phase = self.phase
+            self.atlas['shown'] = self
+        quad.draw()
+
+def build_stimulus_cache(win, config=None):
+    """
+    Pre-render one digit stimulus for every combination of digit and stimulus height of a configuration.
+
+    Parameters:
+    - win : visual.Window
+        The window or screen instance where the experiment is displayed.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
+    Returns:
+    - cache_info : dict
+        Information about the warm-up of the cache:
+        - 'n_stimuli': Number of stimuli of the configuration.
+        - 'warmup_duration': Time (in seconds) needed to create and render the stimuli that were not in the cache yet.
+        - 'texture_bytes': Estimated memory (in bytes) used by the textures of the stimuli of the configuration.
+
+    Side Effects:
+    - Fills the global 'stimulus_cache' dictionary. Its keys are tuples (digit, height, font), its values visual.TextStim 
+      instances (or AtlasDigit instances if 'digit_renderer' of the configuration is 'atlas', see `build_glyph_atlas`). 
+      Stimuli that are already in the cache (e.g. from another configuration with the same font) are reused;
+      the cache is emptied if it contains stimuli of another window or of the other renderer.
+    - Draws every new stimulus once into the back buffer (which is cleared afterwards), so the glyphs are rasterised
+      and uploaded to the graphics card before the first trial starts.
+    """
+    if config is None:
+        config = get_default_config()
+
+    start_time = time.perf_counter()
+    use_atlas = config.digit_renderer == 'atlas'
+    if any(stim.win is not win or isinstance(stim, AtlasDigit) != use_atlas for stim in stimulus_cache.values()):
+        stimulus_cache.clear()
+    texture_bytes = 0
+
+    # All digits of the atlas share one texture
+    if use_atlas:
+        atlas = build_glyph_atlas(win, config)
+        texture_bytes = atlas['texture_bytes']
+
+    for digit in config.digit_range:
+        for height in config.stimuli_heights:
+            key = (digit, height, config.stimuli_font)
+            if key not in stimulus_cache:
+                if use_atlas:
+                    digit_stim = AtlasDigit(atlas, digit, height*0.001)
+                else:
+                    digit_stim = visual.TextStim(win, text=str(digit),
+                                                 height=height*0.001,
+                                                 font=config.stimuli_font)
+                # Drawing once creates the texture, so the first trial does not have to
+                digit_stim.draw()
+                stimulus_cache[key] = digit_stim
+
+            # Estimate texture memory from the size of the rendered text (RGBA, 4 bytes per pixel)
+            if not use_atlas:
+                width, height_px = stimulus_cache[key].boundingBox
+                texture_bytes += int(width) * int(height_px) * 4
+
+    # Remove the warm-up drawings from the back buffer
+    win.clearBuffer()
+
+    return {
+        'n_stimuli': len(config.digit_range) * len(config.stimuli_heights),
+        'warmup_duration': time.perf_counter() - start_time,
+        'texture_bytes': texture_bytes
+    }
+
+def measure_phase_frames(win, config=None):
+    """
+    Measure the refresh rate of the monitor and convert the display time of each trial phase into a number of frames.
+
+    The refresh rate is only measured once per window, and the numbers of frames only computed once per configuration 
+    and refresh rate (they are kept in the global 'config_cache').
+
+    Parameters:
+    - win : visual.Window
+        The window or screen instance where the experiment is displayed.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
+    Returns:
+    - None
+
+    Side Effects:
+    - Fills the global 'frame_timing' dictionary with:
+        - 'frame_rate': The measured refresh rate (in Hz), or 'default_frame_rate' of the configuration if it could not be measured.
+        - 'digit', 'mask', 'feedback', 'iti': The number of frames of the digit, the mask, the feedback and the
+          inter-trial interval (at least one frame each).
+    """
+    if config is None:
+        config = get_default_config()
+
+    if ('frame_rate', id(win)) not in config_cache:
+        config_cache[('frame_rate', id(win))] = win.getActualFrameRate()
+    frame_rate = config_cache[('frame_rate', id(win))]
+    if frame_rate is None:
+        frame_rate = config.default_frame_rate
+
+    if ('phase_frames', config, frame_rate) not in config_cache:
+        config_cache[('phase_frames', config, frame_rate)] = {
+            'frame_rate': frame_rate,
+            'digit':      max(1, round(config.digit_display_time * frame_rate)),
+            'mask':       max(1, round(config.mask_display_time * frame_rate)),
+            'feedback':   max(1, round(config.feedback_display_time * frame_rate)),
+            'iti':        max(1, round(config.inter_trial_interval * frame_rate))
+        }
+    frame_timing.clear()
+    frame_timing.update(config_cache[('phase_frames', config, frame_rate)])
+
+def present_phase(win, stim, n_frames, key_list=None, stop_on_key=False, clear_keys=False, queue_next=None):
+    """
+    Display a stimulus for a fixed number of frames, drawing it before every flip.
+
+    Parameters:
+    - win : visual.Window
+        The window or screen instance where the experiment is displayed.
+
+    - stim : visual stimulus
+        The stimulus displayed during this phase.
+
+    - n_frames : int
+        Number of frames the stimulus is displayed.
+
+    - key_list : list of str or None, optional
+        Keys that are collected during this phase. If None, no keys are collected. Default is None.
+
+    - stop_on_key : bool or list of str, optional
+        If True, the phase ends at the first frame in which a key from `key_list` was pressed. If a list of keys,
+        only these keys end the phase (other keys from `key_list` are still collected). Default is False.
+
+    - clear_keys : bool, optional
+        If True, keys pressed before this phase are discarded. Default is False.
+
+    - queue_next : list of tuples or None, optional
+        The phases that directly follow, each as the arguments (stim, n_frames, key_list, stop_on_key, clear_keys) of 
+        its own call of this function plus a flag 'only_without_keys': if True, the phase is skipped when the phase 
+        before it ended with a key press (e.g. the mask after the digit). Only used with a remote renderer (see 
+        `connect_renderer`): the renderer receives all phases at once and starts each phase right after the one before, 
+        without waiting for this process. Default is None.
+
+    Returns:
+    - onset : float
+        The timestamp of the first flip, i.e. when the stimulus appeared on the screen.
+
+    - keys : list of tuples
+        Keys pressed during this phase with their timestamps.
+
+    Side Effects:
+    - If the global 'record_frames' is True, the timestamp of every flip is appended to the global 'frame_log'.
+    """
+    # A remote renderer shows the whole phase itself (only its window has `present_phase`, see remote.py)
+    if hasattr(win, 'present_phase'):
+        onset, keys, flips = win.present_phase(stim, n_frames, key_list, stop_on_key, clear_keys, queue_next=queue_next,
+                                               record_frames=record_frames)
+        frame_log.extend(flips)
+        return onset, keys
+
+    if clear_keys:
+        discard_keys()
+
+    onset = None
+    keys = []
+    for frame in range(n_frames):
+        stim.draw()
+        flip_time = win.flip()
+        if record_frames:
+            frame_log.append(flip_time)
+        if onset is None:
+            onset = flip_time
+
+        if key_list is not None:
+            keys.extend(get_keys(key_list))
+            if stop_on_key is True and keys:
+                break
+            if stop_on_key and any(key in stop_on_key for key, time in keys):
+                break
+
+    return onset, keys
+
+def record_phase(phase_timing, phase, onset, trial=None, intended_frames=None):
+    """
+    Add a trial phase to the timing log. The previous phase ends when this phase starts.
+
+    Parameters:
+    - phase_timing : list of dict
+        Timing log of the current block.
+
+    - phase : str
+        Name of the phase ('digit', 'mask', 'feedback', 'iti'), or None to only end the previous phase.
+
+    - onset : float
+        The timestamp when the phase started.
+
+    - trial : int, optional
+        Number of the trial within the block. Default is None.
+
+    - intended_frames : int, optional
+        Intended number of frames of the phase. Default is the number of frames of the phase in the global 'frame_timing'.
+
+    Returns:
+    - None
+
+    Side Effects:
+    - Sets the actual duration of the previous phase and appends this phase with its intended duration.
+    """
+    if intended_frames is None and phase is not None:
+        intended_frames = frame_timing[phase]
+
+    if phase_timing and phase_timing[-1]['actual_duration'] is None:
+        phase_timing[-1]['actual_duration'] = onset - phase_timing[-1]['onset']
+
+    if phase is not None:
+        phase_timing.append({
+            'trial': trial,
+            'phase': phase,
+            'intended_frames': intended_frames,
+            'intended_duration': intended_frames / frame_timing['frame_rate'],
+            'onset': onset,
+            'actual_duration': None
+        })
+
+def build_block_plan(n_trials, digits=None, rng=random, min_distance=None, config=None):
+    """
+    Build the trial plan of one block: the digit, the stimulus size and the inter-trial interval of every trial.
+
+    The design is balanced: every combination of digit and size appears equally often (if the number of trials is 
+    not a multiple of the number of combinations, the remaining trials are spread so that every digit and every size 
+    appears at most once more often than any other). The no-go trials are placed at random among all positions that 
+    keep at least `min_distance` go trials between two no-go trials, so the plan is found in a single pass, without 
+    drawing orders until one meets the constraint.
+
+    Parameters:
+    - n_trials : int
+        Number of trials of the block.
+
+    - digits : list of ints, optional
+        List of digits used as stimuli. Default is 'digit_range' of the configuration.
+
+    - rng : random.Random or module random, optional
+        Random number generator. Default is the module random.
+
+    - min_distance : int, optional
+        Minimum number of go trials between two no-go trials. Default is 'min_nogo_distance' of the configuration.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
+    Returns:
+    - plan : list of PlannedTrial
+        One planned trial per trial of the block.
+
+    Raises:
+    - ValueError: If the block has too few go trials to keep the no-go trials apart.
+    """
+    if config is None:
+        config = get_default_config()
+    if digits is None:
+        digits = config.digit_range
+    if min_distance is None:
+        min_distance = config.min_nogo_distance
+
+    # Walk diagonally through the digit x size grid, so that any number of consecutive cells is balanced
+    n_sizes = len(config.stimuli_heights)
+    digit_order = rng.sample(list(digits), len(digits))
+    size_order = rng.sample(range(1, n_sizes + 1), n_sizes)
+    n_digits = len(digits)
+    cycle = n_digits * n_sizes // math.gcd(n_digits, n_sizes)
+    cells = [(digit_order[index % n_digits], size_order[(index + index // cycle) % n_sizes])
+             for index in range(n_digits * n_sizes)]
+    trials = (cells * (n_trials // len(cells) + 1))[:n_trials]
+
+    # Choose the positions of the no-go trials among the positions that keep them apart
+    go_trials = [trial for trial in trials if trial[0] != config.inhibition_number]
+    nogo_trials = [trial for trial in trials if trial[0] == config.inhibition_number]
+    n_slots = n_trials - min_distance * max(0, len(nogo_trials) - 1)
+    if n_slots < len(nogo_trials):
+        raise ValueError(f"{n_trials} trials are too few to keep {len(nogo_trials)} no-go trials "
+                         f"{min_distance} trials apart.")
+    nogo_positions = {slot + min_distance * rank
+                      for rank, slot in enumerate(sorted(rng.sample(range(n_slots), len(nogo_trials))))}
+
+    rng.shuffle(go_trials)
+    rng.shuffle(nogo_trials)
+    plan = []
+    for position in range(n_trials):
+        digit, size = nogo_trials.pop() if position in nogo_positions else go_trials.pop()
+        iti = config.inter_trial_interval if config.iti_range is None else rng.uniform(*config.iti_range)
+        plan.append(PlannedTrial(digit, size, iti))
+    return plan
+
+def get_session_blocks(experiment_info, config):
+    """
+    Get the blocks of a session with their number of trials.
+
+    Parameters:
+    - experiment_info : dict
+        Information about the session, including 'training' and 'testing'.
+
+    - config : SessionConfig
+        Configuration of the session.
+
+    Returns:
+    - blocks : dict
+        Number of trials by block (0 for training).
+    """
+    blocks = {}
+    if experiment_info['training']:
+        blocks[0] = config.n_trials_train
+    for block in range(1, experiment_info['testing'] + 1):
+        blocks[block] = config.n_trials_test
+    return blocks
+
+def get_block_rng(seed, experiment_info, block, purpose=''):
+    """
+    Get the random number generator of a block.
+
+    Parameters:
+    - seed : int, str or None
+        Seed of the session ('trial_plan_seed' of the configuration).
+
+    - experiment_info : dict
+        Information about the session, including 'participant' and 'session'.
+
+    - block : int
+        Number of the block (0 for training).
+
+    - purpose : str, optional
+        Added to the seed for random numbers other than those of the trial plan (e.g. '-adaptive'). Default is ''.
+
+    Returns:
+    - rng : random.Random or module random
+        A generator seeded with the seed, participant, session and block, or the module random if `seed` is None.
+    """
+    if seed is None:
+        return random
+    return random.Random(f"{seed}-{experiment_info['participant']}-{experiment_info['session']}-{block}{purpose}")
+
+def build_session_plans(experiment_info, seed=None, config=None):
+    """
+    Build the trial plans of all blocks of a session.
+
+    Parameters:
+    - experiment_info : dict
+        Information about the session, including 'participant', 'session', 'training' and 'testing'.
+
+    - seed : int, str or None, optional
+        Seed of the plans. The same seed, participant, session and block always give the same plan. If None, the plans 
+        are drawn with the module random. Default is None.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
+    Returns:
+    - plans : dict
+        Trial plans (lists of PlannedTrial) by block (0 for training).
+    """
+    if config is None:
+        config = get_default_config()
+
+    plans = {}
+    for block, n_trials in get_session_blocks(experiment_info, config).items():
+        plans[block] = build_block_plan(n_trials, rng=get_block_rng(seed, experiment_info, block), config=config)
+    return plans
+
+def save_trial_plans(path, plans):
+    """
+    Save trial plans into a JSON file.
+
+    Parameters:
+    - path : str
+        Path to the JSON file.
+
+    - plans : dict
+        Trial plans (lists of PlannedTrial) by block.
+
+    Returns:
+    - None
+    """
+    with open(path, 'w') as file:
+        json.dump({'columns': list(PlannedTrial._fields),
+                   'blocks': {str(block): [list(trial) for trial in plan] for block, plan in plans.items()}}, file)
+
+def load_trial_plans(path):
+    """
+    Load trial plans from a JSON file (see `save_trial_plans`).
+
+    Parameters:
+    - path : str
+        Path to the JSON file.
+
+    Returns:
+    - plans : dict
+        Trial plans (lists of PlannedTrial) by block.
+    """
+    with open(path) as file:
+        content = json.load(file)
+    return {int(block): [PlannedTrial(*trial) for trial in plan] for block, plan in content['blocks'].items()}
+
+def validate_trial_plans(plans, experiment_info, config):
+    """
+    Check that trial plans fit the session and its configuration, so that a stale or edited plan file is found 
+    before the window opens and not in the middle of a block.
+
+    Parameters:
+    - plans : dict
+        Trial plans (lists of PlannedTrial) by block.
+
+    - experiment_info : dict
+        Information about the session, including 'training' and 'testing'.
+
+    - config : SessionConfig
+        Configuration of the session.
+
+    Returns:
+    - None
+
+    Raises:
+    - ValueError: If a block of the session has no plan, or its plan has another number of trials than the block, a digit 
+      that is not in 'digit_range', a stimulus size that is not a number of a height in 'stimuli_heights', or an 
+      inter-trial interval that is not a positive number. The message lists all problems.
+    """
+    problems = []
+    sizes = range(1, len(config.stimuli_heights) + 1)
+    for block, n_trials in get_session_blocks(experiment_info, config).items():
+        if block not in plans:
+            problems.append(f"block {block} has no plan")
+            continue
+        plan = plans[block]
+        if len(plan) != n_trials:
+            problems.append(f"block {block} has {len(plan)} trials instead of {n_trials}")
+        for number, trial in enumerate(plan, start=1):
+            if trial.digit not in config.digit_range:
+                problems.append(f"block {block}, trial {number}: digit {trial.digit!r} is not in digit_range")
+            if trial.stimulus_size not in sizes:
+                problems.append(f"block {block}, trial {number}: stimulus size {trial.stimulus_size!r} "
+                                f"must be between 1 and {len(sizes)} (the number of stimuli_heights)")
+            if not isinstance(trial.iti, (int, float)) or isinstance(trial.iti, bool) or trial.iti <= 0:
+                problems.append(f"block {block}, trial {number}: inter-trial interval {trial.iti!r} must be a positive number")
+
+    if problems:
+        raise ValueError("Invalid trial plans:\n- " + "\n- ".join(problems))
+
+def prepare_trial_plans(experiment_info, config=None):
+    """
+    Get the trial plans of the session before the first block, so that no time is spent on them during the session.
+
+    The plans are taken from the first of these sources that exists:
+    1. The plans saved for this session in the subfolder 'plans' of the data folder (when a session is resumed).
+    2. A pre-generated plan of the participant and session in the folder set in the global 'plan_folder' 
+       (file 'plan_<participant>_<session>.json', see `trial_plans.py`).
+    3. New plans built with 'trial_plan_seed' of the configuration (see `build_session_plans`).
+
+    Parameters:
+    - experiment_info : dict
+        Information about the session.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
 
-# Set stimulus-display times (in seconds)
-digit_display_time    = .25  # Time the digit (stimulus) is displayed (default is .25)
-mask_display_time     = .9   # Time the mask is displayed (default is white mask and .9)
-feedback_display_time = 3.0  # Time feedback is displayed (default is green mask or reminder of the rules)
+    Returns:
+    - None
 
-# Set stimuli layout
-stimuli_font    = 'Arial' # Font of the stimuli
-stimuli_scale   = 4  # Change scale to make stimuli numbers bigger or smaller
-stimuli_heights = [height * stimuli_scale for height in [48, 72, 94, 100, 120]] # Stimuli will be randomly displayed with one of these heights
+    Raises:
+    - ValueError: If a saved or pre-generated plan cannot be read or does not fit the session (see `validate_trial_plans`).
 
-# Set stimulus digit range
-digit_range = list(range(1, 10)) # 1-9 (upper bond is NOT included) 
+    Side Effects:
+    - Fills the global 'trial_plans' dictionary.
+    - Saves the plans in the subfolder 'plans' of the data folder, with the same name as the data file.
+    """
+    if config is None:
+        config = get_default_config()
 
-# Set inhibition number
-inhibition_number = 3 # Default is digit 3
+    session_path = os.path.join(data_folder, "plans",
+                                f"sart2_{experiment_info['participant']}_{experiment_info['date']}.json")
+    pregenerated_path = os.path.join(plan_folder, f"plan_{experiment_info['participant']}_{experiment_info['session']}.json")
 
-# Set images size
-image_rescale = (1.5, 1.5)
+    plan_path = next((path for path in [session_path, pregenerated_path] if os.path.exists(path)), None)
+    if plan_path is None:
+        plans = build_session_plans(experiment_info, seed=config.trial_plan_seed, config=config)
+    else:
+        try:
+            plans = load_trial_plans(plan_path)
+            validate_trial_plans(plans, experiment_info, config)
+        except (ValueError, TypeError, KeyError, AttributeError) as error:
+            raise ValueError(f"The trial plan {plan_path} does not fit this session: {error}") from error
+
+    trial_plans.clear()
+    trial_plans.update(plans)
+    os.makedirs(os.path.dirname(session_path), exist_ok=True)
+    save_trial_plans(session_path, plans)
+
+def new_block_metrics(window=None):
+    """
+    Create the accumulators of the online metrics of a block (see `update_block_metrics`).
 
-# Set image file names
-title_screen        = 'img/title_screen.png'
-intro1              = 'img/intro1.png'
-intro2              = 'img/intro2.png' 
-intro3              = 'img/intro3.png' 
-intro_train         = 'img/intro_training.png'
-intro_test          = 'img/intro_test.png'
-end_training        = 'img/end_training.png'
-end_test_block      = 'img/end_test_block.png'
-end_experiment      = 'img/end_experiment.png'
-countdown_images    = ['img/count_down3.png', 
-                       'img/count_down2.png', 
-                       'img/count_down1.png']
-mask_correct        = 'img/mask_green.png'
-mask                = 'img/mask_white.png'
-feedback_inhibition = 'img/feedback_inhibition.png'
-feedback_missed     = 'img/feedback_missed.png'
-attention_check     = 'img/attention_check.png'
+    Parameters:
+    - window : int, optional
+        Number of the most recent correct go trials used for the rolling variability of the reaction times.
+        Default is the global 'metrics_window' variable.
 
-###############################################################################
-############################### Define functions ##############################
-###############################################################################
+    Returns:
+    - metrics : dict
+        Counts of trials and errors, the running mean ('rt_mean') and sum of squared deviations ('rt_m2') of the 
+        reaction times, and the reaction times in the rolling window ('recent') with their sum and sum of squares.
+    """
+    return {'n_trials': 0, 'n_go': 0, 'n_nogo': 0, 'commission_errors': 0, 'omission_errors': 0,
+            'rt_n': 0, 'rt_mean': 0.0, 'rt_m2': 0.0,
+            'recent': deque(maxlen=window or metrics_window), 'recent_sum': 0.0, 'recent_sum_squares': 0.0}
 
-def check_for_quit(win, current_data= None, block=None, keys=None, exit_key=exit_key):
+def update_block_metrics(metrics, record):
     """
-    Quit experiment if exit key was pressed.
-        
+    Add a trial to the online metrics of a block. Every update takes the same short time, however long the block is.
+
+    The reaction times are those of correct go trials (as in data_analysis/sart_metrics.py). Their mean and variance 
+    are updated with Welford's algorithm; the rolling variability uses running sums over the last trials.
+
     Parameters:
-    - win : visual.Window
-        The window or screen instance where the experiment is displayed. This is closed if the exit key is detected.
-    
-    - current_data : list of dictionaries, optional
-        Data of the current trial block. If provided, this data will be saved when exiting. Default is None.
-    
-    - block : int, optional
-        Information or data about the current block in the experiment. Used for saving data on exit. Default is None.
-    
-    - keys : list of tuples, optional
-        Information about pressed keys. The first element of the tuple is the key pressed, and the second element is the timestamp of the key press.
-    
-    - exit_key : str
-        The key that, when pressed, triggers the exit and saving of data. Default is the global `exit_key` variable.
+    - metrics : dict
+        Accumulators of the block (see `new_block_metrics`).
+    - record : TrialRecord
+        The finished trial.
 
     Returns:
     - None
+    """
+    metrics['n_trials'] += 1
+    if not record.go_trial:
+        metrics['n_nogo'] += 1
+        metrics['commission_errors'] += record.status == 0
+        return
+    metrics['n_go'] += 1
+    if record.status == 0:
+        metrics['omission_errors'] += 1
+        return
+    if record.reaction_duration is None:
+        return
+
+    # Welford's algorithm for the mean and variance of all reaction times
+    rt = record.reaction_duration
+    metrics['rt_n'] += 1
+    delta = rt - metrics['rt_mean']
+    metrics['rt_mean'] += delta / metrics['rt_n']
+    metrics['rt_m2'] += delta * (rt - metrics['rt_mean'])
+
+    # Running sums of the reaction times in the rolling window
+    recent = metrics['recent']
+    if len(recent) == recent.maxlen:
+        oldest = recent[0]
+        metrics['recent_sum'] -= oldest
+        metrics['recent_sum_squares'] -= oldest * oldest
+    recent.append(rt)
+    metrics['recent_sum'] += rt
+    metrics['recent_sum_squares'] += rt * rt
+
+def summarise_block_metrics(metrics):
+    """
+    Compute the summary of the online metrics of a block.
 
-    Side Effects:
-    - If the exit key was pressed, data up to that point is saved, the window is closed, and the experiment is terminated.
+    Parameters:
+    - metrics : dict
+        Accumulators of the block (see `new_block_metrics`).
+
+    Returns:
+    - summary : dict
+        The values of the columns 'n_trials' to 'rolling_window' of the global 'summary_columns' list:
+        - 'commission_rate', 'omission_rate': Errors as proportion of no-go and go trials.
+        - 'rt_mean', 'rt_sd', 'rt_cv': Mean, standard deviation and coefficient of variation (sd / mean) of the 
+          reaction times of correct go trials.
+        - 'rolling_rt_cv': Coefficient of variation of the last 'rolling_window' reaction times.
+        Values that cannot be computed (e.g. no no-go trials) are None.
     """
-    # Get keys
-    if keys==None:
-        keys = event.getKeys(timeStamped=True)
+    def ratio(numerator, denominator):
+        return numerator / denominator if denominator else None
+
+    rt_sd = math.sqrt(metrics['rt_m2'] / (metrics['rt_n'] - 1)) if metrics['rt_n'] > 1 else None
+    rt_mean = metrics['rt_mean'] if metrics['rt_n'] else None
+
+    n_recent = len(metrics['recent'])
+    rolling_cv = None
+    if n_recent > 1:
+        recent_mean = metrics['recent_sum'] / n_recent
+        recent_variance = max(0.0, (metrics['recent_sum_squares'] - n_recent * recent_mean ** 2) / (n_recent - 1))
+        rolling_cv = ratio(math.sqrt(recent_variance), recent_mean)
+
+    return {
+        'n_trials': metrics['n_trials'],
+        'n_go': metrics['n_go'],
+        'n_nogo': metrics['n_nogo'],
+        'commission_errors': metrics['commission_errors'],
+        'commission_rate': ratio(metrics['commission_errors'], metrics['n_nogo']),
+        'omission_errors': metrics['omission_errors'],
+        'omission_rate': ratio(metrics['omission_errors'], metrics['n_go']),
+        'rt_mean': rt_mean,
+        'rt_sd': rt_sd,
+        'rt_cv': ratio(rt_sd, rt_mean) if rt_sd is not None else None,
+        'rolling_rt_cv': rolling_cv,
+        'rolling_window': metrics['recent'].maxlen,
+    }
+
+def load_block_metrics(path, blocks):
+    """
+    Read the summaries of finished blocks from a block summary file (see `save_data`).
 
-    # Quit experiment if exit key was pressed
-    if len(keys)>0 and keys[len(keys)-1][0]==exit_key:
-        save_data(current_data=current_data, block=block, exit_time = keys[0][1])
-        
-        win.close()
-        core.quit()
+    Parameters:
+    - path : str
+        Path to the block summary file.
+    - blocks : set of int
+        The blocks whose summaries are read (0 for training).
 
-def show_info_dialog(experiment_info, popped_keys):
+    Returns:
+    - summaries : dict
+        The summary of each block (as returned by `summarise_block_metrics`) by block. If a block was saved more 
+        than once (it was interrupted after its summary was saved and run again), the last summary is used. 
+        Blocks without a summary are missing.
     """
-    Show info dialog, set and modify experiment information.
+    summaries = {}
+    if not os.path.exists(path):
+        return summaries
+    counts = {'n_trials', 'n_go', 'n_nogo', 'commission_errors', 'omission_errors', 'rolling_window'}
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            block = int(row['block'])
+            if block in blocks:
+                summaries[block] = {column: None if row[column] == '' else int(row[column]) if column in counts else float(row[column])
+                                    for column in summary_columns[6:]}
+    return summaries
+
+def format_block_metrics(block, summary):
+    """
+    Describe the summary of a block in one line of text (for the screen and the end-of-session log).
 
     Parameters:
-    - experiment_info: dict
-        Information about this experiment.
-    - popped_keys: dict
-        Information which should not be displayed in the dialog.
-    
-    Returns
-    - experiment_info: dict
-        Information about this experiment.
+    - block : int
+        Number of the block (0 for training).
+    - summary : dict
+        Summary of the block (see `summarise_block_metrics`).
+
+    Returns:
+    - text : str
     """
-    # Show participant info dialog
-    dlg = gui.DlgFromDict(dictionary=experiment_info, sortKeys=False)#, title=expName)
-    if dlg.OK == False: 
-        core.quit()
+    def percent(value):
+        return 'n/a' if value is None else f"{value * 100:.0f}%"
 
-    # Restore hidden keys
-    experiment_info.update(popped_keys)
+    def number(value, digits=3):
+        return 'n/a' if value is None else f"{value:.{digits}f}"
 
-    return experiment_info
+    name = 'Training' if block == 0 else f"Block {block}"
+    return (f"{name}: {summary['n_trials']} trials, commission errors {summary['commission_errors']}/{summary['n_nogo']} "
+            f"({percent(summary['commission_rate'])}), omission errors {summary['omission_errors']}/{summary['n_go']} "
+            f"({percent(summary['omission_rate'])}), RT mean {number(summary['rt_mean'])} s, "
+            f"RT CV {number(summary['rt_cv'], 2)} (last {summary['rolling_window']}: {number(summary['rolling_rt_cv'], 2)})")
 
-def display_instructions(win, instructions, continue_key=[response_key]):
+def display_block_metrics(win, block, config=None):
     """
-    Display a sequence of instruction screens.
-    
+    Show the summary of a block to the experimenter and wait for the experimenter key.
+
     Parameters:
     - win : visual.Window
         The window or screen instance where the experiment is displayed.
-    - instructions : list of str
-        A list containing paths to image files that will be displayed as instruction screens.
-    
-    - continue_key : list of str, optional
-        A list of keys that, when pressed, will move to the next instruction screen. The default is the global `response_key` variable.
-        
+
+    - block : int
+        Number of the block (0 for training). Its summary is taken from the global 'block_metrics'.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
     Returns:
     - None
-    
-    Side Effects:
-    - Displays instruction images one by one in the provided window.
-    - Waits for a key press from `continue_key` to move to the next instruction.
-    - If the exit key is detected using the `check_for_quit` function, it will exit the experiment.
-    
     """
-    for instruction in instructions:
-        # Load and display the instruction image
-        instruction_stim = visual.ImageStim(win, image=instruction,
-                                           size = image_rescale)
-        #instruction_stim.size = 0.8
-        #instruction_stim.height = 0.5
-        instruction_stim.draw()
-        win.flip()
-        
-        # Wait for a space-key press to move to the next instruction
-        while True:
-            keys = event.waitKeys(maxWait=0.05, keyList=continue_key)
-            if keys is not None:
-                break
-            check_for_quit(win, keys=keys)
+    if config is None:
+        config = get_default_config()
+    if block not in block_metrics:
+        return
 
-def display_ready_countdown(win):
+    text = format_block_metrics(block, block_metrics[block]).replace(': ', ':\n', 1).replace(', ', '\n')
+    visual.TextStim(win, text=text + f"\n\nContinue with '{config.experimenter_key}'", height=.06, wrapWidth=1.8).draw()
+    win.flip()
+    wait_for_keys(win, [config.experimenter_key], clear_keys=True, block=block, config=config)
+
+def get_staircase_settings(config=None):
     """
-    Display a countdown sequence.
-    
+    Get the display times and the no-go probability of the current difficulty level of the staircase.
+
+    The level goes from 0 (easiest: the display times of the configuration, one no-go trial per number of digits, 
+    as in the trial plans) to 1 (hardest: the 'adaptive_min_...' settings of the configuration); values in between are interpolated.
+
     Parameters:
-    - win : visual.Window
-        The window or screen instance where the countdown images are displayed.
-    
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
+    Returns:
+    - settings : dict
+        'level', 'digit_time', 'mask_time' (in seconds) and 'nogo_probability'.
+    """
+    if config is None:
+        config = get_default_config()
+    level = staircase.get('level', 0.0)
+    easiest_nogo_probability = 1 / len(config.digit_range)
+    return {
+        'level': level,
+        'digit_time': config.digit_display_time + level * (config.adaptive_min_digit_time - config.digit_display_time),
+        'mask_time': config.mask_display_time + level * (config.adaptive_min_mask_time - config.mask_display_time),
+        'nogo_probability': easiest_nogo_probability + level * (config.adaptive_min_nogo_probability - easiest_nogo_probability),
+    }
+
+def update_staircase(go_trial, status, config=None):
+    """
+    Update the difficulty level of the adaptive mode after a trial (a weighted up-down staircase).
+
+    After a correctly withheld no-go trial, the level rises by 'adaptive_step' times the target commission error 
+    rate; after a commission error, it falls by 'adaptive_step' times (1 - target rate). The level therefore settles 
+    where the commission error rate equals 'adaptive_target_rate'. After an omission error (the digit was missed, 
+    e.g. because it was shown too briefly), the level falls like after a commission error. Correct go trials leave 
+    the level unchanged. The update takes a few arithmetic operations, well within the inter-trial interval.
+
+    Parameters:
+    - go_trial : int
+        1 for a go trial, 0 for a no-go trial.
+    - status : int
+        1 for a correct response, 0 for an error.
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
     Returns:
     - None
-    
-    Notes:
-    - This function assumes the existence of a global list 'countdown_images' containing paths to the countdown images.
+
+    Side Effects:
+    - Updates 'level', 'n_updates' and 'reversals' (number of changes of direction) in the global 'staircase' dictionary.
     """
-    for image_path in countdown_images:
-        # Load and display the countdown image
-        countdown_stim = visual.ImageStim(win, image=image_path, size = image_rescale)
-        countdown_stim.draw()
-        win.flip()
-        
-        # Wait for 1 second before showing the next countdown image
-        if '1' in image_path:
-            core.wait(.8)
-        else:
-            core.wait(1)
-        check_for_quit(win)
+    if config is None:
+        config = get_default_config()
+    if go_trial and status:
+        return
+
+    if not go_trial and status:
+        change = config.adaptive_step * config.adaptive_target_rate
+    else:
+        change = -config.adaptive_step * (1 - config.adaptive_target_rate)
+    direction = 1 if change > 0 else -1
+
+    staircase['level'] = min(1.0, max(0.0, staircase.get('level', 0.0) + change))
+    staircase['n_updates'] = staircase.get('n_updates', 0) + 1
+    if staircase.get('direction', direction) != direction:
+        staircase['reversals'] = staircase.get('reversals', 0) + 1
+    staircase['direction'] = direction
+
+def choose_trial(planned, rng=random, config=None):
+    """
+    Get the digit and the display times (in frames) of a trial.
+
+    Without adaptive mode, these are the planned digit and the display times of the configuration. In adaptive mode 
+    (setting 'adaptive_mode'), the display times follow the level of the staircase (see `get_staircase_settings`), 
+    and the trial is a no-go trial with the no-go probability of the level: the inhibition number replaces the 
+    planned digit, or a random other digit replaces a planned inhibition number.
+
+    Parameters:
+    - planned : PlannedTrial
+        The planned trial (see `build_block_plan`).
+    - rng : random.Random or module random, optional
+        Random number generator for the choice of no-go trials. Default is the module random. `run_block` passes a 
+        generator seeded like the trial plans (see `build_session_plans`) if 'trial_plan_seed' is set.
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
+    Returns:
+    - digit : int
+    - digit_frames, mask_frames : int
+        Number of frames of the digit and the mask.
+    - adaptive : dict or None
+        The settings of the staircase used for the trial (see `get_staircase_settings`), or None without adaptive mode.
+    """
+    if config is None:
+        config = get_default_config()
+    if config.adaptive_mode is None:
+        return planned.digit, frame_timing['digit'], frame_timing['mask'], None
+
+    adaptive = get_staircase_settings(config)
+    if rng.random() < adaptive['nogo_probability']:
+        digit = config.inhibition_number
+    elif planned.digit == config.inhibition_number:
+        digit = rng.choice([digit for digit in config.digit_range if digit != config.inhibition_number])
+    else:
+        digit = planned.digit
+    frame_rate = frame_timing['frame_rate']
+    return (digit, max(1, round(adaptive['digit_time'] * frame_rate)), max(1, round(adaptive['mask_time'] * frame_rate)),
+            adaptive)
 
-def run_block(win, n_trials, digits=digit_range, block=None):
+@profiled
+def run_block(win, n_trials, digits=None, block=None, plan=None, config=None):
     """
     Run the SART (Sustained Attention to Response Task) for a specified number of trials.
 
@@ -225,14 +2319,22 @@ def run_block(win, n_trials, digits=digit_range, block=None):
         Number of trials to run.
     
     - digits : list of ints, optional
-        List of digits to use as stimuli. Default is the global 'digit_range' variable.
+        List of digits to use as stimuli. Default is 'digit_range' of the configuration.
     
     - block : int or None, optional
         Number of current block. Used to save data if block is exited earlier. Default is None.
+
+    - plan : list of PlannedTrial or None, optional
+        Digit, stimulus size and inter-trial interval of every trial (see `build_block_plan`). If provided, `n_trials` 
+        and `digits` are ignored. If None (e.g. when `prepare_trial_plans` was not called), a plan is built with 
+        `build_block_plan`, seeded like the plans of `build_session_plans`. Default is None.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
     
     Returns:
-    - trial_data : list of dictionaries
-        A list of dictionaries, where each dictionary contains data for a trial. This includes:
+    - trial_data : list of TrialRecord
+        A list of records, where each record contains data for a trial (followed by the records of the attention rating). This includes:
         - 'digit': The digit displayed in the trial (stimulus).
         - 'stimulus_size': The index of the stimulus size.
         - 'go_trial': A binary indicator indicating if it's a go-trial (1) or not (0).
@@ -241,47 +2343,77 @@ def run_block(win, n_trials, digits=digit_range, block=None):
         - 'reaction_time': The timestamp when the participant responded.
         - 'reaction_duration': The duration between stimulus display and participant's response.
         - 'status': An indicator of whether the participant's response was correct (1) or incorrect (0).
+        - 'n_responses': The number of presses of the response key from the digit until the next digit (more than 1 for repeated presses).
+        - 'adaptive_level', 'adaptive_digit_time', 'adaptive_mask_time', 'adaptive_nogo_probability': The difficulty level, 
+          display times and no-go probability of the staircase for the trial (None without adaptive mode).
+        - 'phase_timing': Intended and actual durations of the phases (digit, mask, feedback, inter-trial interval) of the trial.
 
     Side Effects:
     - Displays digits one by one in the provided window and waits for participant's response.
     - Shows feedback if there was an error in response.
     - Checks for the exit key using the `check_for_quit` function, and if detected, it will exit the experiment.
+    - Hands the data of every trial and of the attention rating to the background data writer as soon as they are finished.
+    - In adaptive mode, updates the staircase after every trial (see `update_staircase`) and chooses the digit and 
+      display times of the next trial with it (see `choose_trial`), so the digits can differ from the plan.
+    - Updates the online metrics after every trial (see `update_block_metrics`), stores their summary in the global 
+      'block_metrics' and saves it in the block summary file (see `save_data`).
     
     Notes:
-    - This function assumes the existence of global variables like 'countdown_images', 'mask', 'mask_correct', 'feedback_inhibition', 'feedback_missed', etc. 
-      Adjustments to the function might be needed if these globals are not defined elsewhere.
+    - Keys, images and the inhibition number are taken from the configuration.
+    - Digit stimuli are looked up in the global 'stimulus_cache', which must be filled by `build_stimulus_cache` before the first block.
+    - All phases last a whole number of frames, taken from the global 'frame_timing', which must be filled by `measure_phase_frames`.
+      The digit and the mask phases end early when the participant responds.
     """
+    if config is None:
+        config = get_default_config()
+    response_key, exit_key, inhibition_number = config.response_key, config.exit_key, config.inhibition_number
+
     trial_data = []
+    phase_timing = []
+    frame_log.clear()
+    metrics = new_block_metrics()
     
-    # Replicate digits to meet the number of trials and shuffle their order
-    stimuli = (digits * (n_trials // len(digits) + 1))[:n_trials]
-    random.shuffle(stimuli)
-
-    # Load images before the loop to prevent time delays
-    mask_stim_default = visual.ImageStim(win, image=mask, size = image_rescale)
-    mask_stim_correct = visual.ImageStim(win, image=mask_correct, size = image_rescale)
-    feedback_stim_inhibition = visual.ImageStim(win, image=feedback_inhibition, size = image_rescale)
-    feedback_stim_missed = visual.ImageStim(win, image=feedback_missed, size = image_rescale)
+    # Get the digits, stimulus sizes and inter-trial intervals of all trials (reproducible like the plans of
+    # `prepare_trial_plans` if 'trial_plan_seed' is set)
+    if plan is None:
+        plan = build_block_plan(n_trials, digits=digits, rng=get_block_rng(config.trial_plan_seed, experiment_info, block),
+                                config=config)
+
+    # Get images before the loop to prevent time delays
+    mask_stim_default = get_image_stim(win, config.mask)
+    mask_stim_correct = get_image_stim(win, config.mask_correct)
+    feedback_stim_inhibition = get_image_stim(win, config.feedback_inhibition)
+    feedback_stim_missed = get_image_stim(win, config.feedback_missed)
+
+    # Random numbers of the adaptive mode, reproducible like the trial plans if 'trial_plan_seed' is set
+    adaptive_rng = get_block_rng(config.trial_plan_seed, experiment_info, block, '-adaptive')
+
+    # Digit and display times of the first trial (in adaptive mode chosen by the staircase)
+    next_trial = choose_trial(plan[0], rng=adaptive_rng, config=config) if plan else None
     
-    for trial in stimuli:
+    for trial_number, (_, stimulus_size, iti) in enumerate(plan, start=1):
+        trial, digit_frames, mask_frames, adaptive = next_trial
 
         # Clear (saved) reaction time
         reaction_time = None
+        trial_start = len(phase_timing)
 
-        # Display the digit in a random font size 
-        stimulus_height_index = random.choice(range(len(stimuli_heights)))
-        digit_stim = visual.TextStim(win, text=str(trial), 
-                                     height=stimuli_heights[stimulus_height_index]*0.001, 
-                                     font=stimuli_font)
-        digit_stim.draw()
-        stimulus_time = win.flip()
+        # Display the pre-rendered digit in the planned font size and wait for a response
+        digit_stim = stimulus_cache[(trial, config.stimuli_heights[stimulus_size - 1], config.stimuli_font)]
+        # (a remote renderer gets the mask at the same time and shows it if no key ends the digit)
+        with ProfileSpan('digit'):
+            stimulus_time, keys = present_phase(win, digit_stim, digit_frames,
+                                                key_list=[response_key, exit_key], stop_on_key=True, clear_keys=True,
+                                                queue_next=[(mask_stim_default, mask_frames, [response_key, exit_key], True, False, True)])
+        record_phase(phase_timing, 'digit', stimulus_time, trial=trial_number, intended_frames=digit_frames)
+        check_for_quit(win, current_data = trial_data, block=block, keys=keys, config=config)
 
-        # Wait for a response
-        keys = event.waitKeys(maxWait=0.25, keyList=[response_key], timeStamped=True)
-        check_for_quit(win, current_data = trial_data, block=block, keys=keys)
+        # All presses of the response key in this trial (including repeated presses)
+        responses = [key for key in keys if key[0] == response_key]
 
         # Handle response
-        if keys is not None:
+        mask_stim = mask_stim_default
+        if keys:
             # Save reaction time
             reaction_time = keys[0][1]
             if trial != inhibition_number:
@@ -289,21 +2421,22 @@ def run_block(win, n_trials, digits=digit_range, block=None):
                 mask_stim = mask_stim_correct
         else:
             # If no key was pressed while the digit was displayed, display mask and wait
-            mask_stim = mask_stim_default
-            mask_stim.draw()
-            win.flip()
-            keys = event.waitKeys(maxWait=0.9, keyList=[response_key], timeStamped=True)
-
-            check_for_quit(win, current_data = trial_data, block=block, keys=keys)
-
-            if keys is not None:
+            with ProfileSpan('mask'):
+                mask_time, keys = present_phase(win, mask_stim_default, mask_frames,
+                                                key_list=[response_key, exit_key], stop_on_key=True)
+            record_phase(phase_timing, 'mask', mask_time, trial=trial_number, intended_frames=mask_frames)
+            check_for_quit(win, current_data = trial_data, block=block, keys=keys, config=config)
+            responses.extend(key for key in keys if key[0] == response_key)
+
+            if keys:
                 # Save reaction time
                 reaction_time = keys[0][1]
                 if trial != inhibition_number:
                     mask_stim = mask_stim_correct
-        
-        mask_stim.draw()
-        win.flip()
+
+        # Keep 'keys' None if no key was pressed
+        if not keys:
+            keys = None
 
         # Determine feedback and status
         if trial == inhibition_number and keys is not None:
@@ -320,9 +2453,14 @@ def run_block(win, n_trials, digits=digit_range, block=None):
 
         # Show feedback if there was an error
         if status == 0:
-            feedback_stim.draw()
-            win.flip()
-            core.wait(feedback_display_time)
+            with ProfileSpan('feedback'):
+                feedback_time, phase_keys = present_phase(win, feedback_stim, frame_timing['feedback'],
+                                                          key_list=[response_key, exit_key], stop_on_key=[exit_key])
+            record_phase(phase_timing, 'feedback', feedback_time, trial=trial_number)
+            check_for_quit(win, current_data = trial_data, block=block, keys=phase_keys, config=config)
+            responses.extend(key for key in phase_keys if key[0] == response_key)
+            # Feedback stays on the screen during the inter-trial interval
+            mask_stim = feedback_stim
         
         # Calculate duration of reaction
         if reaction_time and stimulus_time:
@@ -339,30 +2477,66 @@ def run_block(win, n_trials, digits=digit_range, block=None):
         # Check whether trial is a go-trial  
         go_trial = 0 if trial == inhibition_number else 1
 
+        # Adapt the difficulty and choose the next trial before the inter-trial interval
+        if config.adaptive_mode is not None:
+            update_staircase(go_trial, status, config=config)
+        next_trial = choose_trial(plan[trial_number], rng=adaptive_rng, config=config) if trial_number < len(plan) else None
+
+        # Wait before starting the next trial (a remote renderer gets the digit and mask of the next trial in advance)
+        iti_frames = frame_timing['iti'] if iti == config.inter_trial_interval else max(1, round(iti * frame_timing['frame_rate']))
+        next_phases = None
+        if next_trial is not None:
+            next_size = plan[trial_number].stimulus_size
+            next_phases = [(stimulus_cache[(next_trial[0], config.stimuli_heights[next_size - 1], config.stimuli_font)],
+                            next_trial[1], [response_key, exit_key], True, True, False),
+                           (mask_stim_default, next_trial[2], [response_key, exit_key], True, False, True)]
+        with ProfileSpan('iti'):
+            iti_time, phase_keys = present_phase(win, mask_stim, iti_frames, key_list=[response_key, exit_key],
+                                                 stop_on_key=[exit_key], queue_next=next_phases)
+        record_phase(phase_timing, 'iti', iti_time, trial=trial_number, intended_frames=iti_frames)
+        responses.extend(key for key in phase_keys if key[0] == response_key)
+
         # Save trial data
-        trial_data.append({
-            'digit': trial,
-            'stimulus_size': stimulus_height_index + 1,
-            'go_trial': go_trial,
-            'key': key,
-            'stimulus_time': stimulus_time,
-            'reaction_time': reaction_time,
-            'reaction_duration': reaction_duration,
-            'status': status
-        })
-        
-        # Wait before starting the next trial
-        core.wait(1)
-        check_for_quit(win, current_data = trial_data, block=block,keys=keys)
+        trial_data.append(TrialRecord(
+            digit=trial,
+            stimulus_size=stimulus_size,
+            go_trial=go_trial,
+            key=key,
+            stimulus_time=stimulus_time,
+            reaction_time=reaction_time,
+            reaction_duration=reaction_duration,
+            status=status,
+            n_responses=len(responses),
+            adaptive_level=adaptive and adaptive['level'],
+            adaptive_digit_time=adaptive and adaptive['digit_time'],
+            adaptive_mask_time=adaptive and adaptive['mask_time'],
+            adaptive_nogo_probability=adaptive and adaptive['nogo_probability'],
+            phase_timing=phase_timing[trial_start:]
+        ))
+        save_data(current_data=trial_data[-1:], block=block, wait=False, config=config)
+        update_block_metrics(metrics, trial_data[-1])
+        check_for_quit(win, current_data = trial_data, block=block, keys=phase_keys, config=config)
+
+    # End the last inter-trial interval with a blank screen
+    end_time = win.flip()
+    if record_frames:
+        frame_log.append(end_time)
+    record_phase(phase_timing, None, end_time)
+
+    # Save the summary of the online metrics of the block
+    block_metrics[block] = summarise_block_metrics(metrics)
+    save_data(block=block, summary=block_metrics[block], wait=False, config=config)
     
     # Get rating of attention on the task
     if experiment_info['rating'] == 1:
-        attention_rating = rate_attention(win, attention_check, trial_data = trial_data, block=block)
+        attention_rating = rate_attention(win, config.attention_check, trial_data = trial_data, block=block, config=config)
         trial_data.extend(attention_rating)     
+        save_data(current_data=attention_rating, block=block, wait=False, config=config)
 
     return trial_data
 
-def rate_attention(win, image_name, trial_data, block, min_val=1, max_val=6):
+@profiled
+def rate_attention(win, image_name, trial_data, block, min_val=1, max_val=6, config=None):
     """
     Display attention-rating scale and let user rate attention during the trial.
 
@@ -373,8 +2547,8 @@ def rate_attention(win, image_name, trial_data, block, min_val=1, max_val=6):
     - image_name : str
         The path to the image file with instructions and the scale.
         
-    - trial_data : list of dict
-        List of dictionaries containing data for each trial up to this point.
+    - trial_data : list of TrialRecord
+        List of records containing data for each trial up to this point.
     
     - block : int or None
         Number of current block. Used to save data if block is exited earlier. Default is None.
@@ -385,9 +2559,12 @@ def rate_attention(win, image_name, trial_data, block, min_val=1, max_val=6):
     - max_val : int, optional
         Maximum possible value for the rating. Default is 6.
 
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
     Returns:
-    - rating_data : list of dict
-        A list of dictionaries, where each dictionary contains:
+    - rating_data : list of TrialRecord
+        A list of records (one per key pressed), where each record contains:
         - 'attention_rating': The rating provided by the participant.
         - 'reaction_time': The timestamp when the participant provided the rating.
         - 'stimulus_time': The timestamp when the rating scale was displayed.
@@ -398,34 +2575,28 @@ def rate_attention(win, image_name, trial_data, block, min_val=1, max_val=6):
     - Checks for the exit key using the `check_for_quit` function, and if detected, it will exit the experiment.
 
     Notes:
-    - The function assumes that the user's inputs are limited to number keys '1' through '6' and the 'escape' key.
+    - The function assumes that the user's inputs are limited to the number keys from `min_val` to `max_val` and the exit key.
     """
     # Display attention scale
-    img = visual.ImageStim(win, image=image_name, size = image_rescale)
+    img = get_image_stim(win, image_name)
     img.draw()
     stimulus_time = win.flip()
     
     # Wait for user input
-    rating = None
-    while True:
-        keys = event.getKeys(keyList=['1', '2', '3', '4', '5', '6', "escape"], timeStamped=True)
-        check_for_quit(win, current_data = trial_data, block=block, keys=keys)
-        if keys:
-            rating = keys
-            if min_val <= int(rating[len(rating)-1][0]) <= max_val:
-                break
+    rating_keys = [str(value) for value in range(min_val, max_val + 1)]
+    rating = wait_for_keys(win, rating_keys, current_data=trial_data, block=block, config=config)
     
     # Save data
     rating_data = []
     for response in rating:
-        rating_data.append({'attention_rating': response[0], 
-                            'reaction_time': response[1],
-                            'stimulus_time': stimulus_time,
-                            'reaction_duration': response[1] - stimulus_time})
+        rating_data.append(TrialRecord(attention_rating=response[0], 
+                                       reaction_time=response[1],
+                                       stimulus_time=stimulus_time,
+                                       reaction_duration=response[1] - stimulus_time))
     
     return rating_data
 
-def run_training_block(win, n_trials):
+def run_training_block(win, n_trials, config=None):
     """
     Run the training block of the experiment.
 
@@ -435,27 +2606,41 @@ def run_training_block(win, n_trials):
     
     - n_trials : int
         Number of training trials to run.
+
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
     
     Returns:
-    - trial_data: List of dictionaries containing data for each trial in the training block.
+    - trial_data: List of records containing data for each trial in the training block.
     """
+    if config is None:
+        config = get_default_config()
+
     # Display instructions
-    display_instructions(win, [intro_train])
+    display_instructions(win, [config.intro_train], config=config)
 
     # Show ready countdown
-    display_ready_countdown(win)
+    display_ready_countdown(win, config=config)
 
     # Run the 'sart' task for all training trials
-    trial_data = run_block(win, n_trials, digits=digit_range, block=0)
+    trial_data = run_block(win, n_trials, block=0, plan=trial_plans.get(0), config=config)
 
     # Display feedback
-    display_instructions(win, [end_training])
+    display_instructions(win, [config.end_training], config=config)
 
-    save_data(training_data=trial_data)
+    # Show the error rates of the block to the experimenter
+    if show_block_metrics:
+        display_block_metrics(win, 0, config=config)
+
+    # Save timing and make sure all data of the block is on disk (trials are saved during the block)
+    save_timing(trial_data, block=0)
+    save_frame_report(trial_data, block=0)
+    write_journal({'type': 'block_end', 'block': 0})
+    flush_data()
     #return trial_data
 
 
-def run_test_block(win, n_trials, block):
+def run_test_block(win, n_trials, block, config=None):
     """
     Run the real test block of the experiment.
 
@@ -469,40 +2654,61 @@ def run_test_block(win, n_trials, block):
     - block : int or None
         Number of current block. Used to save data if block is exited earlier.
 
+    - config : SessionConfig, optional
+        Configuration of the session. Default is `get_default_config()`.
+
     Returns:
-    - trial_data: List of dictionaries containing data for each trial in the testing block.
+    - trial_data: List of records containing data for each trial in the testing block.
     """
+    if config is None:
+        config = get_default_config()
+
     # Display instructions
-    display_instructions(win, [intro_test])
+    display_instructions(win, [config.intro_test], config=config)
 
     # Show ready countdown
-    display_ready_countdown(win)
+    display_ready_countdown(win, config=config)
 
     # Run the 'sart' task for all test trials
-    trial_data = run_block(win, n_trials, digits=digit_range, block=block)
+    trial_data = run_block(win, n_trials, block=block, plan=trial_plans.get(block), config=config)
 
     # Display feedback
-    display_instructions(win, [end_test_block])
+    display_instructions(win, [config.end_test_block], config=config)
 
-    # Save data
-    save_data(test_data=trial_data, block=block)
+    # Show the error rates of the block to the experimenter
+    if show_block_metrics:
+        display_block_metrics(win, block, config=config)
 
-def save_data(training_data=None, test_data=None, current_data=None, block=None, exit_time = None):
+    # Save timing and make sure all data of the block is on disk (trials are saved during the block)
+    save_timing(trial_data, block=block)
+    save_frame_report(trial_data, block=block)
+    write_journal({'type': 'block_end', 'block': block})
+    flush_data()
+
+@profiled
+def save_data(training_data=None, test_data=None, current_data=None, block=None, exit_time = None, wait=True, summary=None, config=None):
     """
     Save experimental data into a CSV file. The CSV file is named based on the task name, 
     participant ID and the date, and if the file already exists, the new data is appended to it.
+    The file is written by a background thread (see `start_data_writer`), so saving does not delay the experiment.
 
     Parameters:
-    - training_data: list of dict, optional
-        A list of dictionaries containing data from the training phase.
-    - test_data: list of dict, optional
-        A list of dictionaries containing data from the testing phase.
-    - current_data: list of dict, optional
-        A list of dictionaries containing data from the currently running block.
+    - training_data: list of TrialRecord, optional
+        A list of records containing data from the training phase.
+    - test_data: list of TrialRecord, optional
+        A list of records containing data from the testing phase.
+    - current_data: list of TrialRecord, optional
+        A list of records containing data from the currently running block.
     - block: int, optional
         The block number. Not required for the training block.
     - exit_time: float, optional
         The timestamp indicating the exit time, if applicable.
+    - wait: bool, optional
+        If True, wait until all data (including data saved earlier) is written and synced to disk. Default is True.
+    - summary: dict, optional
+        Summary of the online metrics of the block (see `summarise_block_metrics`), appended to the block summary file.
+    - config: SessionConfig, optional
+        Configuration of the session (its exit key is saved in the exit row). Default is `get_default_config()`.
 
     CSV Structure:
     The resulting CSV file will have columns for:
@@ -523,14 +2729,22 @@ def save_data(training_data=None, test_data=None, current_data=None, block=None,
     - reaction_time: The timestamp when the participant responded.
     - reaction_duration: The duration between stimulus display and participant's response.
     - attention_rating: The attention rating given by the participant.
+    - n_responses: The number of presses of the response key in the trial (from the digit until the next digit).
 
     Side effects:
-    - The function writes data to a CSV file.
+    - The function hands the data to the background data writer, which writes it to a CSV file.
+    - If the global 'save_binary' is True, the data is also appended to a binary data file with the same name in the 
+      subfolder 'binary' of the data folder (see `encode_binary_rows`).
+    - If the global 'aggregator_address' is set, a copy of the data is sent to the aggregator of the lab 
+      (see `send_to_aggregator`).
+    - If a summary is given, it is appended to the block summary file with the same name in the subfolder 'summaries' 
+      of the data folder (columns of the global 'summary_columns' list).
 
     Note:
     - The function assumes the presence of a global variable 'experiment_info' that provides metadata 
       about the experiment, including participant ID, session number, date, etc.
-    - The function also assumes the existence of a 'data/' directory where the CSV file is saved.
+    - The function also assumes the existence of the directory set in the global 'data_folder' variable (default 'data/'), 
+      where the CSV file is saved.
 
     Returns:
     - None. 
@@ -544,110 +2758,170 @@ def save_data(training_data=None, test_data=None, current_data=None, block=None,
     all_data = []
 
     # Get data from training
-    if training_data !=None:
-        for data in training_data:
-            row = {
-                'experiment_name': experiment_name,
-                'participant': participant,
-                'session': session,
-                'block': 0,
-                'date': date,
-                'training': 1,
-                'test': 0,
-                'rating': 1 if data.get('attention_rating', None) else None,
-                'digit': data.get('digit', None),
-                'stimulus_size': data.get('stimulus_size', None),
-                'go_trial': data.get('go_trial', None),
-                'key': data.get('key', None),
-                'status': data.get('status', None),
-                'stimulus_time': data.get('stimulus_time', None),
-                'reaction_time': data.get('reaction_time', None),
-                'reaction_duration': data.get('reaction_duration', None),
-                'attention_rating': data.get('attention_rating', None),
-            }
-            all_data.append(row)
+    if training_data is not None:
+        all_data.extend(build_rows(training_data, (experiment_name, participant, session, 0, date, 1, 0)))
     
     # Get data from test
-    if test_data != None:
-        for data in test_data:
-            row = {
-                'experiment_name': experiment_name,
-                'participant': participant,
-                'session': session,
-                'block': block,
-                'date': date,
-                'training': 0,
-                'test': 1,
-                'rating': 1 if data.get('attention_rating', None) else None,
-                'digit': data.get('digit', None),
-                'stimulus_size': data.get('stimulus_size', None),
-                'go_trial': data.get('go_trial', None),
-                'key': data.get('key', None),
-                'status': data.get('status', None),
-                'stimulus_time': data.get('stimulus_time', None),
-                'reaction_time': data.get('reaction_time', None),
-                'reaction_duration': data.get('reaction_duration', None),
-                'attention_rating': data.get('attention_rating', None)               
-            }
-            all_data.append(row)
+    if test_data is not None:
+        all_data.extend(build_rows(test_data, (experiment_name, participant, session, block, date, 0, 1)))
     
     # Get data from currently running block
-    if current_data !=None:
-        for data in current_data:
-            row = {
-                'experiment_name': experiment_name,
-                'participant': participant,
-                'session': session,
-                'block': block,
-                'date': date,
-                'training': 1 if block==0 else 0,
-                'test': 0 if block==0 else 1,
-                'rating': 1 if data.get('attention_rating', None) else None,
-                'digit': data.get('digit', None),
-                'stimulus_size': data.get('stimulus_size', None),
-                'go_trial': data.get('go_trial', None),
-                'key': data.get('key', None),
-                'status': data.get('status', None),
-                'stimulus_time': data.get('stimulus_time', None),
-                'reaction_time': data.get('reaction_time', None),
-                'reaction_duration': data.get('reaction_duration', None),
-                'attention_rating': data.get('attention_rating', None)
-            }
-            all_data.append(row)
-    
-    # If participant
-    if exit_time !=None:  
-        exit_row = {
-            'experiment_name': experiment_name,
-            'participant': participant,
-            'session': session,
-            'block': None,
-            'date': date,
-            'training': None,
-            'test': None,
-            'rating': None,
-            'digit': None,
-            'stimulus_size': None,
-            'go_trial': None,
-            'key': exit_key,
-            'status': None,
-            'stimulus_time': None,
-            'reaction_time': exit_time,
-            'reaction_duration': None,
-            'attention_rating': None
-        }
-        all_data.append(exit_row)
-
-    # Save data in csv file
+    if current_data is not None:
+        training = 1 if block==0 else 0
+        all_data.extend(build_rows(current_data, (experiment_name, participant, session, block, date, training, 1 - training)))
+    
+    # If participant pressed the exit key
+    if exit_time is not None:
+        if config is None:
+            config = get_default_config()
+        exit_row = TrialRecord(key=config.exit_key, reaction_time=exit_time)
+        all_data.extend(build_rows([exit_row], (experiment_name, participant, session, None, date, None, None)))
+
+    # Save data in csv file and journal (written by the background data writer)
     filename = f"sart2_{participant}_{date}.csv"
-    path = "data/" + filename
-    df = pd.DataFrame(all_data)
-    if os.path.exists(path):
-        df.to_csv(path, mode='a', header=False, index=False)
-    else:
-        df.to_csv(path, mode='w', header=True, index=False)
+    path = os.path.join(data_folder, filename)
+    write_rows(path, data_columns, all_data, journal=get_journal_path(experiment_info))
+
+    # Send a copy of the data to the aggregator of the lab (if set)
+    send_to_aggregator(path, all_data)
+
+    # Append the summary of the block to the block summary file
+    if summary is not None:
+        training = 1 if block == 0 else 0
+        summary_path = os.path.join(data_folder, "summaries", filename)
+        os.makedirs(os.path.dirname(summary_path), exist_ok=True)
+        write_rows(summary_path, summary_columns,
+                   [[experiment_name, participant, session, block, date, training, *(summary[column] for column in summary_columns[6:])]])
+
+    # Also save the data in the binary data file
+    if save_binary:
+        os.makedirs(os.path.join(data_folder, "binary"), exist_ok=True)
+        write_binary_rows(get_binary_path(path), all_data)
+
+    # Wait until the data is on disk
+    if wait:
+        flush_data()
+
+def build_rows(records, session_values):
+    """
+    Build the rows of the data file for a list of records.
+
+    Parameters:
+    - records : list of TrialRecord
+        The trials or attention ratings.
+    - session_values : tuple
+        Values of the first seven columns of the data file, which are the same for all records: experiment_name, 
+        participant, session, block, date, training and test.
+
+    Returns:
+    - rows : list of lists
+        One row per record, with one value for each column in the global 'data_columns' list.
+    """
+    # The 'rating' flag is followed by the record fields in the order of the columns (without 'phase_timing')
+    return [[*session_values, 1 if record.attention_rating else None, *record[:-1]] for record in records]
+
+def save_timing(trial_data, block=None):
+    """
+    Save the intended and actual durations of all trial phases into a CSV file. The file has the same name as the 
+    data file (see `save_data`) and is saved in the subfolder 'timing' of the data folder. If the file already exists, the new 
+    data is appended to it.
+
+    Parameters:
+    - trial_data: list of TrialRecord or None
+        A list of records containing data for each trial, as returned by `run_block`.
+    - block: int, optional
+        The block number (0 for training).
+
+    CSV Structure:
+    The resulting CSV file will have columns for participant, session, block, trial (number of the trial within 
+    the block), phase ('digit', 'mask', 'feedback' or 'iti'), intended_frames, intended_duration, onset 
+    (timestamp of the first frame of the phase) and actual_duration (until the next phase started).
+
+    Returns:
+    - None. 
+    """
+    participant = experiment_info['participant']
+    session     = experiment_info['session']
+    date        = experiment_info['date']
+
+    # Get timing of the trial phases
+    timing_data = []
+    for data in trial_data or []:
+        for phase in data.phase_timing or []:
+            timing_data.append([participant, session, block, phase['trial'], phase['phase'], 
+                                phase['intended_frames'], phase['intended_duration'], 
+                                phase['onset'], phase['actual_duration']])
+
+    # Save timing data in csv file (written by the background data writer)
+    if timing_data:
+        os.makedirs(os.path.join(data_folder, "timing"), exist_ok=True)
+        write_rows(os.path.join(data_folder, "timing", f"sart2_{participant}_{date}.csv"), timing_columns, timing_data)
+
+def save_frame_report(trial_data, block=None):
+    """
+    Save the time of every flip of a block and a report of dropped frames and late trial phases into two CSV files. 
+    The files are named like the data file (see `save_data`) with the endings '_frames' and '_report', and are saved 
+    in the subfolder 'timing' of the data folder. If the files already exist, the new data is appended to them.
+    Nothing is saved unless the global 'record_frames' is True.
+
+    Parameters:
+    - trial_data: list of TrialRecord or None
+        A list of records containing data for each trial, as returned by `run_block`.
+    - block: int, optional
+        The block number (0 for training).
+
+    CSV Structure:
+    - Frame file: participant, session, block, frame (number of the flip within the block), flip_time (timestamp of the
+      flip), interval (time since the previous flip) and dropped (1 if the interval was longer than 1.5 frames, i.e. 
+      at least one refresh of the monitor was missed, otherwise 0).
+    - Report: One row per block with participant, session, block, frame_rate, n_frames, mean_interval, p95_interval 
+      (95th percentile) and max_interval of the intervals between flips, dropped_frames (number of dropped intervals), 
+      n_phases and late_phases (number of trial phases that lasted at least half a frame longer than intended).
 
-def main_experiment(experiment_info):
+    Returns:
+    - None
+
+    Side Effects:
+    - Prints a warning if frames were dropped or phases were late, so that the session can be checked or repeated.
+    - Clears the global 'frame_log'.
+    """
+    if not record_frames or len(frame_log) < 2:
+        frame_log.clear()
+        return
+
+    participant = experiment_info['participant']
+    session     = experiment_info['session']
+    date        = experiment_info['date']
+    frame_duration = 1 / frame_timing['frame_rate']
+
+    # Intervals between flips
+    intervals = [current - previous for previous, current in zip(frame_log, frame_log[1:])]
+    dropped = [1 if interval > 1.5 * frame_duration else 0 for interval in intervals]
+    frame_data = [[participant, session, block, 1, frame_log[0], None, 0]]
+    for frame, (flip_time, interval, drop) in enumerate(zip(frame_log[1:], intervals, dropped), start=2):
+        frame_data.append([participant, session, block, frame, flip_time, interval, drop])
+    frame_log.clear()
+
+    # Trial phases that lasted longer than intended
+    phases = [phase for data in trial_data or [] for phase in data.phase_timing or []
+              if phase['actual_duration'] is not None]
+    late_phases = sum(1 for phase in phases if phase['actual_duration'] - phase['intended_duration'] >= frame_duration / 2)
+
+    sorted_intervals = sorted(intervals)
+    report = [participant, session, block, frame_timing['frame_rate'], len(frame_data),
+              sum(intervals) / len(intervals), sorted_intervals[max(0, -(-95 * len(intervals) // 100) - 1)],
+              sorted_intervals[-1], sum(dropped), len(phases), late_phases]
+
+    # Save frame file and report (written by the background data writer)
+    os.makedirs(os.path.join(data_folder, "timing"), exist_ok=True)
+    write_rows(os.path.join(data_folder, "timing", f"sart2_{participant}_{date}_frames.csv"), frame_columns, frame_data)
+    write_rows(os.path.join(data_folder, "timing", f"sart2_{participant}_{date}_report.csv"), frame_report_columns, [report])
+
+    if sum(dropped) or late_phases:
+        print(f"Timing warning (block {block}): {sum(dropped)} dropped frames, {late_phases} of {len(phases)} phases late, "
+              f"longest interval {sorted_intervals[-1]*1000:.1f} ms")
+
+def main_experiment(experiment_info, config=None):
     """
     Run the experiment.
 
@@ -656,6 +2930,9 @@ def main_experiment(experiment_info):
         A dictionary containing metadata and settings for the experiment. Expected keys include:
         - 'training': Boolean indicating if a training block should be run.
         - 'testing': Integer indicating the number of test blocks to run.
+    - config (SessionConfig, optional):
+        Configuration of the session (numbers of trials, display times, stimuli, images, keys), built once by the 
+        caller (see `make_config` and `load_config`). Default is `get_default_config()`.
     
     Workflow:
     1. Show an information dialog with general information.
@@ -665,44 +2942,198 @@ def main_experiment(experiment_info):
     5. Run the actual testing blocks as specified in 'experiment_info'.
     6. Display a concluding message and await a keypress from the experimenter.
     7. Close the experiment window and end the experiment.
+    8. If 'profile_session' is True, save where the time of the session was spent (see `save_profile`).
 
     Note:
-    - The function assumes the presence of several global variables ('title_screen', 'intro1', 'intro2', 'end_experiment', 
-      'n_trials_train', 'n_trials_test', and 'experimenter_key', etc.) and helper functions ()'show_info_dialog', 
-      'display_instructions', 'run_training_block', and 'run_test_block', etc.)
+    - The configuration is passed to all functions of the session, so several configurations can be run one after 
+      another in the same process. Derived data (numbers of frames, pre-rendered stimuli, loaded images) is computed
+      once per configuration and reused.
     
     Returns:
     -None. 
     """
+    if config is None:
+        config = get_default_config()
+
     # Show experiment info dialog
     experiment_info = show_info_dialog(experiment_info, popped_keys)
 
-    # Set up the experiment window
-    win = visual.Window(fullscr=True, color="black", units="norm")
-    win.mouseVisible = False
+    # Start writing data in the background
+    start_data_writer()
+
+    # Continue an interrupted session or start the journal of a new session
+    finished_blocks = set()
+    if experiment_info['resume']:
+        finished_blocks = resume_session(experiment_info, config=config)
+    else:
+        start_journal(experiment_info)
+
+    # Get the order of the trials of all blocks
+    prepare_trial_plans(experiment_info, config=config)
+
+    # Set up the experiment window and open the keyboard for responses (or use those of the remote renderer)
+    with ProfileSpan('open_window'):
+        if renderer_address:
+            win = connect_renderer(renderer_address)
+        else:
+            win = visual.Window(fullscr=True, color="black", units="norm")
+            open_keyboard()
+        win.mouseVisible = False
+
+    # Pre-render all digit stimuli once for the whole session
+    with ProfileSpan('build_stimulus_cache'):
+        cache_info = build_stimulus_cache(win, config=config)
+    print(f"Stimulus cache: {cache_info['n_stimuli']} stimuli, "
+          f"warm-up {cache_info['warmup_duration']*1000:.1f} ms, "
+          f"~{cache_info['texture_bytes']/1024**2:.1f} MB textures")
+
+    # Load all images before the title screen appears
+    with ProfileSpan('preload_images'):
+        preload_images(win, config=config)
+
+    # Convert display times into frames of the monitor
+    with ProfileSpan('measure_phase_frames'):
+        measure_phase_frames(win, config=config)
 
     # Display introduction and task instructions
-    display_instructions(win, [title_screen, intro1, intro2])
+    display_instructions(win, [config.title_screen, config.intro1, config.intro2], config=config)
 
     # Run the training block
-    if experiment_info['training']:
-        run_training_block(win, n_trials_train)
+    if experiment_info['training'] and 0 not in finished_blocks:
+        run_training_block(win, config.n_trials_train, config=config)
 
     # Run the real test block
     n_blocks = experiment_info['testing']
     if n_blocks:
         for block in range(1, n_blocks + 1):
-            run_test_block(win, n_trials_test, block)
+            if block not in finished_blocks:
+                run_test_block(win, config.n_trials_test, block, config=config)
     
     # Display end-of-experiment slide
-    display_instructions(win, [end_experiment], continue_key=experimenter_key)
+    display_instructions(win, [config.end_experiment], continue_key=config.experimenter_key, config=config)
 
     # End the experiment
+    stop_aggregator_sender()
+    with ProfileSpan('stop_data_writer'):
+        stop_data_writer()
+    save_profile()
     win.close()
 
+    # Log the online metrics of all blocks
+    for block, summary in sorted(block_metrics.items()):
+        print(format_block_metrics(block, summary))
+
+def summarise_profile(spans):
+    """
+    Sum up the measured spans by name.
+
+    Parameters:
+    - spans : list of tuples
+        The spans of the global 'profile' dictionary (see `close_profile_span`).
+
+    Returns:
+    - summary : list of dict
+        One dictionary per name ('name', 'calls', 'total', 'self', 'mean', 'max', in seconds), sorted by self time 
+        (the time not spent in other measured spans), so the largest time consumers come first.
+    """
+    summary = {}
+    for name, start, duration, self_time, depth, thread in spans:
+        entry = summary.setdefault(name, {'name': name, 'calls': 0, 'total': 0.0, 'self': 0.0, 'max': 0.0})
+        entry['calls'] += 1
+        entry['total'] += duration
+        entry['self'] += self_time
+        entry['max'] = max(entry['max'], duration)
+    for entry in summary.values():
+        entry['mean'] = entry['total'] / entry['calls']
+    return sorted(summary.values(), key=lambda entry: entry['self'], reverse=True)
+
+def format_profile_summary(summary, duration, n_lines=None):
+    """
+    Format the summary of a profile as a table.
+
+    Parameters:
+    - summary : list of dict
+        Result of `summarise_profile`.
+    - duration : float
+        Time from the start of the first span to the end of the last span (in seconds).
+    - n_lines : int, optional
+        Number of names shown (the largest time consumers). Default is None (all names).
+
+    Returns:
+    - text : str
+    """
+    lines = [f"{'span':<24} {'calls':>7} {'total s':>10} {'self s':>10} {'self %':>7} {'mean ms':>10} {'max ms':>10}"]
+    for entry in summary[:n_lines]:
+        lines.append(f"{entry['name']:<24} {entry['calls']:>7} {entry['total']:>10.3f} {entry['self']:>10.3f} "
+                     f"{100 * entry['self'] / duration if duration else 0:>7.1f} {entry['mean'] * 1000:>10.3f} {entry['max'] * 1000:>10.3f}")
+    return "\n".join(lines)
+
+def save_profile(verbose=True):
+    """
+    Save the spans measured in the session (see `ProfileSpan`) as a trace file and a text summary.
+
+    The trace file ('.json', in the subfolder 'profiles' of the data folder, named like the data file) uses the 
+    Trace Event Format and can be opened with trace viewers such as chrome://tracing, https://ui.perfetto.dev or 
+    speedscope. The summary ('.txt', same name) lists the time per span name, largest self time first. If the files 
+    already exist (e.g. for a resumed session), a number is added to the name. Nothing is saved unless the global 
+    'profile_session' is True.
+
+    Parameters:
+    - verbose : bool, optional
+        If True, the largest time consumers are printed. Default is True.
+
+    Returns:
+    - None
+
+    Side Effects:
+    - Closes spans that are still open (if the session was quitted with the exit key).
+    - Clears the global 'profile' dictionary.
+    """
+    if not profile_session:
+        return
+    end = time.perf_counter()
+    while profile['open']:
+        close_profile_span(end)
+    spans, start = profile['spans'], profile['start']
+    profile.update({'spans': [], 'open': [], 'start': None})
+    if not spans:
+        return
+
+    participant = experiment_info['participant']
+    date        = experiment_info['date']
+    duration = max(span[1] + span[2] for span in spans) - start
+
+    # Trace Event Format: complete events ('X') with start and duration in microseconds
+    process = os.getpid()
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': process, 'args': {'name': f"sart2 {participant} {date}"}}]
+    for thread in {span[5] for span in spans}:
+        name = next((item.name for item in threading.enumerate() if item.ident == thread), str(thread))
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': process, 'tid': thread, 'args': {'name': name}})
+    for name, span_start, span_duration, self_time, depth, thread in spans:
+        events.append({'name': name, 'cat': 'sart', 'ph': 'X', 'pid': process, 'tid': thread,
+                       'ts': round((span_start - start) * 1e6, 1), 'dur': round(span_duration * 1e6, 1),
+                       'args': {'self_ms': round(self_time * 1000, 3)}})
+
+    summary = summarise_profile(spans)
+    folder = os.path.join(data_folder, "profiles")
+    os.makedirs(folder, exist_ok=True)
+    name, number = f"sart2_{participant}_{date}", 1
+    while os.path.exists(os.path.join(folder, name + ".json")):
+        number += 1
+        name = f"sart2_{participant}_{date}_{number}"
+    with open(os.path.join(folder, name + ".json"), 'w') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+    with open(os.path.join(folder, name + ".txt"), 'w') as file:
+        file.write(f"Profile of participant {participant}, session {experiment_info['session']}, {date}\n"
+                   f"Measured time: {duration:.3f} s\n\n{format_profile_summary(summary, duration)}\n")
+
+    if verbose:
+        print(f"Largest time consumers (saved in {os.path.join(folder, name)}.txt):")
+        print(format_profile_summary(summary, duration, n_lines=10))
+
 ###############################################################################
 ################################ Run experiment ###############################
 ###############################################################################
 
 if __name__ == '__main__':
-    main_experiment(experiment_info)
+    main_experiment(experiment_info, config=load_config(config_file) if config_file else make_config())
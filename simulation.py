@@ -0,0 +1,440 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Headless simulation of SART sessions.
+
+Runs the trial logic of sart.py (`run_block`, `rate_attention`, `save_data`, ...) without a display
+or keyboard. A simulated window replaces the PsychoPy window and advances a virtual clock by one
+frame on every flip, so a full session takes a fraction of a second instead of about 20 minutes.
+A simulated participant watches the screen and presses keys according to a response model. The
+data files have exactly the same format as the files of real sessions.
+
+Many participants can be simulated in parallel on all CPU cores (see `simulate_batch`). Every
+participant gets a seed derived from its participant ID, so a batch is reproducible no matter
+how the participants are distributed over the processes.
+
+Usage (from the repository folder):
+    python simulation.py --participants 10 --output data/simulated
+    python simulation.py --participants 5000 --processes 8 --seed 42
+    python simulation.py --participants 10 --config short_blocks.json
+"""
+
+import argparse
+import datetime
+import multiprocessing
+import os
+import random
+
+import sart
+
+###############################################################################
+############################### Response model ################################
+###############################################################################
+
+class ResponseModel:
+    """
+    Behaviour of a simulated participant. Subclass it and override its methods for other behaviour.
+
+    Parameters:
+    - rt_mu, rt_sigma, rt_tau : float, optional
+        Parameters (in seconds) of the ex-Gaussian distribution of reaction times: mean and standard
+        deviation of the normal component and mean of the exponential component. Defaults are .3, .05 and .1.
+    - commission_rate : float, optional
+        Probability of pressing the response key in a no-go trial. Default is .35.
+    - omission_rate : float, optional
+        Probability of not pressing the response key in a go trial. Default is .03.
+    - rating_probabilities : list of float, optional
+        Probabilities of the attention ratings 1 to 6. Default is [.25, .3, .2, .15, .07, .03].
+    - rating_time : float, optional
+        Mean time (in seconds) needed for the attention rating. Default is 2.
+    - reading_time : float, optional
+        Mean time (in seconds) needed to read an instruction screen. Default is 3.
+    - rng : random.Random, optional
+        Random number generator. Default is a new generator without seed.
+    """
+    def __init__(self, rt_mu=.3, rt_sigma=.05, rt_tau=.1, commission_rate=.35, omission_rate=.03,
+                 rating_probabilities=(.25, .3, .2, .15, .07, .03), rating_time=2.0, reading_time=3.0, rng=None):
+        self.rt_mu = rt_mu
+        self.rt_sigma = rt_sigma
+        self.rt_tau = rt_tau
+        self.commission_rate = commission_rate
+        self.omission_rate = omission_rate
+        self.rating_probabilities = list(rating_probabilities)
+        self.rating_time = rating_time
+        self.reading_time = reading_time
+        self.rng = rng or random.Random()
+
+    def sample_reaction_time(self):
+        """Draw a reaction time (in seconds) from the ex-Gaussian distribution (at least 100 ms)."""
+        return max(.1, self.rng.gauss(self.rt_mu, self.rt_sigma) + self.rng.expovariate(1 / self.rt_tau))
+
+    def respond(self, digit, go_trial):
+        """
+        Decide whether and when to respond to a digit.
+
+        Parameters:
+        - digit : int
+            The digit displayed in the trial.
+        - go_trial : bool
+            True if the participant should respond.
+
+        Returns:
+        - reaction_time : float or None
+            Time (in seconds) from the onset of the digit to the key press, or None for no response.
+        """
+        if go_trial and self.rng.random() < self.omission_rate:
+            return None
+        if not go_trial and self.rng.random() >= self.commission_rate:
+            return None
+        return self.sample_reaction_time()
+
+    def rate_attention(self):
+        """
+        Rate the attention on the task.
+
+        Returns:
+        - rating : int
+            The attention rating (1 to 6).
+        - reaction_time : float
+            Time (in seconds) from the onset of the rating scale to the key press.
+        """
+        rating = self.rng.choices(range(1, len(self.rating_probabilities) + 1), weights=self.rating_probabilities)[0]
+        return rating, self.rng.uniform(.5, 1.5) * self.rating_time
+
+    def read_instructions(self):
+        """Return the time (in seconds) needed to read an instruction screen."""
+        return self.rng.uniform(.5, 1.5) * self.reading_time
+
+###############################################################################
+########################### Simulated environment #############################
+###############################################################################
+
+class SimulatedStim:
+    """
+    Stand-in for visual.TextStim and visual.ImageStim. Drawing it tells the simulated window what is on the screen.
+    """
+    def __init__(self, win, text=None, image=None, height=None, **kwargs):
+        self.win = win
+        self.text = text
+        self.image = image
+        self.height = height
+        # Approximate size (in pixels) of the rendered text
+        self.boundingBox = (0.6 * (height or 0) * 1000, (height or 0) * 1000)
+
+    def draw(self):
+        self.win.drawn = self
+
+class SimulatedVisual:
+    """Stand-in for the psychopy.visual module."""
+    TextStim = SimulatedStim
+    ImageStim = SimulatedStim
+    GratingStim = SimulatedStim
+
+class SimulatedWindow:
+    """
+    Stand-in for visual.Window with a virtual clock. Every flip advances the clock by one frame. When a new
+    stimulus appears, the simulated participant decides which key to press and when.
+
+    Parameters:
+    - model : ResponseModel
+        Behaviour of the simulated participant.
+    - frame_rate : float, optional
+        Simulated refresh rate (in Hz). Default is 60.
+    - config : sart.SessionConfig, optional
+        Configuration of the session (keys, inhibition number and images). Default is `sart.make_config()`.
+    """
+    def __init__(self, model, frame_rate=60.0, config=None):
+        self.model = model
+        self.frame_rate = frame_rate
+        self.config = config or sart.make_config()
+        self.time = 0.0
+        self.drawn = None
+        self.shown = None
+        self.pending_keys = []
+        self.polled = False
+        self.mouseVisible = True
+        self.size = (1920, 1080)
+        self.units = 'norm'
+
+    def flip(self):
+        self.time += 1 / self.frame_rate
+        if self.drawn is not None and self.drawn is not self.shown:
+            self.participant_sees(self.drawn)
+        self.shown = self.drawn
+        self.drawn = None
+        self.polled = False
+        return self.time
+
+    def participant_sees(self, stim):
+        """Schedule the key press of the simulated participant for a stimulus that just appeared."""
+        # The digits of the glyph atlas share one quad; the participant sees the digit set last (see `sart.AtlasDigit`)
+        for key, atlas in sart.config_cache.items():
+            if key[0] == 'glyph_atlas' and atlas['quad'] is stim:
+                stim = atlas['shown']
+        if stim.text is not None and not stim.text.isdigit():
+            # Screen for the experimenter (e.g. the metrics of a block)
+            self.pending_keys.append((self.config.experimenter_key, self.time + self.model.read_instructions()))
+        elif stim.text is not None:
+            digit = int(stim.text)
+            reaction_time = self.model.respond(digit, digit != self.config.inhibition_number)
+            if reaction_time is not None:
+                self.pending_keys.append((self.config.response_key, self.time + reaction_time))
+        elif stim.image == self.config.attention_check:
+            rating, reaction_time = self.model.rate_attention()
+            self.pending_keys.append((str(rating), self.time + reaction_time))
+        elif stim.image == self.config.end_experiment:
+            self.pending_keys.append((self.config.experimenter_key, self.time + self.model.read_instructions()))
+        elif stim.image in instruction_images(self.config):
+            self.pending_keys.append((self.config.response_key, self.time + self.model.read_instructions()))
+
+    def getActualFrameRate(self, **kwargs):
+        return self.frame_rate
+
+    def clearBuffer(self):
+        self.drawn = None
+
+    def close(self):
+        pass
+
+class SimulatedEvent:
+    """
+    Stand-in for the psychopy.event module, returning the key presses of the simulated participant.
+
+    Parameters:
+    - win : SimulatedWindow
+        The simulated window with the virtual clock.
+    - poll_interval : float, optional
+        Time (in seconds) that passes if keys are polled repeatedly without a flip. Default is .001.
+    """
+    def __init__(self, win, poll_interval=.001):
+        self.win = win
+        self.poll_interval = poll_interval
+
+    def take_keys(self, keyList, until):
+        """Remove and return the pending keys from `keyList` that were pressed before `until`."""
+        keys = [key for key in self.win.pending_keys
+                if key[1] <= until and (keyList is None or key[0] in keyList)]
+        for key in keys:
+            self.win.pending_keys.remove(key)
+        return sorted(keys, key=lambda key: key[1])
+
+    def getKeys(self, keyList=None, timeStamped=False):
+        # Polling in a loop without flips lets time pass
+        if self.win.polled:
+            self.win.time += self.poll_interval
+        self.win.polled = True
+
+        keys = self.take_keys(keyList, self.win.time)
+        return keys if timeStamped else [key[0] for key in keys]
+
+    def waitKeys(self, maxWait=float('inf'), keyList=None, timeStamped=False, clearEvents=True):
+        if clearEvents:
+            self.clearEvents()
+        # Waiting already lets time pass, so the next poll does not
+        self.win.polled = False
+        keys = self.take_keys(keyList, self.win.time + maxWait)
+        if not keys:
+            self.win.time += maxWait
+            return None
+        self.win.time = max(self.win.time, keys[0][1])
+        return keys[:1] if timeStamped else [keys[0][0]]
+
+    def clearEvents(self, eventType=None):
+        self.win.pending_keys = [key for key in self.win.pending_keys if key[1] > self.win.time]
+
+class SimulatedCore:
+    """Stand-in for the psychopy.core module, using the virtual clock of the simulated window."""
+    def __init__(self, win):
+        self.win = win
+
+    def wait(self, secs, hogCPUperiod=0.2):
+        self.win.time += secs
+
+    def getTime(self):
+        return self.win.time
+
+    def quit(self):
+        raise SystemExit
+
+def instruction_images(config):
+    """Images of a configuration of sart.py after which the participant has to press the response key to continue."""
+    return [config.title_screen, config.intro1, config.intro2, config.intro3, config.intro_train, config.intro_test,
+            config.end_training, config.end_test_block]
+
+###############################################################################
+################################ Run simulation ###############################
+###############################################################################
+
+def simulate_session(participant, model=None, seed=None, session='001', training=1, testing=3, rating=1,
+                     output=None, frame_rate=60.0, config=None):
+    """
+    Simulate a complete session with the blocks of `main_experiment` (without the info dialog).
+
+    Parameters:
+    - participant : str
+        Participant ID (used in the data-file name).
+    - model : ResponseModel, optional
+        Behaviour of the simulated participant. Default is a ResponseModel with default settings.
+    - seed : int or str, optional
+        Seed for the trial order and the response model. Default is None (not reproducible).
+    - session : str, optional
+        Session number. Default is '001'.
+    - training : int, optional
+        1 = include training, 0 = no training. Default is 1.
+    - testing : int, optional
+        Number of testing blocks. Default is 3.
+    - rating : int, optional
+        1 = include attention rating, 0 = no rating. Default is 1.
+    - output : str, optional
+        Folder for the data files. Default is the global 'data_folder' variable of sart.py.
+    - frame_rate : float, optional
+        Simulated refresh rate (in Hz). Default is 60.
+    - config : sart.SessionConfig, optional
+        Configuration of the session (see `make_config` and `load_config` in sart.py). Default is the configuration 
+        built from the variables of sart.py.
+
+    Returns:
+    - path : str
+        Path to the data file, which has the same format as the data files of real sessions.
+    """
+    # Make the session reproducible
+    random.seed(seed)
+    if model is None:
+        model = ResponseModel()
+    model.rng.seed(None if seed is None else f'{seed}-participant')
+
+    if config is None:
+        config = sart.make_config()
+
+    # Replace display, keyboard and clock by simulated ones
+    win = SimulatedWindow(model, frame_rate=frame_rate, config=config)
+    modules = (sart.visual, sart.event, sart.core, sart.data_folder)
+    sart.visual, sart.event, sart.core = SimulatedVisual(), SimulatedEvent(win), SimulatedCore(win)
+    sart.keyboard['device'] = None  # Keys are read from the simulated event module
+    if output is not None:
+        sart.data_folder = output
+    os.makedirs(sart.data_folder, exist_ok=True)
+
+    try:
+        sart.experiment_info.update({
+            'participant': participant,
+            'session': session,
+            'training': training,
+            'testing': testing,
+            'rating': rating,
+            'resume': 0,
+            'date': datetime.datetime.now().strftime('%Y-%m-%d_%Hh%M.%S.%f')[:-3]
+        })
+
+        # Prepare stimuli (images are not decoded, the simulated participant only needs their paths)
+        sart.build_stimulus_cache(win, config=config)
+        sart.image_registry.clear()
+        for image_path in [config.mask, config.mask_correct, config.feedback_inhibition, config.feedback_missed,
+                           config.attention_check, config.end_experiment, *config.countdown_images,
+                           *instruction_images(config)]:
+            sart.image_registry[image_path] = (SimulatedStim(win, image=image_path), 0)
+        sart.measure_phase_frames(win, config=config)
+        sart.start_journal(sart.experiment_info)
+        sart.prepare_trial_plans(sart.experiment_info, config=config)
+
+        # Run the blocks like `main_experiment`
+        sart.display_instructions(win, [config.title_screen, config.intro1, config.intro2], config=config)
+        if training:
+            sart.run_training_block(win, config.n_trials_train, config=config)
+        for block in range(1, testing + 1):
+            sart.run_test_block(win, config.n_trials_test, block, config=config)
+        sart.display_instructions(win, [config.end_experiment], continue_key=config.experimenter_key, config=config)
+        sart.flush_data()
+        sart.save_profile(verbose=False)
+
+        return os.path.join(sart.data_folder, f"sart2_{participant}_{sart.experiment_info['date']}.csv")
+    finally:
+        sart.visual, sart.event, sart.core, sart.data_folder = modules
+        sart.image_registry.clear()
+        sart.stimulus_cache.clear()
+        sart.trial_plans.clear()
+        sart.block_metrics.clear()
+        sart.staircase.clear()
+        sart.profile.update({'spans': [], 'open': [], 'start': None})
+        for key in [key for key in sart.config_cache if key[1:2] == (id(win),)]:
+            del sart.config_cache[key]
+
+def simulate_participant(task):
+    """
+    Simulate the session of one participant in a worker process of `simulate_batch`.
+
+    Parameters:
+    - task : tuple
+        Participant ID, response model, seed and keyword arguments for `simulate_session`.
+
+    Returns:
+    - path : str
+        Path to the data file, which is completely written to disk.
+    """
+    participant, model, seed, session_settings = task
+    path = simulate_session(participant, model=model, seed=seed, **session_settings)
+    sart.flush_data()
+    return path
+
+def simulate_batch(n_participants, model=None, seed=None, processes=None, prefix='sim', **session_settings):
+    """
+    Simulate many participants in parallel, one session per participant.
+
+    Parameters:
+    - n_participants : int
+        Number of simulated participants.
+    - model : ResponseModel, optional
+        Behaviour of the simulated participants (copied to every worker). Default is a ResponseModel with default settings.
+    - seed : int or str, optional
+        Seed of the batch. Participant 'sim0001' gets the seed '<seed>-sim0001', etc. Default is None (not reproducible).
+    - processes : int, optional
+        Number of worker processes. Default is the number of CPU cores.
+    - prefix : str, optional
+        Beginning of the participant IDs. Default is 'sim'.
+    - session_settings : 
+        Further keyword arguments for `simulate_session` (e.g., 'output', 'testing', 'rating').
+
+    Yields:
+    - path : str
+        Path to the data file of each participant, as soon as the participant is finished 
+        (not necessarily in the order of the participant IDs).
+    """
+    if model is None:
+        model = ResponseModel()
+    tasks = []
+    for number in range(1, n_participants + 1):
+        participant = f'{prefix}{number:04d}'
+        participant_seed = None if seed is None else f'{seed}-{participant}'
+        tasks.append((participant, model, participant_seed, session_settings))
+
+    # Run in this process if only one process is used
+    if processes == 1:
+        for task in tasks:
+            yield simulate_participant(task)
+        return
+
+    with multiprocessing.Pool(processes=processes) as pool:
+        for path in pool.imap_unordered(simulate_participant, tasks, chunksize=1):
+            yield path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=1, help='Number of simulated participants (default: 1)')
+    parser.add_argument('--output', default=os.path.join('data', 'simulated'), help='Folder for the data files')
+    parser.add_argument('--seed', default=None, help='Seed; every participant gets a seed derived from it')
+    parser.add_argument('--processes', type=int, default=None, help='Number of worker processes (default: number of CPU cores)')
+    parser.add_argument('--commission-rate', type=float, default=.35, help='Probability of responding in no-go trials')
+    parser.add_argument('--omission-rate', type=float, default=.03, help='Probability of not responding in go trials')
+    parser.add_argument('--config', help='JSON, TOML or YAML file with settings of sart.py (see `load_config` in sart.py)')
+    args = parser.parse_args()
+
+    model = ResponseModel(commission_rate=args.commission_rate, omission_rate=args.omission_rate)
+    config = sart.load_config(args.config) if args.config else sart.make_config()
+    for path in simulate_batch(args.participants, model=model, seed=args.seed, processes=args.processes,
+                               output=args.output, config=config):
+        print(path)
+    sart.stop_data_writer()
+
+if __name__ == '__main__':
+    main()
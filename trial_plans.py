@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Pre-generate the trial plans of a study.
+
+Builds the order of digits, stimulus sizes and inter-trial intervals of all blocks for every
+participant and session with the settings of sart.py (number of trials, `min_nogo_distance`,
+`iti_range`), and saves one file per participant and session in the plan folder of sart.py
+(default 'plans'). When a session starts, sart.py uses the plan of its participant and session
+if it exists, so the plans can be checked (or counterbalanced by hand) before the study begins.
+
+The same seed always gives the same plans.
+
+Usage (from the repository folder):
+    python trial_plans.py --participants 1-40 --seed study1
+    python trial_plans.py --participants 101 102 103 --session 002 --min-nogo-distance 2
+    python trial_plans.py --participants 1-40 --seed study1 --config study1.toml
+"""
+
+import argparse
+import os
+
+import sart
+
+def parse_participants(values):
+    """
+    Expand the participant IDs given on the command line.
+
+    Parameters:
+    - values : list of str
+        Participant IDs or ranges of numeric IDs ('1-40').
+
+    Returns:
+    - participants : list of str
+        All participant IDs.
+    """
+    participants = []
+    for value in values:
+        first, separator, last = value.partition('-')
+        if separator and first.isdigit() and last.isdigit():
+            participants.extend(str(number) for number in range(int(first), int(last) + 1))
+        else:
+            participants.append(value)
+    return participants
+
+def generate_plans(participants, session='001', seed=None, training=1, testing=3, folder=None, config=None):
+    """
+    Build and save the trial plans of several participants.
+
+    Parameters:
+    - participants : list of str
+        Participant IDs.
+    - session : str, optional
+        Session number. Default is '001'.
+    - seed : int, str or None, optional
+        Seed of the plans (see `build_session_plans` in sart.py). Default is None.
+    - training : int, optional
+        1 = include a plan for the training block, 0 = no training. Default is 1.
+    - testing : int, optional
+        Number of testing blocks. Default is 3.
+    - folder : str, optional
+        Folder for the plan files. Default is the global 'plan_folder' variable of sart.py.
+    - config : sart.SessionConfig, optional
+        Configuration of the sessions (numbers of trials, digits, sizes, `min_nogo_distance`, `iti_range`).
+        Default is the configuration built from the variables of sart.py.
+
+    Returns:
+    - paths : list of str
+        Paths to the saved plan files.
+    """
+    folder = folder or sart.plan_folder
+    os.makedirs(folder, exist_ok=True)
+
+    paths = []
+    for participant in participants:
+        info = {'participant': participant, 'session': session, 'training': training, 'testing': testing}
+        path = os.path.join(folder, f"plan_{participant}_{session}.json")
+        sart.save_trial_plans(path, sart.build_session_plans(info, seed=seed, config=config))
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', nargs='+', required=True, help='Participant IDs or ranges of numeric IDs (e.g. 1-40)')
+    parser.add_argument('--session', default='001', help='Session number (default: 001)')
+    parser.add_argument('--seed', help='Seed of the plans (default: no seed)')
+    parser.add_argument('--training', type=int, default=1, help='1 = plan a training block, 0 = no training (default: 1)')
+    parser.add_argument('--testing', type=int, default=3, help='Number of testing blocks (default: 3)')
+    parser.add_argument('--min-nogo-distance', type=int, help='Minimum number of go trials between two no-go trials')
+    parser.add_argument('--folder', help='Folder for the plan files (default: plans)')
+    parser.add_argument('--config', help='JSON, TOML or YAML file with settings of sart.py (see `load_config` in sart.py)')
+    args = parser.parse_args()
+
+    config = sart.load_config(args.config) if args.config else sart.make_config()
+    if args.min_nogo_distance is not None:
+        config = config._replace(min_nogo_distance=args.min_nogo_distance)
+        sart.validate_config(config)
+
+    paths = generate_plans(parse_participants(args.participants), session=args.session, seed=args.seed,
+                           training=args.training, testing=args.testing, folder=args.folder, config=config)
+    print(f"{len(paths)} plans saved in {os.path.dirname(paths[0]) if paths else args.folder}")
+
+if __name__ == '__main__':
+    main()